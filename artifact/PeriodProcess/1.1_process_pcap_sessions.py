@@ -2,11 +2,20 @@
 
 """
 progress1.2：优化后的代码，使用PcapReader逐个数据包读取，而不是一次性加载整个文件。这种方法对内存更友好，特别适合处理大型 .pcap 文件。
+progress1.3：使用 tool.pcap_io 的 PcapRecordReader 代替 scapy，只按固定偏移解码五元组，会话文件直接写入原始记录字节。
+progress1.4：增加两遍扫描模式 to_session_dict_two_pass，第一遍只记录每个会话的首末时间和记录偏移，第二遍只写出满足时长的会话，
+            内存占用只与会话数目有关，与数据包数目无关，适合处理整天的网关流量。
+progress1.5：会话键改用 tool.flow_key 的整数双向流键，每个数据包不再构造和排序五元组。
+progress1.6：两遍扫描的第一遍改为读取 tool.pcap_index 的索引文件（<pcap>.idx.npy，不存在时扫描一遍建立），
+            文件时长、会话首末时间都在索引数组上计算，第二遍按索引中的会话编号写出，不再解码数据包。
+progress1.7：建立索引时把大文件按字节范围切块（tool.pcap_chunks），多个进程并行解析后合并各块的会话，
+            单个几十 GB 的抓包文件也能用上所有核心，进程数由 workers 指定，默认为 CPU 核心数。
+progress1.8：输入数据集的索引文件保存到 artifact/outputs/period/0_pcapIndex 下（保持输入目录结构），不再写入输入目录。
 读取指定目录下的 .pcap 文件，并将每个 .pcap 文件中的流量按双向流分类，并基于会话的时间跨度进行筛选，然后将筛选后的数据包保存到一个新的目录中。
 该文件依赖于to_session_dict.py 中的 to_session_dict 函数
 
 1. 逐包读取 .pcap 文件
-    使用 PcapReader 按数据包逐个读取，避免一次性将整个文件加载到内存中。
+    使用 PcapRecordReader 按数据包逐个读取，避免一次性将整个文件加载到内存中。
     记录第一个和最后一个数据包的时间，用于计算文件的时间跨度。
 2. 双向流会话分类
     按五元组（源IP、源端口、目的IP、目的端口、协议）对流量进行分类。
@@ -23,34 +32,47 @@ progress1.2：优化后的代码，使用PcapReader逐个数据包读取，而
 """
 
 import os
-from scapy.all import PcapReader, wrpcap
+import sys
 from collections import defaultdict
+import numpy as np
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.pcap_io import PcapRecordReader, PcapRecordWriter, PcapWriterPool
+from tool.flow_key import FlowTable, packet_flow_key, flow_key_name, FIRST_OFFSET, LAST_OFFSET
+from tool.pcap_index import load_index, index_duration, index_flow_keys
+
+
+# 会话文件名，格式为 {src_ip}_{src_port}_{dst_ip}_{dst_port}_{proto}.pcap
+def session_filename(key):
+    return flow_key_name(key) + '.pcap'
+
+
+def to_session_dict(pcap_file, output_dir, num=1 / 2, two_pass=False, use_index=False, workers=1, index_dir=None):  # num用于定义会话时间跨度相对于原始文件的阈值，默认为原始时间跨度的1/2
+    if use_index:
+        return to_session_dict_indexed(pcap_file, output_dir, num, workers, index_dir)
+    if two_pass:
+        return to_session_dict_two_pass(pcap_file, output_dir, num)
 
-def to_session_dict(pcap_file, output_dir, num=1 / 2):  # num用于定义会话时间跨度相对于原始文件的阈值，默认为原始时间跨度的1/2
     # 使用PcapReader逐包读取
     sessions = defaultdict(list)
     packet_count = 0
     first_packet_time = None
     last_packet_time = None
 
-    # 遍历每个数据包，按五元组分类
-    with PcapReader(pcap_file) as pcap_reader:
-        for packet in pcap_reader:
+    # 遍历每个数据包，按五元组分类，会话中保存 (时间戳, 原始记录字节)
+    with PcapRecordReader(pcap_file) as pcap_reader:
+        pcap_header = pcap_reader.pcap_header
+        linktype = pcap_reader.linktype
+        for packet_time, _, record in pcap_reader:
             packet_count += 1
             if packet_count == 1:
-                first_packet_time = packet.time
-            last_packet_time = packet.time
-
-            if packet.haslayer('IP') and (packet.haslayer('TCP') or packet.haslayer('UDP')):
-                ip_layer = packet['IP']
-                proto_layer = packet['TCP'] if packet.haslayer('TCP') else packet['UDP']
+                first_packet_time = packet_time
+            last_packet_time = packet_time
 
-                # 获取会话，即双向流的五元组 (源IP, 源端口, 目的IP, 目的端口, 协议)
-                flow_tuple = tuple(
-                    sorted([(ip_layer.src, proto_layer.sport, ip_layer.dst, proto_layer.dport, ip_layer.proto),
-                            (ip_layer.dst, proto_layer.dport, ip_layer.src, proto_layer.sport, ip_layer.proto)]))
-                sessions[flow_tuple].append(packet)
+            # 获取会话，即双向流 (源IP, 源端口, 目的IP, 目的端口, 协议) 的整数键
+            key = packet_flow_key(record, linktype)
+            if key is not None:
+                sessions[key].append((packet_time, record))
 
     if not sessions:
         print(f"No valid packets found in {pcap_file}. Skipping...")
@@ -62,16 +84,108 @@ def to_session_dict(pcap_file, output_dir, num=1 / 2):  # num用于定义会话
     os.makedirs(output_dir, exist_ok=True)
 
     # 将每个会话写入单独的PCAP文件，满足时间跨度条件的会话
-    for flow_tuple, flow_packets in sessions.items():
-        flow_start_time = flow_packets[0].time
-        flow_end_time = flow_packets[-1].time
+    for key, flow_packets in sessions.items():
+        flow_start_time = flow_packets[0][0]
+        flow_end_time = flow_packets[-1][0]
         flow_duration = flow_end_time - flow_start_time
 
         if flow_duration >= duration_threshold:
-            src_ip, src_port, dst_ip, dst_port, proto = flow_tuple[0]  # 取其中一个方向
-            filename = f'{src_ip}_{src_port}_{dst_ip}_{dst_port}_{proto}.pcap'
-            filepath = os.path.join(output_dir, filename)
-            wrpcap(filepath, flow_packets)
+            filepath = os.path.join(output_dir, session_filename(key))
+            with PcapRecordWriter(filepath, pcap_header) as writer:
+                for _, record in flow_packets:
+                    writer.write(record)
+
+    print(f"满足时长的会话提取完成，结果保存在目录: {output_dir}")
+
+
+# 两遍扫描版本，输出与 to_session_dict 相同
+def to_session_dict_two_pass(pcap_file, output_dir, num=1 / 2):
+    # 第一遍：流表中每个会话只保存首末时间、首末记录偏移和数据包数
+    flows = FlowTable()
+    first_packet_time = None
+    last_packet_time = None
+
+    with PcapRecordReader(pcap_file) as pcap_reader:
+        linktype = pcap_reader.linktype
+        for packet_time, offset, record in pcap_reader:
+            if first_packet_time is None:
+                first_packet_time = packet_time
+            last_packet_time = packet_time
+
+            key = packet_flow_key(record, linktype)
+            if key is not None:
+                flows.add(key, packet_time, offset)
+
+    if not len(flows):
+        print(f"No valid packets found in {pcap_file}. Skipping...")
+        return
+
+    original_duration = last_packet_time - first_packet_time
+    duration_threshold = original_duration * num  # 定义时间跨度限制条件，将阈值设备原始文件时长的一定比例（1/2）
+
+    # 筛选满足时间跨度条件的会话，并确定第二遍需要读取的偏移范围
+    selected = flows.select(duration_threshold)
+    del flows
+    os.makedirs(output_dir, exist_ok=True)
+    if not selected:
+        print(f"满足时长的会话提取完成，结果保存在目录: {output_dir}")
+        return
+    start_offset = min(flow[FIRST_OFFSET] for flow in selected.values())
+    stop_offset = max(flow[LAST_OFFSET] for flow in selected.values())
+    filepaths = {key: os.path.join(output_dir, session_filename(key)) for key in selected}
+
+    # 第二遍：只把选中会话的数据包流式写入各自的文件
+    with PcapRecordReader(pcap_file) as pcap_reader, PcapWriterPool(pcap_reader.pcap_header) as writers:
+        for _, _, record in pcap_reader.records(start_offset, stop_offset):
+            filepath = filepaths.get(packet_flow_key(record, linktype))
+            if filepath is not None:
+                writers.write(filepath, record)
+
+    print(f"满足时长的会话提取完成，结果保存在目录: {output_dir}")
+
+
+# 使用索引文件的两遍扫描版本，输出与 to_session_dict 相同
+def to_session_dict_indexed(pcap_file, output_dir, num=1 / 2, workers=1, index_dir=None):
+    # 第一遍：加载（或用 workers 个进程并行建立）索引，每条记录的时间戳和会话编号都在索引中
+    # index_dir 不为空时索引文件保存在该目录中，不写入输入目录
+    index, flows = load_index(pcap_file, workers=workers, index_dir=index_dir)
+    flow_ids = index['flow']
+    valid = np.flatnonzero(flow_ids >= 0)
+    if not len(valid):
+        print(f"No valid packets found in {pcap_file}. Skipping...")
+        return
+
+    duration_threshold = index_duration(index) * num  # 定义时间跨度限制条件，将阈值设备原始文件时长的一定比例（1/2）
+
+    # 每个会话的首末数据包（按文件顺序）及时长
+    valid_ids = flow_ids[valid]
+    first_rows = np.full(len(flows), len(index), dtype=np.int64)
+    last_rows = np.full(len(flows), -1, dtype=np.int64)
+    np.minimum.at(first_rows, valid_ids, valid)
+    np.maximum.at(last_rows, valid_ids, valid)
+    ts = index['ts']
+    selected = np.flatnonzero(ts[last_rows] - ts[first_rows] >= duration_threshold)
+
+    os.makedirs(output_dir, exist_ok=True)
+    if not len(selected):
+        print(f"满足时长的会话提取完成，结果保存在目录: {output_dir}")
+        return
+    flow_keys = index_flow_keys(flows)
+    filepaths = [None] * len(flows)
+    for flow_id in selected.tolist():
+        filepaths[flow_id] = os.path.join(output_dir, session_filename(flow_keys[flow_id]))
+
+    # 第二遍：从第一个选中会话的首包读到最后一个选中会话的末包，记录与索引逐行对应，按会话编号写出
+    start_row = int(first_rows[selected].min())
+    stop_row = int(last_rows[selected].max())
+    row_flows = flow_ids[start_row:stop_row + 1].tolist()
+    with PcapRecordReader(pcap_file) as pcap_reader, PcapWriterPool(pcap_reader.pcap_header) as writers:
+        records = pcap_reader.records(int(index['offset'][start_row]), int(index['offset'][stop_row]))
+        for flow_id, (_, _, record) in zip(row_flows, records):
+            if flow_id >= 0:
+                filepath = filepaths[flow_id]
+                if filepath is not None:
+                    writers.write(filepath, record)
 
     print(f"满足时长的会话提取完成，结果保存在目录: {output_dir}")
 
@@ -80,6 +194,8 @@ def to_session_dict(pcap_file, output_dir, num=1 / 2):  # num用于定义会话
 def main():
     input_dir = r'artifact/data/samples/pcaps'
     out_dir = r'artifact/outputs/period/2_output'
+    index_root = r'artifact/outputs/period/0_pcapIndex'  # 输入 pcap 的索引文件目录
+    workers = os.cpu_count() or 1  # 建立索引时并行解析的进程数
 
     for root, dirs, files, in os.walk(input_dir):
         for file in files:
@@ -93,7 +209,9 @@ def main():
                 if not os.path.exists(out_file_dir):
                     os.makedirs(out_file_dir)  # 如果文件输出目录不存在，则创建该目录
 
-                to_session_dict(pcap_file, out_file_dir, 1 / 2)  # 处理PCAP文件，提取满足时长条件的会话并保存结果
+                index_dir = os.path.join(index_root, os.path.relpath(root, input_dir))  # 该设备文件的索引保存目录
+                to_session_dict(pcap_file, out_file_dir, 1 / 2, two_pass=True, use_index=True, workers=workers,
+                                index_dir=index_dir)  # 处理PCAP文件，提取满足时长条件的会话并保存结果
 
 
 # 检查是否作为主程序运行
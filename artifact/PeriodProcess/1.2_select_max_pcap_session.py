@@ -2,6 +2,7 @@
 
 """
 progress2.1：优化后的代码，使用os.walk找到设备文件夹，然后对每个设备的所有子文件夹进行pcap文件数目判断，选择数目最多的一个，保存到新的目录下
+progress2.2：选中的子文件夹改为以硬链接发布到目标路径（tool.publish），不支持硬链接时才复制，不再 copytree 整天的会话文件。
 
 1. 查找包含最多 .pcap 文件的子文件夹
     get_subfolder_with_max_pcap：
@@ -10,7 +11,7 @@ progress2.1：优化后的代码，使用os.walk找到设备文件夹，然后
         返回包含最多 .pcap 文件的子文件夹路径。
 2. 复制文件夹及其内容
     copy_selected_subfolder：
-        将选定的子文件夹及其内容复制到目标路径。
+        将选定的子文件夹及其内容以硬链接（或复制）发布到目标路径。
         如果目标路径已存在对应文件夹，则先删除，确保数据最新。
 3. 批量处理设备文件夹
     遍历顶层目录，查找所有设备文件夹。
@@ -19,8 +20,12 @@ progress2.1：优化后的代码，使用os.walk找到设备文件夹，然后
     打印每个选定子文件夹的路径和复制操作的结果。
 """
 import os
+import sys
 import shutil
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.publish import publish_tree
+
 
 # 找到当前设备包含最多 pcap 文件的子文件夹，输入设备文件夹路径，return包含最多 pcap 文件的子文件夹路径
 def find_subfolder_with_most_pcap(root_folder):
@@ -38,14 +43,14 @@ def find_subfolder_with_most_pcap(root_folder):
     return selected_subfolder
 
 
-# 复制文件夹及其内容到目标路径。
+# 将文件夹及其内容发布（硬链接，失败时复制）到目标路径。
 def copy_folder(src, dst):
     # 在目标路径中创建一个新的文件夹，名字与selected_subfolder相同
     final_dst = os.path.join(dst, os.path.basename(src))
 
     if os.path.exists(final_dst):
         shutil.rmtree(final_dst)  # 如果目标文件夹存在，先删除，确保数据内容最新
-    shutil.copytree(src, final_dst)  # 将src目录及下面的所有内容，复制到final_dst下面。
+    publish_tree(src, final_dst, verbose=False)  # 将src目录及下面的所有内容，硬链接到final_dst下面。
 
 
 def main():
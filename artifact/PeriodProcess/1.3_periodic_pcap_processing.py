@@ -1,64 +1,108 @@
 # -*- coding: utf-8 -*-
 """
 progress3.1：将代码进行优化，遍历所有目录，当找到pcap文件之后，进行处理。
+progress3.2：读取和拆分 pcap 改用 tool.pcap_io，不再为每个数据包构建 scapy 对象，拆分时直接写入原始记录字节。
+progress3.3：二进制时间序列改为在时间戳的 NumPy 数组上向量化计算，时间戳可以来自 pcap、tshark 导出的 csv 或内存数组，
+            计算量与数据包数目成正比，不再随会话持续的秒数逐秒循环。
+progress3.4：用 FFT 一次算出整条序列的自相关（Wiener–Khinchin 定理），所有候选周期的 r、r_n 和相邻周期检查都从同一个数组中读取，
+            不再对每个候选周期做三次 O(n) 的点积。
+progress3.5：增加稀疏会话的周期检测 sparse_flow_data_process，直接在有数据包的秒上计算，只在由包间隔推出的候选频率处求频谱、
+            只在候选滞后处求自相关，适合持续多天、每隔几分钟才有几个心跳包的会话，CPU 和内存只与有数据包的秒数有关。
+progress3.6：增加清单拆分模式（manifest=True）：会话文件移动到会话目录下保存为 session.pcap，只写一个 segments.csv
+            记录每个周期段的起止时间和记录的字节范围，不再生成成千上万个 output_<ts>.pcap 小文件，格式见 tool.segment_manifest。
+progress3.7：会话文件改为在进程池中并行处理（--workers），按文件大小从大到小调度，单个会话可设置超时（--timeout）。
+            子进程只把周期段和 record.txt 写到暂存目录 <会话目录>.partial，删除源文件、提交会话目录都由主进程在任务成功后完成；
+            超时或出错的会话保留源文件。所有会话的处理结果写入 period_results.csv（先写临时文件再替换）。
+progress3.8：时间戳和周期段的划分改为读取 tool.pcap_index 的索引文件，会话文件只在建立索引时扫描一遍；
+            经典 pcap 的周期段按索引中的字节范围整段复制，清单模式直接由索引生成 segments.csv，不再逐包读取。
+progress3.9：设置 DEVICEID_CATALOG 时，把每个会话的处理结果和周期段登记到目录库（tool.catalog），后续阶段直接查询。
 它的主要功能包括检查 .pcap 文件的周期信息，删除不符合条件的文件，并将符合条件的文件按周期信息进行拆分并存储。
 
 1. 二进制时间序列转换
-    通过 convert_pcap_to_binary_timeseries 将 .pcap 文件转化为二进制时间序列，表示每秒是否有数据包。
+    通过 load_timestamps 读取时间戳，timestamps_to_binary_timeseries 将其转化为二进制时间序列，表示每秒是否有数据包。
 2. 周期提取与分析
     使用 identify_candidate_periods 提取可能的周期。
-    通过 calculate_autocorrelation 计算候选周期的自相关性，分析其有效性。
+    通过 _autocorrelation 一次计算所有滞后的自相关，再由 _r_rn 评估候选周期的有效性。
+    稀疏会话可改用 sparse_flow_data_process，在有数据包的秒上完成同样的候选周期提取和评估。
     调用 extract_flow_periods 返回可能的周期性模式。
 3. 周期筛选与文件拆分
     使用 find_closest_pair 找到最稳定的周期。
-    根据最佳周期，调用 split_pcap_by_period 按周期拆分 .pcap 文件并保存。
+    根据最佳周期，调用 split_pcap_by_period 按周期拆分 .pcap 文件并保存；清单模式下调用 segment_pcap 只记录周期段的位置。
 4. 结果保存
     在每个 .pcap 文件对应的目录中创建 record.txt 文件，记录候选周期和最佳周期信息。
 5. 自动化批量处理
-    遍历指定路径下的所有 .pcap 文件。
-    删除没有周期性模式的文件。
-    将符合条件的文件拆分并保存到对应目录。
+    遍历指定路径下的所有 .pcap 文件，按文件大小从大到小交给进程池，子进程 process_session 把结果写到暂存目录。
+    主进程 commit_session 删除没有周期性模式的文件，将符合条件的会话目录从暂存目录改名为正式目录。
 6. 统计与输出
-    打印每个会话的处理结果。
+    打印每个会话的处理结果，并写入 period_results.csv；设置了目录库时同时登记到目录库。
     统计总处理会话数和总拆分的文件数。
 """
 
 import os
+import sys
+import csv
+import time
+import shutil
+import signal
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-from scapy.all import *
-from scapy.all import rdpcap
-from scipy.fft import fft
+from scipy.fft import fft, rfft, irfft, next_fast_len
 import math
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.pcap_io import PcapRecordReader, PcapRecordWriter
+from tool.segment_manifest import SESSION_PCAP_NAME, has_manifest, write_manifest, read_manifest
+from tool.catalog import connect_catalog, register_session, register_segments
+from tool.pcap_index import load_index, remove_index, move_index
 # from tool.cloest_pair_period import find_closest_pair
 # from tool.split_flow_by_period import split_pcap
 
 
-# 将 .pcap 文件中的数据包转换为二进制时间序列。如果某秒内有数据包，二进制序列中对应的位置为 1。如果某秒内没有数据包，二进制序列中对应的位置为 0。
+# 读取数据包时间戳。source 可以是 pcap 文件、tshark 导出的 csv 文件（frame.time_epoch 列）或内存中的时间戳数组。
+# pcap 文件返回索引中的整数纳秒时间戳（int64），其余返回浮点秒（float64）。
+def load_timestamps(source):
+    if not isinstance(source, (str, os.PathLike)):
+        return np.asarray(source, dtype=np.float64)
+    if os.fspath(source).endswith('.csv'):
+        with open(source, 'r', newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            col_time = next(reader).index('frame.time_epoch')
+            return np.array([float(row[col_time]) for row in reader if col_time < len(row) and row[col_time]],
+                            dtype=np.float64)
+    # 时间戳来自索引文件，索引不存在时扫描一遍建立
+    index, _ = load_index(source)
+    return np.array(index['ts_ns'], dtype=np.int64)
+
+
+# 计算二进制时间序列中值为 1 的位置（有数据包的秒），返回严格递增的 int64 数组，序列长度为最后一个位置加 1。
+# timestamps 为整数纳秒（load_timestamps 从 pcap 读取的结果）或浮点秒。
+def timestamps_to_active_seconds(timestamps):
+    timestamps = np.asarray(timestamps)
+    if timestamps.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    if np.issubdtype(timestamps.dtype, np.integer):
+        # 每个数据包相对第一个数据包所在的秒，按整数纳秒向下取整，与原来逐包比较精确时间戳的结果相同
+        seconds = (timestamps.astype(np.int64) - int(timestamps[0])) // 1000000000
+    else:
+        # 浮点秒先按微秒取整，避免浮点误差把整秒边界上的数据包分到前一秒
+        timestamps = timestamps.astype(np.float64)
+        seconds = np.floor(np.round(timestamps - timestamps[0], 6)).astype(np.int64)
+    # 与原来的逐秒循环保持一致：每个数据包占用一秒，同一秒内的后续数据包依次顺延到下一秒，
+    # 即 slot[i] = max(slot[i-1] + 1, seconds[i])，等价于对 seconds[i] - i 求前缀最大值再加回 i。
+    index = np.arange(timestamps.size, dtype=np.int64)
+    return np.maximum.accumulate(seconds - index) + index
+
+
+# 将时间戳数组转换为二进制时间序列。如果某秒内有数据包，二进制序列中对应的位置为 1。如果某秒内没有数据包，二进制序列中对应的位置为 0。
+def timestamps_to_binary_timeseries(timestamps):
+    return np.bincount(timestamps_to_active_seconds(timestamps))
+
+
+# 将 .pcap 文件（或 csv、时间戳数组）中的数据包转换为二进制时间序列。
 def pcap_to_binary_timeseries(pcap_file):
-    packets = rdpcap(pcap_file)
-    start_time = packets[0].time
-    end_time = packets[-1].time
-    duration = int(end_time - start_time) + 1
-    binary_timeseries = []
-
-    current_time = start_time
-    index = 0
-    for packet in packets:
-        # 如果当前秒内没有数据包（即 packet.time 比 current_time + 1 更晚），则使用 while 循环为每个缺失的秒数填充 0，直到到达当前数据包的时间。
-        while packet.time >= current_time + 1:
-            # If no packet in this second, append 0
-            binary_timeseries.append(0)
-            current_time += 1
-        # 当 packet.time 等于 current_time 时，while 循环结束，当前秒内有数据包，因此将 1 添加到 binary_timeseries 中，表示这一秒内有数据包。
-        binary_timeseries.append(1)
-        current_time += 1
-
-    # Fill the remaining seconds with 0
-    while current_time <= end_time:
-        binary_timeseries.append(0)
-        current_time += 1
-
-    return binary_timeseries
+    return timestamps_to_binary_timeseries(load_timestamps(pcap_file))
 
 
 # 利用fft分析输入的时间序列（二进制序列），提取周期信号。从输入序列中找到可能的周期并返回这些周期的候选列表。
@@ -82,9 +126,13 @@ def _f_period(x):
     在这个范围内的整数，都认为是候选周期，添加到 candidate_period_t 列表中。
     最终，将 candidate_period_t 列表去重，确保每个候选周期只出现一次。
     """
+    return _expand_candidate_periods(len(x), candidate_period)
+
+
+def _expand_candidate_periods(n, candidate_period):
     candidate_period_t = []
     for i in range(0, len(candidate_period)):
-        t = len(x) / candidate_period[i]
+        t = n / candidate_period[i]
         t_upper_bound = int((1.1 * t))
         t_lower_bound = math.ceil(0.9 * t)
         for j in range(t_lower_bound, t_upper_bound):
@@ -93,24 +141,33 @@ def _f_period(x):
     return candidate_period_t
 
 
-# 计算和评估在给定周期 i 的情况下，时间序列 x 的自相关性。它计算自相关函数值，并通过这些值来判断周期的有效性。
-# x：时间序列数据，二进制表示的数组。
+# 用 FFT 计算时间序列 x 在所有滞后 k 下的自相关 acf[k] = x[k:]·x[:n-k]（Wiener–Khinchin 定理）。
+# 补零到不小于 2n-1 的快速 FFT 长度，得到的是线性（非循环）自相关，与逐个滞后做 np.dot 的结果相同。
+def _autocorrelation(x):
+    x = np.asarray(x, dtype=np.float64)
+    n = x.size
+    size = next_fast_len(2 * n - 1, real=True)
+    spectrum = rfft(x, size)
+    acf = irfft(spectrum * np.conj(spectrum), size)[:n]
+    # 二进制序列的自相关都是整数，取整消除浮点误差
+    return np.rint(acf).astype(np.int64)
+
+
+# 计算和评估在给定周期 i 的情况下，时间序列的自相关性。它读取自相关函数值，并通过这些值来判断周期的有效性。
+# acf：_autocorrelation 返回的自相关数组，长度即时间序列长度 n。
 # i：待评估的周期长度。
-def _r_rn(x, i):
-    n = len(x)
-    # print(n)
+def _r_rn(acf, i):
+    n = len(acf)
     if i >= (n - 1) or i < 1:
         return []
     """
-    计算时间序列 x 在周期 i 下的自相关值。
-    x[i:] 表示从索引 i 开始到序列末尾的部分。
-    x[:n - i] 表示从序列开始到索引 n−i 的部分。
-    np.dot 计算这两个部分的内积（点积），即它们的自相关值。内积（点积）：计算两个向量（或时间序列部分）之间的相似性。
-    r_yy_i_l1：计算周期 i−1 下的自相关值。r_yy_i_u1：计算周期 i+1 下的自相关值。这些计算用于比较周期 i 和其相邻周期 i−1 和 i+1 的自相关值。
+    时间序列 x 在周期 i 下的自相关值。
+    acf[i] 即 x[i:] 与 x[:n - i] 的内积（点积），内积（点积）：计算两个向量（或时间序列部分）之间的相似性。
+    r_yy_i_l1：周期 i−1 下的自相关值。r_yy_i_u1：周期 i+1 下的自相关值。这些值用于比较周期 i 和其相邻周期 i−1 和 i+1 的自相关值。
     """
-    r_yy_i = np.dot(x[i:], x[:n - i])
-    r_yy_i_l1 = np.dot(x[i - 1:], x[:n - i + 1])
-    r_yy_i_u1 = np.dot(x[i + 1:], x[:n - i - 1])
+    r_yy_i = acf[i]
+    r_yy_i_l1 = acf[i - 1]
+    r_yy_i_u1 = acf[i + 1]
     # 有效性检查：判断在周期 i 下的自相关值是否大于其相邻周期的自相关值。
     if r_yy_i <= r_yy_i_l1 or r_yy_i <= r_yy_i_u1:
         return []
@@ -125,18 +182,104 @@ def _r_rn(x, i):
 def flow_data_process(x):
     result = {}
     candidate_period = _f_period(x)
+    if not candidate_period:
+        return result
+
+    # 自相关只计算一次，所有候选周期共用
+    acf = _autocorrelation(x)
     for i in candidate_period:
-        r_rn_result = _r_rn(x, i)
+        r_rn_result = _r_rn(acf, i)
         if r_rn_result:
             result[i] = r_rn_result
 
     return result
 
 
-# flow_to_periods：分析 .pcap 文件中的数据流，提取并识别可能的周期性模式。
+# 稀疏会话的频谱：只在给定的频率 bins 处计算二进制序列 DFT 的振幅，|sum_s exp(-2πj·b·s/n)|，s 为有数据包的秒。
+# 结果与对完整序列做 fft 后取对应位置的振幅相同，计算量为 O(有数据包的秒数 × 频率数)。
+def _sparse_amplitudes(active_seconds, n, bins):
+    amplitudes = np.empty(len(bins), dtype=np.float64)
+    chunk = max(1, (1 << 20) // max(1, active_seconds.size))  # 每次计算的频率数，限制临时矩阵的大小
+    for start in range(0, len(bins), chunk):
+        b = np.asarray(bins[start:start + chunk], dtype=np.int64)
+        # 先对 n 取模再换算成相位，避免 b·s 过大时的浮点精度损失
+        phase = (np.outer(b, active_seconds) % n) * (2 * np.pi / n)
+        amplitudes[start:start + chunk] = np.hypot(np.cos(phase).sum(axis=1), np.sin(phase).sum(axis=1))
+    return amplitudes
+
+
+# 稀疏会话的自相关：acf[k] = 同时满足 s 和 s+k 都有数据包的秒数，与二进制序列的 x[k:]·x[:n-k] 相同。
+def _sparse_autocorrelation(active_seconds, lags):
+    acf = {}
+    m = active_seconds.size
+    for k in lags:
+        shifted = active_seconds + k
+        pos = np.searchsorted(active_seconds, shifted)
+        found = pos < m
+        acf[k] = np.int64(np.count_nonzero(active_seconds[pos[found]] == shifted[found]))
+    return acf
+
+
+# 稀疏会话的候选周期提取。心跳类会话的周期就是最常见的包间隔，因此只在由包间隔 g 推出的频率 round(n/g) 附近求频谱，
+# 峰值检测和周期范围扩展规则与 _f_period 相同。完整频谱的最大振幅出现在频率 0 处，等于有数据包的秒数，据此得到振幅阈值。
+# 每个周期内有多个数据包时，相邻数据包的间隔并不是周期，因此同时统计相隔 1 到 max_order 个数据包的间隔。
+def _sparse_f_period(active_seconds, n, max_gaps=64, max_order=8):
+    if active_seconds.size < 2 or n < 3:
+        return []
+    t_amplitude = active_seconds.size * 0.1
+    gaps = np.concatenate([active_seconds[k:] - active_seconds[:-k]
+                           for k in range(1, min(max_order, active_seconds.size - 1) + 1)])
+    gaps, counts = np.unique(gaps, return_counts=True)
+    gaps = gaps[np.argsort(-counts, kind='stable')[:max_gaps]]
+
+    # 每个候选频率连同其左右相邻频率一起计算，用于判断局部峰值
+    centers = np.unique(np.rint(n / gaps).astype(np.int64))
+    bins = np.unique((centers[:, None] + np.arange(-2, 3)).ravel())
+    bins = bins[(bins >= 0) & (bins < n)]
+    amplitude = dict(zip(bins.tolist(), _sparse_amplitudes(active_seconds, n, bins)))
+
+    candidate_period = []
+    for i in bins.tolist():
+        if i < 1 or i > n - 2 or i - 1 not in amplitude or i + 1 not in amplitude:
+            continue
+        if amplitude[i] >= t_amplitude and amplitude[i] > amplitude[i - 1] and amplitude[i] > amplitude[i + 1]:
+            candidate_period.append(i)
+    return _expand_candidate_periods(n, candidate_period)
+
+
+# 稀疏会话的周期检测，输入为 timestamps_to_active_seconds 的结果，输出格式与 flow_data_process 相同。
+# 候选周期的 r、r_n 按同样的公式计算，只在需要的滞后 i-1、i、i+1 处求自相关。
+def sparse_flow_data_process(active_seconds):
+    result = {}
+    active_seconds = np.asarray(active_seconds, dtype=np.int64)
+    if active_seconds.size == 0:
+        return result
+    n = int(active_seconds[-1]) + 1
+    candidate_period = [i for i in _sparse_f_period(active_seconds, n) if 1 <= i < n - 1]
+    if not candidate_period:
+        return result
+
+    lags = sorted({lag for i in candidate_period for lag in (i - 1, i, i + 1)})
+    acf = _sparse_autocorrelation(active_seconds, lags)
+    for i in candidate_period:
+        r_yy_i, r_yy_i_l1, r_yy_i_u1 = acf[i], acf[i - 1], acf[i + 1]
+        if r_yy_i <= r_yy_i_l1 or r_yy_i <= r_yy_i_u1:
+            continue
+        r = i * r_yy_i / n
+        r_n = i * (r_yy_i + r_yy_i_l1 + r_yy_i_u1) / n
+        result[i] = [r, r_n]
+
+    return result
+
+
+# flow_to_periods：分析 .pcap 文件（或 csv、时间戳数组）中的数据流，提取并识别可能的周期性模式。
 # 脚本的主要流程包括读取 .pcap 文件，将其转换为二进制时间序列，然后使用傅里叶变换和相关性分析来识别潜在的周期性。
-def flow_to_periods(input_pcap_file):
-    binary_timeseries = pcap_to_binary_timeseries(input_pcap_file)
+# sparse=True 时使用稀疏会话的周期检测，不构建完整的二进制时间序列。
+def flow_to_periods(input_pcap_file, sparse=False):
+    timestamps = load_timestamps(input_pcap_file)
+    if sparse:
+        return sparse_flow_data_process(timestamps_to_active_seconds(timestamps))
+    binary_timeseries = timestamps_to_binary_timeseries(timestamps)
     return flow_data_process(binary_timeseries)
 
 
@@ -180,93 +323,337 @@ def find_closest_pair(dictionary):
     return closest_pair
 
 
+def period_segments(timestamps, time_interval_seconds):
+    """
+    按周期窗口划分数据包，返回 [(窗口起点, 首行, 尾后行)]。
+    规则与逐包拆分时相同：按文件顺序，数据包时间不小于当前窗口起点时开启新的周期段，窗口起点每次前进一个周期。
+    """
+    segments = []
+    current_interval = None
+    for row, packet_time in enumerate(np.asarray(timestamps).tolist()):
+        if current_interval is None:
+            current_interval = packet_time  # 第一个数据包的时间戳
+        if packet_time >= current_interval:
+            if segments:
+                segments[-1][2] = row
+            segments.append([current_interval, row, None])
+            current_interval += time_interval_seconds
+    if segments:
+        segments[-1][2] = len(timestamps)
+    return segments
+
+
 def split_pcap(input_file, output_folder, time_interval_seconds):
-    packets = rdpcap(input_file)  # 读取输入的 pcap 文件
-    start_time = packets[0].time  # 获取第一个数据包的时间戳
-    current_interval = start_time
-    current_output = None
-    file_count = 0  # 计数器：当前会话生成的文件数量
-
-    for packet in packets:
-        if packet.time >= current_interval:
-            # 创建新的输出 pcap 文件
-            if current_output:
-                current_output.close()
-            output_filename = f"{output_folder}/output_{int(current_interval)}.pcap"
-            current_output = PcapWriter(output_filename, append=True)
-            file_count += 1  # 更新文件计数器
+    index, _ = load_index(input_file)
+    segments = period_segments(index['ts'], time_interval_seconds)
+    offsets = index['offset']
+    lengths = index['length']
+
+    with PcapRecordReader(input_file) as pcap_reader:
+        pcap_header = pcap_reader.pcap_header
+        if pcap_reader.format == 'pcap':
+            # 经典 pcap 中周期段的记录是连续存放的，按字节范围整段复制
+            with open(input_file, 'rb') as f:
+                for current_interval, first_row, stop_row in segments:
+                    first_offset = int(offsets[first_row])
+                    end_offset = int(offsets[stop_row - 1]) + int(lengths[stop_row - 1])
+                    f.seek(first_offset)
+                    output_filename = f"{output_folder}/output_{int(current_interval)}.pcap"
+                    with PcapRecordWriter(output_filename, pcap_header, append=True) as current_output:
+                        current_output.write(f.read(end_offset - first_offset))
+        else:
+            # pcapng 的记录需要转换格式，逐条读取，记录与索引逐行对应
+            records = iter(pcap_reader)
+            for current_interval, first_row, stop_row in segments:
+                output_filename = f"{output_folder}/output_{int(current_interval)}.pcap"
+                with PcapRecordWriter(output_filename, pcap_header, append=True) as current_output:
+                    for _ in range(stop_row - first_row):
+                        current_output.write(next(records)[2])
+
+    return len(segments)  # 当前会话生成的文件数量
+
+
+def segment_pcap(input_file, output_folder, time_interval_seconds, move_source=True):
+    """
+    与 split_pcap 使用相同的周期窗口，但不写出周期段文件：会话文件移动到 output_folder/session.pcap，
+    每个周期段只在 segments.csv 中记录起止时间和记录的字节范围。返回周期段数目。
+    输入为 pcapng 时记录需要转换格式，此时把会话重写为经典 pcap 格式的 session.pcap。
+    move_source 为 False 时经典 pcap 格式的源文件保持不动，由调用方稍后移动到 session.pcap（偏移不变）。
+    """
+    session_file = os.path.join(output_folder, SESSION_PCAP_NAME)
+    index, _ = load_index(input_file)
+    segments = period_segments(index['ts'], time_interval_seconds)
+    lengths = np.asarray(index['length'], dtype=np.int64)
 
-            current_interval += time_interval_seconds
+    with PcapRecordReader(input_file) as pcap_reader:
+        rewrite = pcap_reader.format != 'pcap'
+        if rewrite:
+            with PcapRecordWriter(session_file, pcap_reader.pcap_header) as session_writer:
+                for _, _, record in pcap_reader:
+                    session_writer.write(record)
+            # 重写后的记录紧接着文件头连续存放
+            offsets = len(pcap_reader.pcap_header) + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        else:
+            offsets = np.asarray(index['offset'], dtype=np.int64)
 
-        # 写数据包到当前输出文件
-        current_output.write(packet)
+    write_manifest(output_folder, [
+        {'segment': f"output_{int(current_interval)}",
+         'start_time': current_interval,
+         'end_time': current_interval + time_interval_seconds,
+         'first_offset': int(offsets[first_row]),
+         'end_offset': int(offsets[stop_row - 1] + lengths[stop_row - 1]),
+         'packets': stop_row - first_row}
+        for current_interval, first_row, stop_row in segments])
 
-    if current_output:
-        current_output.close()
+    if move_source:
+        if rewrite:
+            os.remove(input_file)
+            remove_index(input_file)
+        else:
+            os.replace(input_file, session_file)
+            move_index(input_file, session_file)
 
-    return file_count
+    return len(segments)
 
 
-def process_pcap_files(path):
-    total_sessions = 0  # 总共处理的会话数量
-    total_files_split = 0  # 总共划分的文件数量
+STAGING_SUFFIX = '.partial'  # 子进程写周期段的暂存目录后缀
+RESULTS_NAME = 'period_results.csv'
+RESULT_FIELDS = ['session', 'status', 'period', 'segments', 'seconds', 'message']
+
+
+class SessionTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise SessionTimeout()
+
+
+def process_session(filename, sparse=False, manifest=False, timeout=0):
+    """
+    在子进程中处理一个会话文件：计算周期，有最佳周期时把 record.txt 和周期段写到暂存目录 <会话目录>.partial。
+    这里不删除源文件，也不修改正式的会话目录，这些操作由主进程的 commit_session 根据返回结果完成。
+    timeout 大于 0 时用 SIGALRM 限制单个会话的处理时间（仅 Unix）。
+    返回结果字典，status 为 split / no_period / no_pair / timeout / error。
+    """
+    staging_path = os.path.splitext(filename)[0] + STAGING_SUFFIX
+    outcome = {'file': filename, 'status': None, 'period': None, 'result': None,
+               'segments': 0, 'seconds': 0.0, 'message': ''}
+    start = time.time()
+    use_alarm = timeout > 0 and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(math.ceil(timeout)))
+    try:
+        # 计算当前的会话文件是否具有候选周期
+        period = flow_to_periods(filename, sparse)
+        outcome['period'] = period
+        if not period:
+            outcome['status'] = 'no_period'
+        else:
+            # 从所有的候选周期中找到最接近的周期
+            result = find_closest_pair(period)
+            if result is None:
+                outcome['status'] = 'no_pair'
+            else:
+                if os.path.exists(staging_path):
+                    shutil.rmtree(staging_path)  # 上次中断留下的暂存目录
+                os.makedirs(staging_path)
+                # 创建一个record.txt保存周期情况，其中有候选周期的信息，也有选择的最佳周期的信息
+                with open(os.path.join(staging_path, "record.txt"), "w") as txt_file:
+                    txt_file.write("候选周期:" + str(period) + "\n" + "选择周期:" + str(result))
+                if manifest:
+                    outcome['segments'] = segment_pcap(filename, staging_path, result[0], move_source=False)
+                else:
+                    outcome['segments'] = split_pcap(filename, staging_path, result[0])
+                outcome['result'] = result
+                outcome['status'] = 'split'
+    except SessionTimeout:
+        outcome['status'] = 'timeout'
+        outcome['message'] = f'超过 {timeout} 秒未完成'
+        shutil.rmtree(staging_path, ignore_errors=True)
+    except Exception as e:
+        outcome['status'] = 'error'
+        outcome['message'] = repr(e)
+        shutil.rmtree(staging_path, ignore_errors=True)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+        outcome['seconds'] = time.time() - start
+    return outcome
+
+
+def pool_outcomes(futs):
+    """
+    按完成顺序返回进程池中各会话的处理结果，futs 为 {future: 会话文件}。
+    子进程被杀死（如 OOM）时进程池抛出 BrokenProcessPool，未完成的会话记为 error 并清理其暂存目录，
+    已经完成的会话照常返回，由主进程提交。
+    """
+    for fut in as_completed(futs):
+        try:
+            yield fut.result()
+        except Exception as e:
+            filename = futs[fut]
+            shutil.rmtree(os.path.splitext(filename)[0] + STAGING_SUFFIX, ignore_errors=True)
+            yield {'file': filename, 'status': 'error', 'period': None, 'result': None,
+                   'segments': 0, 'seconds': 0.0, 'message': repr(e)}
+
+
+def commit_session(outcome, manifest=False):
+    """在主进程中提交一个会话的处理结果：删除没有周期的源文件，或将暂存目录改名为会话目录并删除（清单模式下移动）源文件。"""
+    filename = outcome['file']
+    folder_path = os.path.splitext(filename)[0]  # 用于将文件名分割成两部分：文件名和扩展名
+    status = outcome['status']
+    if status in ('no_period', 'no_pair'):
+        try:
+            os.remove(filename)
+            remove_index(filename)
+            print("当前文件 ", filename, ' 没有周期，文件删除成功。' if status == 'no_period' else ' 没有最接近的周期，文件删除成功。')
+        except OSError as e:
+            print("文件删除失败:", e)
+    elif status == 'split':
+        if os.path.exists(folder_path):
+            shutil.rmtree(folder_path)
+        os.replace(folder_path + STAGING_SUFFIX, folder_path)
+        print('当前周期会话的目录是： ', folder_path)
+        session_file = os.path.join(folder_path, SESSION_PCAP_NAME)
+        if manifest and not os.path.exists(session_file):
+            # 源文件移动到会话目录中，周期段只记录在清单 segments.csv 里
+            os.replace(filename, session_file)
+            move_index(filename, session_file)
+        else:
+            # 删除源文件
+            try:
+                os.remove(filename)
+                remove_index(filename)
+                print(f"源文件 {filename} 删除成功。")
+            except OSError as e:
+                print(f"源文件 {filename} 删除失败: {e}")
+    else:
+        print(f"会话文件 {filename} 处理失败（{status}），保留源文件: {outcome['message']}")
+
+
+def write_results(path, outcomes):
+    """
+    将本次的处理结果合并到 path/period_results.csv 中（按会话更新），先写临时文件再替换，
+    中途中断也不会留下不完整的结果文件。
+    """
+    results_path = os.path.join(path, RESULTS_NAME)
+    rows = {}
+    if os.path.exists(results_path):
+        with open(results_path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                rows[row['session']] = row
+    for outcome in outcomes:
+        session = os.path.relpath(os.path.splitext(outcome['file'])[0], path).replace(os.sep, '/')
+        rows[session] = {
+            'session': session,
+            'status': outcome['status'],
+            'period': outcome['result'][0] if outcome['result'] else '',
+            'segments': outcome['segments'],
+            'seconds': f"{outcome['seconds']:.3f}",
+            'message': outcome['message'],
+        }
+    tmp_path = results_path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for session in sorted(rows):
+            writer.writerow(rows[session])
+    os.replace(tmp_path, results_path)
+
+
+def register_outcomes(conn, path, outcomes):
+    """把处理结果登记到目录库：会话位于 设备/日期/会话.pcap，拆分成功的会话同时登记周期段。"""
+    for outcome in outcomes:
+        folder_path = os.path.splitext(outcome['file'])[0]
+        parts = os.path.relpath(folder_path, path).split(os.sep)
+        device, session = parts[0], parts[-1]
+        day = parts[1] if len(parts) > 2 else ''
+        result = outcome['result']
+        register_session(conn, device, day, session, status=outcome['status'],
+                         period=result[0] if result else None, selection=str(result) if result else None,
+                         segments=outcome['segments'], seconds=round(outcome['seconds'], 3))
+        if outcome['status'] == 'split':
+            if has_manifest(folder_path):
+                segments = read_manifest(folder_path)
+            else:
+                segments = [{'segment': os.path.splitext(f)[0]} for f in sorted(os.listdir(folder_path))
+                            if f.endswith('.pcap')]
+            register_segments(conn, device, day, session, segments)
+
+
+def enumerate_session_files(path):
+    """列出待处理的会话文件，按文件大小从大到小排序，让最大的会话最先开始。"""
+    session_files = []
     for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.endswith(STAGING_SUFFIX)]
         for file in files:
             if file.endswith(".pcap"):
-                filename = os.path.join(root, file)
-                print("当前正在处理会话文件: ", filename)
-                # 计算当前的会话文件是否具有候选周期
-                period = flow_to_periods(filename)
-                print("提取当前文件的所有周期信息: ", period)
-
-                if not period:
-                    try:
-                        os.remove(filename)
-                        print("当前文件 ", filename, ' 没有周期，文件删除成功:')
-                    except OSError as e:
-                        print("文件删除失败:", e)
-                # 如果有候选周期，为该会话文件创建一个目录
-                else:
-                    folder_path = os.path.splitext(filename)[0] # 用于将文件名分割成两部分：文件名和扩展名
-                    print('当前周期会话的目录是： ', folder_path)
-                    if not os.path.exists(folder_path):
-                        os.makedirs(folder_path)
-                    # 从所有的候选周期中找到最接近的周期
-                    result = find_closest_pair(period)
-                    if result is None:
-                        try:
-                            os.remove(filename)
-                            print("当前文件 ", filename, ' 没有最接近的周期，文件删除成功。')
-                        except OSError as e:
-                            print("文件删除失败:", e)
-                    else:
-                        # 如果有最佳周期，则创建一个record.txt保存周期情况，其中有候选周期的信息，也有选择的最佳周期的信息
-                        txt_file_path = os.path.join(folder_path, "record.txt")
-                        print('已为当前会话创建周期的记录文件record.txt')
-                        with open(txt_file_path, "w") as txt_file:
-                            txt_file.write("候选周期:" + str(period) + "\n" + "选择周期:" + str(result))
-
-                        files_split = split_pcap(filename, folder_path, result[0])
-                        print('当前会话文件划分出 ', files_split, ' 个周期段')
-                        total_files_split += files_split  # 更新总文件计数器
-
-                        # 删除源文件
-                        try:
-                            os.remove(filename)
-                            print(f"源文件 {filename} 删除成功。")
-                        except OSError as e:
-                            print(f"源文件 {filename} 删除失败: {e}")
-
-                total_sessions += 1  # 更新会话计数器
+                # 清单模式下已处理过的会话目录，session.pcap 是周期段的数据，不再作为会话处理
+                if file == SESSION_PCAP_NAME and has_manifest(root):
+                    continue
+                session_files.append(os.path.join(root, file))
+    session_files.sort(key=os.path.getsize, reverse=True)
+    return session_files
+
+
+def process_pcap_files(path, sparse=False, manifest=False, workers=1, timeout=0):
+    total_sessions = 0  # 总共处理的会话数量
+    total_files_split = 0  # 总共划分的文件数量
+    session_files = enumerate_session_files(path)
+    outcomes = []
+
+    if workers <= 1:
+        completed = (process_session(filename, sparse, manifest, timeout) for filename in session_files)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futs = {executor.submit(process_session, filename, sparse, manifest, timeout): filename
+                for filename in session_files}
+        completed = pool_outcomes(futs)
+
+    try:
+        for outcome in completed:
+            print("当前处理完成的会话文件: ", outcome['file'])
+            print("提取当前文件的所有周期信息: ", outcome['period'])
+            commit_session(outcome, manifest)
+            if outcome['status'] == 'split':
+                print('当前会话文件划分出 ', outcome['segments'], ' 个周期段')
+                total_files_split += outcome['segments']  # 更新总文件计数器
+            total_sessions += 1  # 更新会话计数器
+            outcomes.append(outcome)
             print('******\n')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        write_results(path, outcomes)
+        conn = connect_catalog()
+        if conn is not None:
+            with conn:
+                register_outcomes(conn, path, outcomes)
+            conn.close()
 
     print("总共处理的会话文件数量:", total_sessions)
     print("总共划分的文件数量:", total_files_split)
 
 
 def main():
-    path = r'artifact/outputs/period/3_selectDir'
-    process_pcap_files(path)
+    parser = argparse.ArgumentParser(description="检测会话文件的周期并按周期拆分")
+    parser.add_argument("--path", default=r'artifact/outputs/period/3_selectDir',
+                        help="会话文件根目录")
+    cpu_cnt = multiprocessing.cpu_count()
+    parser.add_argument("--workers", type=int, default=cpu_cnt,
+                        help=f"并行进程数（默认={cpu_cnt}）")
+    parser.add_argument("--timeout", type=float, default=0,
+                        help="单个会话的处理时间上限（秒），0 表示不限制")
+    parser.add_argument("--sparse", action="store_true",
+                        help="使用稀疏会话的周期检测")
+    parser.add_argument("--manifest", action="store_true",
+                        help="周期段只记录在 segments.csv 中，不拆分成 output_<ts>.pcap 文件")
+    args = parser.parse_args()
+
+    process_pcap_files(args.path, args.sparse, args.manifest, args.workers, args.timeout)
 
 
 if __name__ == "__main__":
@@ -1,94 +1,70 @@
 # -*- coding: utf-8 -*-
 
 """
-将原目录下的所有文件复制到新路径下，保留目录结构，并在新路径下进行过滤处理。
+按聚类清单筛选 2.9 得到的簇，把保留的簇发布到新路径下，保留目录结构。
 实现的功能：
-1、复制文件及其目录结构：将一个源文件夹中所有以 .csv 结尾的文件，按照原目录结构复制到一个目标文件夹。
-2、过滤并处理 CSV 文件：在目标文件夹中，对每个 CSV 文件进行过滤：
-    删除文件名为 noise_samples.csv 的文件。
-    根据文件夹名称中的样本数量，检查 CSV 文件的行数（特征向量数目），如果小于特定阈值，就删除文件。
-
-1. 文件复制与目录结构保留
-    遍历源文件夹，复制所有以 .csv 结尾的文件到目标文件夹。
-    复制时保留原始目录结构。
-2. 文件过滤规则
-    如果文件名为 noise_samples.csv，直接删除。
-    从会话文件夹名称中提取样本总数。
-    检查每个 CSV 文件的行数（特征向量数目）。如果行数少于样本总数的一半，删除文件。
-3. 输出统计信息
-    打印每个文件的处理信息，包括路径、特征向量数目和是否被删除。
-    最后统计并输出总处理的 CSV 文件数和删除的文件数。
+1、筛选簇：读取 2.9 输出根目录下的聚类清单 clusters.csv（tool.cluster_manifest），其中已记录每个簇的数据包数目：
+    删除噪声簇（cluster 为 -1，即原来的 noise_samples.csv）。
+    根据会话名称中的样本数量，检查簇的数据包数目（特征向量数目），如果小于特定阈值，就删除该簇。
+2、发布：只需读取清单，不再复制并重新读取每个簇文件。
+    有保留簇的会话表以硬链接发布到目标文件夹（不支持硬链接时复制），并在目标文件夹写入只包含保留簇的清单。
+
+1. 簇的筛选规则
+    如果簇为噪声，直接删除。
+    从会话名称中提取样本总数。
+    如果簇的数据包数目少于样本总数的一半，删除该簇。
+2. 会话表的发布
+    按原始目录结构发布会话表，没有保留簇的会话不发布。
+3. 目录库
+    设置 DEVICEID_CATALOG 时，把清单中的簇和筛选结果登记到目录库（tool.catalog）。
+    簇始终以 2.9 写在会话表旁边的清单为准：目录库是可选的，2.9 没有设置目录库运行时其中的簇记录会过期。
+4. 输出统计信息
+    打印每个簇的处理信息，包括会话、特征向量数目和是否被删除。
+    最后统计并输出总处理的簇数和删除的簇数。
 """
 
 import os
-import shutil
-import pandas as pd
+import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.cluster_manifest import read_cluster_manifest, write_cluster_manifest
+from tool.publish import link_or_copy
+from tool.catalog import connect_catalog, register_clusters, mark_kept_clusters
 
-# 复制文件及其目录结构
-def copy_files_with_structure(source_folder, target_folder):
-    for root, dirs, files in os.walk(source_folder):
-        for file in files:
-            if file.endswith('.csv'):
-                # 构建源文件路径
-                source_file_path = os.path.join(root, file)
 
-                # 计算目标文件路径
-                relative_path = os.path.relpath(root, source_folder)  # 获取相对路径
-                target_dir_path = os.path.join(target_folder, relative_path)  # 构建新的目标文件夹路径
+# 按聚类清单筛选簇，返回保留的簇
+def filter_clusters(clusters):
+    kept = []
+    for cluster in clusters:
+        cluster_name = f"{cluster['device']}/{cluster['session']} cluster {cluster['cluster']}"
 
-                # 如果目标文件夹不存在，创建它
-                if not os.path.exists(target_dir_path):
-                    os.makedirs(target_dir_path)
+        # 如果是噪声簇，直接删除
+        if cluster['cluster'] == -1:
+            print(f"Deleting noise samples of {cluster_name}")
+            continue
 
-                # 构建目标文件路径
-                target_file_path = os.path.join(target_dir_path, file)
+        # 会话名称的最后一部分是样本数目
+        sample_count = int(cluster['session'].split('___')[-1])
+        vector_count = cluster['rows']
+        print(f"Processing {cluster_name}... Vector count: {vector_count}, Required: {sample_count / 2}")
 
-                # 复制文件到目标路径
-                shutil.copy2(source_file_path, target_file_path)
-                print(f"Copied {source_file_path} to {target_file_path}")
+        # 如果特征向量数目小于 (样本数目 / 2)，删除该簇。说明该数据包并不存在于大部分样本中，所需的数据包应该是起码在大部分的样本中都出现1次或者多次的
+        if vector_count < (sample_count / 2):
+            print(f"Deleting {cluster_name}")
+            continue
+        kept.append(cluster)
+    return kept
 
 
-# 过滤处理 CSV 文件，删除不符合条件的文件
-def process_csv_files(root_folder):
-    total_files = 0
-    deleted_files = 0
-
-    for root, dirs, files in os.walk(root_folder):
-        for file in files:
-            if file.endswith('.csv'):
-                total_files += 1
-                file_path = os.path.join(root, file)
-
-                # 如果文件名是 noise_samples.csv，直接删除
-                if file == 'noise_samples.csv':
-                    print('*')
-                    print(f"Deleting noise_samples.csv at {file_path}")
-                    print()
-                    os.remove(file_path)
-                    deleted_files += 1
-                    continue  # 跳过之后的处理逻辑
-
-                # 从文件路径中获取会话文件夹名称的最后一部分（假设是样本数目）
-                session_folder = os.path.basename(root)  # 获取会话文件夹名称
-                sample_count = int(session_folder.split('___')[-1])  # 假设最后一部分是样本数
-
-                # 读取 CSV 文件
-                df = pd.read_csv(file_path)
-                vector_count = len(df)  # 获取特征向量的行数
-
-                # 打印文件信息
-                print(f"Processing {file_path}... Vector count: {vector_count}, Required: {sample_count / 2}")
-
-                # 如果特征向量数目小于 (样本数目 / 2)，删除文件。说明该数据包并不存在于大部分样本中，所需的数据包应该是起码在大部分的样本中都出现1次或者多次的
-                if vector_count < (sample_count / 2):
-                    print(f"Deleting {file_path}")
-                    os.remove(file_path)
-                    deleted_files += 1
-
-                print()
-
-    return total_files, deleted_files
+# 发布有保留簇的会话表，并写入筛选后的清单
+def publish_clusters(source_folder, target_folder, clusters):
+    for table in dict.fromkeys(cluster['table'] for cluster in clusters):
+        source_file_path = os.path.join(source_folder, table)
+        target_file_path = os.path.join(target_folder, table)
+        os.makedirs(os.path.dirname(target_file_path), exist_ok=True)
+        link_or_copy(source_file_path, target_file_path)
+        print(f"Published {source_file_path} to {target_file_path}")
+    return write_cluster_manifest(target_folder, clusters)
 
 
 def main():
@@ -99,19 +75,28 @@ def main():
     # source_folder = '/home/hyj/deviceIdentification/dataset/test/us'
     # target_folder = '/home/hyj/deviceIdentification/dataset/test1/us'
 
-    # 复制文件到目标路径，并保留目录结构
-    print(f"Copying files from {source_folder} to {target_folder}...")
-    copy_files_with_structure(source_folder, target_folder)
+    # 按清单筛选簇
+    print(f"Filtering clusters listed in {source_folder}...")
+    clusters = read_cluster_manifest(source_folder)
+    kept = filter_clusters(clusters)
 
-    # 开始在新的路径下处理 CSV 文件9
-    print(f"Starting to process CSV files in {target_folder}...")
-    total_files, deleted_files = process_csv_files(target_folder)
+    # 目录库中的簇与清单同步，并登记筛选结果
+    conn = connect_catalog()
+    if conn is not None:
+        with conn:
+            register_clusters(conn, clusters)
+            mark_kept_clusters(conn, clusters, kept)
+        conn.close()
+
+    # 发布保留的簇到目标路径，并保留目录结构
+    print(f"Publishing clusters to {target_folder}...")
+    manifest_path = publish_clusters(source_folder, target_folder, kept)
 
     # 打印处理结果
-    print(f"Total CSV files processed: {total_files}")
-    print(f"Total CSV files deleted: {deleted_files}")
+    print(f"Cluster manifest saved to {manifest_path}")
+    print(f"Total clusters processed: {len(clusters)}")
+    print(f"Total clusters deleted: {len(clusters) - len(kept)}")
 
 
 if __name__ == "__main__":
     main()
-
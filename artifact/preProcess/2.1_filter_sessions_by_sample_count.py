@@ -6,25 +6,57 @@
 实现的功能：
 1、复制文件：将源文件夹 src_folder 中的所有文件和子目录复制到目标文件夹 dst_folder。
 2、过滤操作：检查目标文件夹中每个会话文件夹（包含 .pcap 文件的文件夹），如果 .pcap 文件数量少于 15 个，则删除该会话文件夹。
+   1.3 以清单模式拆分的会话（目录下有 segments.csv），样本数为清单中的周期段数目。
 3、输出信息：在操作过程中打印每个文件的复制路径和被删除的会话文件夹路径。
-
-1. 文件和目录复制
-    将源目录下的所有文件和子目录完整复制到目标目录中。
-    记录每个复制文件的源路径和目标路径。
-2. 会话过滤与清理
-    遍历目标目录，检查每个会话文件夹中的 .pcap 文件数量。
-    如果某个会话文件夹中的 .pcap 文件少于 15 个，则删除该会话文件夹。
-    打印被删除的会话文件夹路径。
+现在先在源目录中筛选，只把样本足够的会话以硬链接（不支持时复制）发布到目标目录，不再复制整棵目录树后再删除大部分会话。
+
+1. 会话筛选
+    find_small_sessions 遍历源目录，检查每个会话文件夹中的样本数目（.pcap 文件数量或清单中的周期段数目）。
+    样本少于 15 个的会话文件夹不发布，打印被删除的会话文件夹路径。
+2. 文件和目录发布
+    将源目录下其余的文件和子目录按原目录结构硬链接到目标目录中。
+    记录每个发布文件的源路径和目标路径。
 3. 主函数执行流程
     设置源目录和目标目录路径。
     确保目标目录存在。
-    执行复制操作。
-    对目标目录中的会话文件夹进行筛选和清理。
+    先筛选，再发布；目标目录中残留的、已被筛掉的会话文件夹一并删除。
+    copy_all_files / filter_and_clean 保留原来的先复制后清理的流程。
+4. 目录库
+    设置 DEVICEID_CATALOG 时，把每个会话的样本数登记到目录库（tool.catalog）。
 """
 
 import os
+import sys
 import shutil
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.segment_manifest import MANIFEST_NAME, count_segments
+from tool.publish import link_or_copy, publish_tree
+from tool.catalog import connect_catalog, register_session
+
+MIN_SAMPLES = 15  # 会话保留所需的最少样本数
+
+
+# 会话文件夹的样本数，清单模式下一个周期段是一个样本
+def count_session_samples(root, files):
+    pcap_files = [f for f in files if f.endswith('.pcap')]
+    if not pcap_files:
+        return None  # 不是会话文件夹
+    return count_segments(root) if MANIFEST_NAME in files else len(pcap_files)
+
+
+def find_small_sessions(src_folder, sample_counts=None):
+    # 在源文件夹中找出样本数不足的会话文件夹，这些文件夹及其子目录都不发布；sample_counts 不为空时记录每个会话的样本数
+    small_sessions = []
+    for root, dirs, files in os.walk(src_folder):
+        sample_count = count_session_samples(root, files)
+        if sample_count is not None and sample_counts is not None:
+            sample_counts[root] = sample_count
+        if sample_count is not None and sample_count < MIN_SAMPLES:
+            small_sessions.append(root)
+            dirs[:] = []
+    return small_sessions
+
 
 def copy_all_files(src_folder, dst_folder):
     # 复制源文件夹下的所有文件及目录到目标文件夹
@@ -41,7 +73,7 @@ def copy_all_files(src_folder, dst_folder):
         for file in files:
             src_file = os.path.join(root, file)
             dst_file = os.path.join(dst_path, file)
-            shutil.copy2(src_file, dst_file)
+            link_or_copy(src_file, dst_file)
             print(f"Copied: {src_file} -> {dst_file}")
 
 
@@ -49,10 +81,10 @@ def filter_and_clean(dst_folder):
     # 在目标文件夹下进行过滤操作
     for root, dirs, files in os.walk(dst_folder):
         # 只处理包含 .pcap 文件的会话文件夹
-        pcap_files = [f for f in files if f.endswith('.pcap')]
+        sample_count = count_session_samples(root, files)
 
-        if pcap_files:
-            if len(pcap_files) < 15:
+        if sample_count is not None:
+            if sample_count < MIN_SAMPLES:
                 # 如果 .pcap 文件数量小于15，则删除会话文件夹
                 shutil.rmtree(root)
                 print(f"Deleted: {root}")
@@ -66,11 +98,27 @@ def main():
     if not os.path.exists(dst_folder):
         os.makedirs(dst_folder)
 
-    # 先复制所有文件到新路径
-    copy_all_files(src_folder, dst_folder)
-
-    # 然后在新路径下进行过滤操作
-    filter_and_clean(dst_folder)
+    # 先在源路径下筛选出样本不足的会话
+    sample_counts = {}
+    small_sessions = find_small_sessions(src_folder, sample_counts)
+    for session in small_sessions:
+        dst_session = os.path.join(dst_folder, os.path.relpath(session, src_folder))
+        if os.path.exists(dst_session):
+            shutil.rmtree(dst_session)  # 上次运行留下的会话文件夹
+        print(f"Deleted: {dst_session}")
+
+    # 然后只把其余的文件发布（硬链接）到新路径
+    publish_tree(src_folder, dst_folder, skip_dirs=small_sessions)
+
+    # 登记每个会话的样本数，会话位于 设备/日期/会话 目录下
+    conn = connect_catalog()
+    if conn is not None:
+        with conn:
+            for session_folder, sample_count in sample_counts.items():
+                parts = os.path.relpath(session_folder, src_folder).split(os.sep)
+                day = parts[1] if len(parts) > 2 else ''
+                register_session(conn, parts[0], day, parts[-1], samples=sample_count)
+        conn.close()
 
 
 # 运行主函数
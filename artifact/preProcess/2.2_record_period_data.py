@@ -20,9 +20,19 @@
         设备名称 设备的 会话名称 周期信息
 5. 控制台输出
     打印记录到控制台，便于实时查看和调试。
+6. 目录库
+    设置 DEVICEID_CATALOG 时，直接从目录库（tool.catalog）查询 1.3 登记的选择周期和 2.1 登记的样本数，
+    生成同样格式的记录，不再遍历目录、读取每个 record.txt。
+    目录库是可选的，可能保存着之后已被删除的会话，只记录在 start_path 中仍存在会话文件夹的会话。
 """
 
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.catalog import connect_catalog, query_period_records
+
+MIN_SAMPLES = 15  # 与 2.1 相同，样本数不足的会话不记录
 
 
 # 读取指定文件的所有行，并返回文件的最后一行。如果文件为空，则返回空字符串。
@@ -40,10 +50,35 @@ def write_to_txt_file(file_path, content):
         file.write(content)
 
 
+# 从目录库生成记录
+def record_from_catalog(conn, start_path, period_record):
+    previous_device = None  # 用来跟踪上一个处理的设备
+    for row in query_period_records(conn, MIN_SAMPLES):
+        device_name = row['device']
+        # 会话文件夹位于 设备/日期/会话 下，已不存在的会话不记录
+        session_path = os.path.join(start_path, *[p for p in (device_name, row['day'], row['session']) if p])
+        if not os.path.isdir(session_path):
+            continue
+        if previous_device and previous_device != device_name:
+            write_to_txt_file(period_record, "\n")
+        previous_device = device_name
+
+        # record.txt 的最后一行为 "选择周期:" 加上选择的周期
+        content = f"{device_name} 设备的 {row['session']} 选择周期:{row['selection']}\n"
+        print(content.strip())
+        write_to_txt_file(period_record, content)
+
+
 def main():
     start_path = r'artifact/outputs/preproc/4_suitableDir'
     period_record = os.path.join(start_path, 'period_record.txt')
 
+    conn = connect_catalog()
+    if conn is not None:
+        record_from_catalog(conn, start_path, period_record)
+        conn.close()
+        return
+
     previous_device = None  # 用来跟踪上一个处理的设备
 
     # 遍历根目录下的所有内容
@@ -5,23 +5,48 @@
 改进点：
 1) 多进程按“文件粒度”并行（--workers），默认=CPU核心数；
 2) 智能降级 tshark 字段（遇到 “Some fields aren't valid” 自动移除问题字段并重试）；
+   现在启动时先用 `tshark -G fields` 确定当前版本支持的字段（按 tshark 版本缓存在 --field-cache），
+   交给各子进程直接使用，每个文件只运行一次 tshark；只有无法确定字段时才退回逐文件降级重试；
 3) 方向判定仅用该设备目录推断到的 MAC（更快）；
-4) 已有且含 direction 列的 CSV 可跳过（--skip-existing）。
+4) 已有且含 direction 列的 CSV 可跳过（--skip-existing）；
+5) 1.3 以清单模式拆分的会话（目录下有 segments.csv），按清单从 session.pcap 中取出每个周期段，经 stdin 交给 tshark，
+   输出的 CSV 与拆分成 output_<ts>.pcap 文件时同名；
+6) 批处理模式（--batch）：每个会话只启动一次 tshark，清单模式直接读取 session.pcap，
+   否则把会话目录下的周期段文件依次拼接成一个临时 pcap；额外输出 frame.number，按各周期段的数据包数目
+   把结果行拆回每个周期段的 CSV，direction/time_interval 仍按周期段单独计算。
+   与逐个周期段运行 tshark 的差异：一次运行中 tshark 的解析状态会跨周期段保留，包括从 SYN 中学到的 TCP 窗口扩大因子、
+   TCP/TLS 重组和专家信息，因此后续周期段的 tcp.window_size、跨周期段的 TLS 记录的 frame.protocols/tls.record.content_type
+   以及 _ws.expert.message 可能与逐段运行不同。逐段运行（不加 --batch）为参照结果；
+7) 内置解码后端（--backend native）：用 tool.packet_fields 直接从 pcap 记录中解码同样的字段，
+   输出相同的 CSV 格式，不需要启动 tshark，在子进程内直接完成（与 tshark 的差异见 tool.packet_fields）；
+8) 提前过滤（--prefilter）：把 2.5 的数据包过滤条件（keep_packet_row）下推到这里，被丢弃的行不再写入 5_csv、
+   也不会在 2.4/2.5 中被复制和重新解析。2.4 的 time_interval 需要按过滤前的全部数据包计算，
+   因此这里先按 2.4 的方式（与上一行 frame.time_epoch 的差）算好 time_interval 再丢弃行，
+   并在输出根目录写入 prefiltered.json，2.4 据此保留该列，2.5 据此跳过行过滤。
+   不使用 tshark 的 -Y 显示过滤，因为它会把计算 time_interval 所需的数据包一起过滤掉。
 
 用法：
 python 2_featureExtraction.py \
   --source /home/hyj/deviceIdentification/dataset/yorthings/4_suitableDir \
   --dest   /home/hyj/deviceIdentification/dataset/yorthings/featureCsv \
-  --workers 16 --no-skip-existing
+  --workers 16 --no-skip-existing [--batch] [--backend native] [--prefilter]
 """
 
 import os
 import csv
+import json
 import subprocess
 import argparse
 import multiprocessing
+import sys
+from bisect import bisect_right
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.segment_manifest import SESSION_PCAP_NAME, has_manifest, read_manifest, read_segment_bytes
+from tool.pcap_io import PcapRecordReader, PcapRecordWriter
+from tool.packet_fields import FIELDS as NATIVE_FIELDS, extract_rows
+
 # ======= 你的设备 MAC 映射，保持原样粘贴完整 =======
 device_mac_mapping = {
     # ...... 请粘贴你给的完整映射表 ......
@@ -53,15 +78,19 @@ PREFERRED_FIELDS = [
     "udp.payload",  # 有些版本不支持；脚本会自动剔除
 ]
 
+PREFILTER_MARKER = "prefiltered.json"  # 输出根目录中的标记文件，说明 CSV 已按 2.5 的条件过滤
+
 # ---------------- 工具函数 ----------------
 
-def run_tshark_fields(pcap_path: str, fields: list, out_csv_path: str) -> subprocess.CompletedProcess:
-    args = ["tshark", "-r", pcap_path, "-T", "fields"]
+def run_tshark_fields(pcap_path: str, fields: list, out_csv_path: str, pcap_bytes: bytes = None) -> subprocess.CompletedProcess:
+    # pcap_bytes 不为空时由 stdin 输入（清单模式的周期段），pcap_path 仅用于提示信息
+    args = ["tshark", "-r", "-" if pcap_bytes is not None else pcap_path, "-T", "fields"]
     for f in fields:
         args += ["-e", f]
     args += ["-E", "header=y", "-E", "separator=,", "-E", "quote=d", "-E", "occurrence=f"]
     with open(out_csv_path, "w", newline="") as fh_out:
-        proc = subprocess.run(args, stdout=fh_out, stderr=subprocess.PIPE, text=True)
+        proc = subprocess.run(args, input=pcap_bytes, stdout=fh_out, stderr=subprocess.PIPE)
+    proc.stderr = proc.stderr.decode("utf-8", errors="replace")
     return proc
 
 def parse_invalid_fields(stderr_text: str) -> list:
@@ -99,132 +128,348 @@ def csv_has_direction(dest_csv: str) -> bool:
     except Exception:
         return False
 
+def tshark_version() -> str:
+    proc = subprocess.run(["tshark", "-v"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    lines = proc.stdout.decode("utf-8", errors="replace").splitlines()
+    return lines[0].strip() if proc.returncode == 0 and lines else ""
+
+def resolve_tshark_fields(cache_path: str, preferred: list = PREFERRED_FIELDS) -> list:
+    """
+    确定当前 tshark 支持 preferred 中的哪些字段，返回保持原顺序的可用字段列表；无法确定时返回 None。
+    结果按 tshark 版本缓存在 cache_path（JSON：{版本: {字段: 是否可用}}），同一版本只查询一次 `tshark -G fields`。
+    """
+    try:
+        version = tshark_version()
+    except OSError:
+        return None
+    if not version:
+        return None
+
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+    known = cache.get(version, {})
+    if any(f not in known for f in preferred):
+        proc = subprocess.run(["tshark", "-G", "fields"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if proc.returncode != 0:
+            return None
+        # 每行以制表符分隔：F/P, 名称, 字段名, ...
+        valid = set()
+        for line in proc.stdout.decode("utf-8", errors="replace").splitlines():
+            parts = line.split("\t")
+            if len(parts) >= 3 and parts[0] in ("F", "P"):
+                valid.add(parts[2])
+        known = {f: f in valid for f in set(preferred) | set(known)}
+        cache[version] = known
+        if cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, cache_path)
+    return [f for f in preferred if known.get(f)]
+
+def run_tshark_with_fallback(pcap_path: str, out_csv_path: str, pcap_bytes: bytes = None,
+                             extra_fields: tuple = (), fields: list = None) -> subprocess.CompletedProcess:
+    """
+    fields 为启动时确定的可用字段时只运行一次 tshark；否则逐步降级字段跑 tshark。
+    extra_fields 追加在字段列表末尾且不会被剔除；失败时返回的 returncode != 0。
+    """
+    if fields is not None:
+        return run_tshark_fields(pcap_path, list(fields) + list(extra_fields), out_csv_path, pcap_bytes)
+    fields = list(PREFERRED_FIELDS)
+    tried = set()
+    for _ in range(4):
+        proc = run_tshark_fields(pcap_path, fields + list(extra_fields), out_csv_path, pcap_bytes)
+        if proc.returncode == 0:
+            break
+        invalid = parse_invalid_fields(proc.stderr)
+        if not invalid:
+            # 经验性剔除（常见不兼容）
+            fallbacks = [f for f in ["udp.payload", "_ws.expert.message", "tcp.payload"] if f in fields]
+            if fallbacks:
+                for f in fallbacks:
+                    fields.remove(f)
+                continue
+            break
+        changed = False
+        for bad in invalid:
+            if bad in fields and bad not in tried:
+                fields.remove(bad); tried.add(bad); changed = True
+        if not changed:
+            break
+    return proc
+
+def keep_packet_row(content_type: str, tcp_len: str, protocols: str) -> bool:
+    """
+    2.5 的数据包过滤条件，满足任一条件的行保留：
+        a. TLS 应用数据包（tls.record.content_type == 23）
+        b. 有效 TCP 数据包（tcp.len ≠ 0 且不包含 tls 协议）
+        c. TLS 握手数据包（frame.protocols 包含 tls 且 tls.record.content_type 为空）
+        d. UDP 数据包（frame.protocols 包含 udp）
+    """
+    # 与 2.5 一样，tcp.len 为空（非 TCP 数据包）时条件 b 成立
+    has_tls = "tls" in protocols
+    return (content_type in ("23", "23.0")
+            or (tcp_len not in ("0", "0.0") and not has_tls)
+            or (has_tls and content_type == "")
+            or "udp" in protocols)
+
+def write_feature_csv(headers: list, rows, dest_csv: str, dev_mac: str, prefilter: bool = False) -> None:
+    """
+    写出 tshark 的结果行，并追加 direction / time_interval 两列（先写临时文件再替换）。
+    prefilter=True 时 time_interval 按 2.4 的方式计算（与上一行的时间差，缺失时为 0），再只写出 keep_packet_row 保留的行。
+    """
+    headers = list(headers)
+    col_type = headers.index("tls.record.content_type") if "tls.record.content_type" in headers else None
+    col_tcp_len = headers.index("tcp.len") if "tcp.len" in headers else None
+    col_proto = headers.index("frame.protocols") if "frame.protocols" in headers else None
+
+    def field(row, col):
+        return row[col] if col is not None and col < len(row) else ""
+
+    tmp_csv = dest_csv + ".tmp"
+    with open(tmp_csv, "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+
+        # 列索引
+        try:
+            col_time = headers.index("frame.time_epoch")
+        except ValueError:
+            col_time = None
+        try:
+            col_src = headers.index("eth.src")
+            col_dst = headers.index("eth.dst")
+        except ValueError:
+            col_src = col_dst = None
+
+        # 已有就覆盖写
+        if "direction" not in headers:
+            headers.append("direction")
+        if "time_interval" not in headers:
+            headers.append("time_interval")
+        writer.writerow(headers)
+
+        prev_time = None
+        for row in rows:
+            # 时间
+            if col_time is not None and col_time < len(row) and row[col_time]:
+                try:
+                    curr_time = float(row[col_time])
+                except ValueError:
+                    curr_time = None
+            else:
+                curr_time = None
+
+            # 方向
+            direction = 0
+            if dev_mac and col_src is not None and col_dst is not None:
+                src_mac = normalize_mac(row[col_src]) if col_src < len(row) else ""
+                dst_mac = normalize_mac(row[col_dst]) if col_dst < len(row) else ""
+                if src_mac == dev_mac:
+                    direction = 1
+                elif dst_mac == dev_mac:
+                    direction = -1
+
+            # 间隔
+            if prefilter:
+                # 与 2.4 的 diff().fillna(0) 相同
+                interval = curr_time - prev_time if prev_time is not None and curr_time is not None else 0.0
+                prev_time = curr_time
+                if not keep_packet_row(field(row, col_type), field(row, col_tcp_len), field(row, col_proto)):
+                    continue
+            else:
+                if prev_time is None or curr_time is None:
+                    interval = 0.0
+                else:
+                    interval = max(0.0, curr_time - prev_time)
+                if curr_time is not None:
+                    prev_time = curr_time
+
+            # 补列（若原文件没有这两列）
+            if "direction" in headers and (len(row) < len(headers)):
+                row += [""] * (len(headers) - len(row))
+            # 设置末两列
+            if "direction" in headers:
+                row[headers.index("direction")] = str(direction)
+            if "time_interval" in headers:
+                row[headers.index("time_interval")] = repr(interval) if prefilter else f"{interval:.6f}"
+
+            writer.writerow(row)
+
+    os.replace(tmp_csv, dest_csv)
+
+def native_rows(pcap_file: str, segment: dict = None) -> list:
+    """内置后端：解码 pcap 文件（或清单模式 session.pcap 中的一个周期段）的字段，返回与 NATIVE_FIELDS 对应的行。"""
+    with PcapRecordReader(pcap_file) as pcap_reader:
+        records = None
+        if segment is not None:
+            records = pcap_reader.records(segment["first_offset"], segment["end_offset"] - 1)
+        return list(extract_rows(pcap_reader, records))
+
 # ---------------- 单文件处理（子进程执行） ----------------
 
-def process_one_file(pcap_file: str, source_root: str, dest_root: str, skip_existing: bool = True) -> tuple:
+def process_one_file(pcap_file: str, source_root: str, dest_root: str, skip_existing: bool = True,
+                     segment: dict = None, backend: str = "tshark", fields: list = None,
+                     prefilter: bool = False) -> tuple:
     """
+    segment 不为空时 pcap_file 为清单模式的 session.pcap，只处理其中的这一个周期段。
+    fields 为主进程确定的 tshark 可用字段，为 None 时逐步降级重试。
     返回 (pcap_file, ok:bool, msg:str)
     """
+    pcap_bytes = None
+    if segment is not None:
+        pcap_file_name = segment["segment"]
+        label = f"{pcap_file}#{pcap_file_name}"
+    else:
+        pcap_file_name = os.path.basename(pcap_file)[:-5]
+        label = pcap_file
     try:
         # 目标 CSV 路径
         rel_dir = os.path.relpath(os.path.dirname(pcap_file), source_root)
         dest_dir = os.path.join(dest_root, rel_dir)
         os.makedirs(dest_dir, exist_ok=True)
-        dest_csv = os.path.join(dest_dir, os.path.basename(pcap_file)[:-5] + ".csv")
+        dest_csv = os.path.join(dest_dir, pcap_file_name + ".csv")
 
         if skip_existing and csv_has_direction(dest_csv):
-            return (pcap_file, True, "skip-existing")
+            return (label, True, "skip-existing")
 
         # 设备 MAC
         dev_name = infer_device_name_from_path(source_root, pcap_file)
         dev_mac = normalize_mac(device_mac_mapping.get(dev_name))
 
-        # 逐步降级字段跑 tshark
-        fields = list(PREFERRED_FIELDS)
-        tried = set()
-        for _ in range(4):
-            proc = run_tshark_fields(pcap_file, fields, dest_csv)
-            if proc.returncode == 0:
-                break
-            invalid = parse_invalid_fields(proc.stderr)
-            if not invalid:
-                # 经验性剔除（常见不兼容）
-                fallbacks = [f for f in ["udp.payload", "_ws.expert.message", "tcp.payload"] if f in fields]
-                if fallbacks:
-                    for f in fallbacks:
-                        fields.remove(f)
-                    continue
-                return (pcap_file, False, f"tshark failed: {proc.stderr.strip()[:200]}")
-            changed = False
-            for bad in invalid:
-                if bad in fields and bad not in tried:
-                    fields.remove(bad); tried.add(bad); changed = True
-            if not changed:
-                return (pcap_file, False, f"tshark failed: {proc.stderr.strip()[:200]}")
+        if backend == "native":
+            write_feature_csv(NATIVE_FIELDS, native_rows(pcap_file, segment), dest_csv, dev_mac, prefilter)
+            return (label, True, "ok")
+
+        if segment is not None:
+            pcap_bytes = read_segment_bytes(pcap_file, segment)
 
+        # 逐步降级字段跑 tshark
+        proc = run_tshark_with_fallback(pcap_file, dest_csv, pcap_bytes, fields=fields)
         if proc.returncode != 0:
-            return (pcap_file, False, f"tshark failed: {proc.stderr.strip()[:200]}")
+            return (label, False, f"tshark failed: {proc.stderr.strip()[:200]}")
 
         # 追加 direction / time_interval
-        tmp_csv = dest_csv + ".tmp"
-        with open(dest_csv, "r", newline="") as infile, open(tmp_csv, "w", newline="") as outfile:
+        with open(dest_csv, "r", newline="") as infile:
             reader = csv.reader(infile)
-            writer = csv.writer(outfile)
-
             headers = next(reader, None)
             if headers is None:
-                return (pcap_file, False, "empty csv")
-
-            # 列索引
-            try:
-                col_time = headers.index("frame.time_epoch")
-            except ValueError:
-                col_time = None
-            try:
-                col_src = headers.index("eth.src")
-                col_dst = headers.index("eth.dst")
-            except ValueError:
-                col_src = col_dst = None
-
-            # 已有就覆盖写
-            if "direction" not in headers:
-                headers.append("direction")
-            if "time_interval" not in headers:
-                headers.append("time_interval")
-            writer.writerow(headers)
-
-            prev_time = None
-            for row in reader:
-                # 时间
-                if col_time is not None and col_time < len(row) and row[col_time]:
-                    try:
-                        curr_time = float(row[col_time])
-                    except ValueError:
-                        curr_time = None
-                else:
-                    curr_time = None
+                return (label, False, "empty csv")
+            # 读完再替换原文件
+            rows = list(reader)
+        write_feature_csv(headers, rows, dest_csv, dev_mac, prefilter)
+        return (label, True, "ok")
+    except Exception as e:
+        return (label, False, repr(e))
 
-                # 方向
-                direction = 0
-                if dev_mac and col_src is not None and col_dst is not None:
-                    src_mac = normalize_mac(row[col_src]) if col_src < len(row) else ""
-                    dst_mac = normalize_mac(row[col_dst]) if col_dst < len(row) else ""
-                    if src_mac == dev_mac:
-                        direction = 1
-                    elif dst_mac == dev_mac:
-                        direction = -1
-
-                # 间隔
-                if prev_time is None or curr_time is None:
-                    interval = 0.0
-                else:
-                    interval = max(0.0, curr_time - prev_time)
-                if curr_time is not None:
-                    prev_time = curr_time
+# ---------------- 按会话批处理（子进程执行） ----------------
+
+def process_session_batch(session_dir: str, tasks: list, source_root: str, dest_root: str,
+                          skip_existing: bool = True, backend: str = "tshark", fields: list = None,
+                          prefilter: bool = False) -> tuple:
+    """
+    对一个会话目录只运行一次 tshark。tasks 为该目录下 enumerate_pcaps 返回的 [(pcap_path, segment)]。
+    清单模式直接读取 session.pcap，否则把周期段文件依次拼接成临时 pcap；
+    额外输出 frame.number，按各周期段的数据包数目把结果行分回每个周期段。
+    tshark 的解析状态（窗口扩大因子、TCP/TLS 重组、专家信息）会跨周期段保留，结果可能与逐段运行不同，见模块说明第 6 项。
+    返回 (session_dir, ok:bool, msg:str)
+    """
+    rel_dir = os.path.relpath(session_dir, source_root)
+    dest_dir = os.path.join(dest_root, rel_dir)
+    batch_pcap = os.path.join(dest_dir, ".batch.pcap")
+    batch_csv = os.path.join(dest_dir, ".batch.csv")
+    try:
+        os.makedirs(dest_dir, exist_ok=True)
+        names = [seg["segment"] if seg is not None else os.path.basename(p)[:-5] for p, seg in tasks]
+        dest_csvs = [os.path.join(dest_dir, name + ".csv") for name in names]
+        if skip_existing and all(csv_has_direction(d) for d in dest_csvs):
+            return (session_dir, True, "skip-existing")
 
-                # 补列（若原文件没有这两列）
-                if "direction" in headers and (len(row) < len(headers)):
-                    row += [""] * (len(headers) - len(row))
-                # 设置末两列
-                if "direction" in headers:
-                    row[headers.index("direction")] = str(direction)
-                if "time_interval" in headers:
-                    row[headers.index("time_interval")] = f"{interval:.6f}"
+        dev_name = infer_device_name_from_path(source_root, tasks[0][0])
+        dev_mac = normalize_mac(device_mac_mapping.get(dev_name))
 
-                writer.writerow(row)
+        if backend == "native":
+            # 内置后端没有进程启动开销，直接逐个周期段解码
+            for (pcap_file, seg), dest_csv in zip(tasks, dest_csvs):
+                write_feature_csv(NATIVE_FIELDS, native_rows(pcap_file, seg), dest_csv, dev_mac, prefilter)
+            return (session_dir, True, f"ok ({len(dest_csvs)} segments)")
+
+        # 输入文件和每个周期段的数据包数目（周期段在输入中按顺序连续存放）
+        if tasks[0][1] is not None:
+            input_pcap = tasks[0][0]
+            counts = [seg["packets"] for _, seg in tasks]
+        else:
+            input_pcap = batch_pcap
+            counts = []
+            writer = None
+            for pcap_file, _ in tasks:
+                count = 0
+                with PcapRecordReader(pcap_file) as pcap_reader:
+                    if writer is None:
+                        writer = PcapRecordWriter(batch_pcap, pcap_reader.pcap_header)
+                    for _, _, record in pcap_reader:
+                        writer.write(record)
+                        count += 1
+                counts.append(count)
+            writer.close()
+        ends = []
+        total = 0
+        for count in counts:
+            total += count
+            ends.append(total)
+
+        proc = run_tshark_with_fallback(input_pcap, batch_csv, extra_fields=("frame.number",), fields=fields)
+        if proc.returncode != 0:
+            return (session_dir, False, f"tshark failed: {proc.stderr.strip()[:200]}")
 
-        os.replace(tmp_csv, dest_csv)
-        return (pcap_file, True, "ok")
+        # 按 frame.number 把结果行分到各周期段，没有结果行的周期段也写出只有表头的 CSV
+        with open(batch_csv, "r", newline="") as infile:
+            reader = csv.reader(infile)
+            headers = next(reader, None)
+            if headers is None:
+                return (session_dir, False, "empty csv")
+            col_frame = headers.index("frame.number")
+            out_headers = headers[:col_frame] + headers[col_frame + 1:]
+            current = 0
+            rows = []
+            for row in reader:
+                frame_no = int(row[col_frame])
+                seg_idx = bisect_right(ends, frame_no - 1)
+                while current < seg_idx:
+                    write_feature_csv(out_headers, rows, dest_csvs[current], dev_mac, prefilter)
+                    current += 1
+                    rows = []
+                rows.append(row[:col_frame] + row[col_frame + 1:])
+            while current < len(dest_csvs):
+                write_feature_csv(out_headers, rows, dest_csvs[current], dev_mac, prefilter)
+                current += 1
+                rows = []
+        return (session_dir, True, f"ok ({len(dest_csvs)} segments)")
     except Exception as e:
-        return (pcap_file, False, repr(e))
+        return (session_dir, False, repr(e))
+    finally:
+        for tmp in (batch_pcap, batch_csv):
+            if os.path.exists(tmp):
+                os.remove(tmp)
 
 # ---------------- 主流程（并行调度） ----------------
 
 def enumerate_pcaps(source_root: str):
+    """返回 (pcap_path, segment)；清单模式的会话目录按周期段展开，segment 为清单中的一行，普通 pcap 文件的 segment 为 None。"""
     for r, _ds, fs in os.walk(source_root):
+        if SESSION_PCAP_NAME in fs and has_manifest(r):
+            session_pcap = os.path.join(r, SESSION_PCAP_NAME)
+            for segment in read_manifest(r):
+                yield session_pcap, segment
+            continue
         for fn in fs:
             if fn.lower().endswith(".pcap"):
-                yield os.path.join(r, fn)
+                yield os.path.join(r, fn), None
 
 def main():
     parser = argparse.ArgumentParser(description="并行提取 PCAP 特征到 CSV（tshark）")
@@ -239,18 +484,55 @@ def main():
                         help="若目标 CSV 已存在且含 direction 列则跳过（默认开启）")
     parser.add_argument("--no-skip-existing", dest="skip", action="store_false",
                         help="不跳过已存在 CSV，强制重跑")
+    parser.add_argument("--batch", action="store_true",
+                        help="每个会话只运行一次 tshark，再按周期段拆分结果（解析状态跨周期段保留，见模块说明）")
+    parser.add_argument("--backend", choices=["tshark", "native"], default="tshark",
+                        help="字段提取后端：tshark（默认）或内置解码 native")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="按 2.5 的条件提前过滤数据包，只写出保留的行")
+    parser.add_argument("--field-cache", default="artifact/outputs/preproc/tshark_fields.json",
+                        help="按 tshark 版本缓存可用字段的文件")
     args = parser.parse_args()
 
     os.makedirs(args.dest, exist_ok=True)
+    # 过滤模式与已有输出不一致时，已有的 CSV 不能跳过
+    marker = os.path.join(args.dest, PREFILTER_MARKER)
+    if args.skip and os.path.exists(marker) != args.prefilter:
+        print("[INFO] 过滤模式与已有输出不同，不跳过已有 CSV")
+        args.skip = False
+    if args.prefilter:
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump({"filter": "2.5 keep_packet_row", "time_interval": "2.4 diff"}, f)
+    elif os.path.exists(marker):
+        os.remove(marker)
+    fields = None
+    if args.backend == "tshark":
+        fields = resolve_tshark_fields(args.field_cache)
+        if fields is None:
+            print("[WARN] 无法确定 tshark 可用字段，逐文件降级重试")
+        else:
+            print(f"[CONF] tshark fields={len(fields)}/{len(PREFERRED_FIELDS)} dropped="
+                  f"{[f for f in PREFERRED_FIELDS if f not in fields]}")
     pcaps = list(enumerate_pcaps(args.source))
     if not pcaps:
         print("[INFO] 未发现 .pcap 文件"); return
 
-    print(f"[CONF] files={len(pcaps)} workers={args.workers} skip_existing={args.skip}")
+    print(f"[CONF] files={len(pcaps)} workers={args.workers} skip_existing={args.skip} batch={args.batch} backend={args.backend}")
     ok = fail = 0
 
     with ProcessPoolExecutor(max_workers=args.workers) as ex:
-        futs = [ex.submit(process_one_file, p, args.source, args.dest, args.skip) for p in pcaps]
+        if args.batch:
+            # 按会话目录分组，每组一个任务
+            sessions = {}
+            for p, seg in pcaps:
+                sessions.setdefault(os.path.dirname(p), []).append((p, seg))
+            futs = [ex.submit(process_session_batch, d, tasks, args.source, args.dest, args.skip, args.backend,
+                              fields, args.prefilter)
+                    for d, tasks in sessions.items()]
+        else:
+            futs = [ex.submit(process_one_file, p, args.source, args.dest, args.skip, seg, args.backend,
+                              fields, args.prefilter)
+                    for p, seg in pcaps]
         for i, fut in enumerate(as_completed(futs), 1):
             pcap_file, success, msg = fut.result()
             if success:
@@ -258,9 +540,9 @@ def main():
             else:
                 fail += 1
             if i % 20 == 0 or not success:
-                print(f"[{i}/{len(pcaps)}] {('OK','FAIL')[not success]} :: {pcap_file} :: {msg}")
+                print(f"[{i}/{len(futs)}] {('OK','FAIL')[not success]} :: {pcap_file} :: {msg}")
 
-    print(f"[DONE] total={len(pcaps)} ok={ok} fail={fail}")
+    print(f"[DONE] total={len(futs)} ok={ok} fail={fail}")
 
 if __name__ == "__main__":
     main()
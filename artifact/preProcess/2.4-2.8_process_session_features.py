@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+合并执行 2.4 ~ 2.8：逐会话读取 2.3 输出的样本 CSV，在内存中依次完成
+添加时间间隔（2.4）、过滤数据包（2.5）、随机选取样本（2.6）、提取特征列（2.7）和合并会话（2.8），
+只写出每个会话合并后的特征表（10_featureMerge），不再写出 6_csvAddTime、7_csvFilter、8_csvSelect 这些中间目录。
+分步脚本 2.4 ~ 2.8 保留不变，调试时仍可逐步执行并检查中间结果。
+
+1. 会话处理
+    会话文件夹为直接包含 CSV 文件的目录，每个会话由一个子进程处理。
+    每个样本 CSV：计算 time_interval（输入目录有 prefiltered.json 时保留 2.3 已算好的值），按 2.5 的规则过滤，过滤后为空的样本丢弃。
+    剩余样本少于 min_files 个的会话丢弃（2.5 删除会话文件夹）；多于 num_files 个时随机选取 num_files 个（2.6）。
+2. 输出
+    合并表保存为 {merge_dest}/{设备}/{会话}___{样本数}.csv，与 2.8 相同。
+    3.4 需要逐样本的特征文件，默认同时写出 {feature_dest}/{相对路径}/{样本}.csv（与 2.7 相同），
+    不运行 3.4 时可用 --no-sample-features 关闭。
+3. 与分步执行的差异
+    样本按文件名排序后选取和合并，--seed 可以固定随机选取的结果；
+    所有列按字符串读取，payload 不会被误识别为数字，过滤规则也不受 pandas 推断的列类型影响（见 tool.session_features）。
+4. 目录库
+    设置 DEVICEID_CATALOG 时，与 2.8 相同，把每个会话合并的样本数登记到目录库（tool.catalog）。
+
+用法：
+python artifact/preProcess/2.4-2.8_process_session_features.py --workers 8 [--seed 0] [--no-sample-features]
+"""
+
+import os
+import sys
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.session_features import (read_sample_csv, add_time_interval, keep_packet_rows, select_samples,
+                                   packet_features, merged_table_name)
+from tool.feature_schema import apply_feature_schema, save_feature_table
+from tool.catalog import connect_catalog, register_session
+
+PREFILTER_MARKER = 'prefiltered.json'  # 与 2.3 相同
+
+
+def find_session_folders(source_root):
+    """返回直接包含 CSV 文件的目录（会话文件夹）。"""
+    sessions = []
+    for root, dirs, files in os.walk(source_root):
+        dirs.sort()
+        if any(f.endswith('.csv') for f in files):
+            sessions.append(root)
+    return sessions
+
+
+def process_session(session_folder, source_root, merge_dest, feature_dest=None, num_files=50, min_files=15,
+                    prefiltered=False, seed=None):
+    """处理一个会话文件夹，返回 (会话文件夹, 合并的样本数, 说明)，会话被丢弃时样本数为 0。"""
+    session_name = os.path.basename(session_folder)
+
+    # 2.4 + 2.5
+    samples = {}
+    for csv_file in sorted(f for f in os.listdir(session_folder) if f.endswith('.csv')):
+        df = read_sample_csv(os.path.join(session_folder, csv_file))
+        if not prefiltered:
+            df = add_time_interval(df)
+        df = keep_packet_rows(df)
+        if not df.empty:
+            samples[csv_file] = df
+    if len(samples) < min_files:
+        return session_folder, 0, f"too few CSV files ({len(samples)})"
+
+    # 2.6，指定 seed 时每个会话的选取结果固定
+    rel_path = os.path.relpath(session_folder, source_root)
+    rng = random.Random(f"{seed}:{rel_path}") if seed is not None else random.Random()
+    selected = sorted(select_samples(sorted(samples), num_files, rng))
+
+    # 2.7
+    features = [packet_features(samples[csv_file], session_name) for csv_file in selected]
+    if feature_dest:
+        sample_folder = os.path.join(feature_dest, rel_path)
+        os.makedirs(sample_folder, exist_ok=True)
+        for csv_file, df in zip(selected, features):
+            save_feature_table(df, os.path.join(sample_folder, csv_file))
+
+    # 2.8：会话位于 设备/日期/会话 目录下
+    device_name = os.path.basename(os.path.dirname(os.path.dirname(session_folder)))
+    os.makedirs(os.path.join(merge_dest, device_name), exist_ok=True)
+    output_file = os.path.join(merge_dest, device_name, merged_table_name(session_name, len(selected)))
+    output_file = save_feature_table(apply_feature_schema(pd.concat(features, ignore_index=True)), output_file)
+    return session_folder, len(selected), output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐会话合并执行 2.4 ~ 2.8")
+    parser.add_argument("--source", default="artifact/outputs/preproc/5_csv",
+                        help="2.3 输出的 CSV 根目录")
+    parser.add_argument("--merge-dest", default="artifact/outputs/preproc/10_featureMerge",
+                        help="合并后的会话特征表目录（2.8 的输出）")
+    parser.add_argument("--feature-dest", default="artifact/outputs/preproc/9_feature",
+                        help="逐样本的特征文件目录（2.7 的输出，3.4 使用）")
+    parser.add_argument("--no-sample-features", action="store_true",
+                        help="不写出逐样本的特征文件")
+    parser.add_argument("--num-files", type=int, default=50, help="每个会话最多选取的样本数（2.6）")
+    parser.add_argument("--min-files", type=int, default=15, help="过滤后样本少于该数目的会话丢弃（2.5）")
+    parser.add_argument("--seed", type=int, default=None, help="随机选取样本的种子")
+    cpu_cnt = multiprocessing.cpu_count()
+    parser.add_argument("--workers", type=int, default=cpu_cnt,
+                        help=f"并行进程数（默认={cpu_cnt}）")
+    args = parser.parse_args()
+
+    prefiltered = os.path.exists(os.path.join(args.source, PREFILTER_MARKER))
+    feature_dest = None if args.no_sample_features else args.feature_dest
+    sessions = find_session_folders(args.source)
+    if not sessions:
+        print("[INFO] 未发现会话 CSV 文件"); return
+
+    print(f"[CONF] sessions={len(sessions)} workers={args.workers} prefiltered={prefiltered} "
+          f"num_files={args.num_files} min_files={args.min_files} sample_features={feature_dest is not None}")
+    merged = dropped = total_samples = 0
+    merged_sessions = []
+
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        futs = [ex.submit(process_session, s, args.source, args.merge_dest, feature_dest,
+                          args.num_files, args.min_files, prefiltered, args.seed)
+                for s in sessions]
+        for fut in as_completed(futs):
+            session_folder, count, msg = fut.result()
+            if count:
+                merged += 1
+                total_samples += count
+                print(f"Processed session: {session_folder}, merged {count} CSV files -> {msg}")
+                day_folder = os.path.dirname(session_folder)
+                device_name = os.path.basename(os.path.dirname(day_folder))
+                merged_sessions.append((device_name, os.path.basename(day_folder), os.path.basename(session_folder),
+                                        count))
+            else:
+                dropped += 1
+                print(f"Dropped session: {session_folder} :: {msg}")
+
+    conn = connect_catalog()
+    if conn is not None:
+        with conn:
+            for device_name, day, session_name, count in merged_sessions:
+                register_session(conn, device_name, day, session_name, merged_samples=count)
+        conn.close()
+
+    print(f"\nTotal sessions processed: {len(sessions)}")
+    print(f"Total CSV files merged: {total_samples}")
+    print(f"Total merged CSV files generated: {merged}, dropped sessions: {dropped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,41 +17,61 @@
 4. 进度和统计信息
     在终端打印每个文件的处理路径、时间间隔计算状态、保存路径。
     最后统计并输出总共处理的文件数量。
+5. 提前过滤的输入
+    源目录中有 prefiltered.json 时（2.3 --prefilter），CSV 已按 2.5 的条件过滤，
+    time_interval 已在过滤前按同样的方式算好，这里保留该列，不再重新计算；标记文件一并复制到目标目录。
 """
 
 import os
-import pandas as pd
+import sys
+import shutil
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import is_table, read_table, write_table
 
-def process_csv_file(file_path, new_file_path):
+PREFILTER_MARKER = 'prefiltered.json'  # 与 2.3 相同
+
+
+def process_csv_file(file_path, new_file_path, keep_interval=False):
     # 打印正在处理的文件路径
     print(f"Processing file: {file_path}")
 
     # 读取CSV文件
-    df = pd.read_csv(file_path)
+    df = read_table(file_path)
 
     # 检查 'frame.time_epoch' 列是否存在
     if 'frame.time_epoch' in df.columns:
         # 转换为浮点型并计算时间间隔
         df['frame.time_epoch'] = df['frame.time_epoch'].astype(float)
-        df['time_interval'] = df['frame.time_epoch'].diff().fillna(0)  # 计算时间间隔
-        print(f"Added 'time_interval' column for {file_path}")
+        if keep_interval and 'time_interval' in df.columns:
+            # 已过滤的文件相邻行不再连续，保留 2.3 在过滤前算好的时间间隔
+            print(f"Kept 'time_interval' column for {file_path}")
+        else:
+            df['time_interval'] = df['frame.time_epoch'].diff().fillna(0)  # 计算时间间隔
+            print(f"Added 'time_interval' column for {file_path}")
     else:
         print(f"'frame.time_epoch' column not found in {file_path}")
 
     # 保存处理后的CSV文件到新的路径
     os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
-    df.to_csv(new_file_path, index=False)
+    new_file_path = write_table(df, new_file_path)
     print(f"Saved processed file to: {new_file_path}\n")
 
 
 def copy_and_process_csv(root_folder, new_root_folder):
     file_count = 0  # 用于统计处理的文件数量
+    prefiltered = os.path.exists(os.path.join(root_folder, PREFILTER_MARKER))
+    os.makedirs(new_root_folder, exist_ok=True)
+    if prefiltered:
+        print("Input CSV files are prefiltered, keeping 'time_interval'")
+        shutil.copy2(os.path.join(root_folder, PREFILTER_MARKER), os.path.join(new_root_folder, PREFILTER_MARKER))
+    elif os.path.exists(os.path.join(new_root_folder, PREFILTER_MARKER)):
+        os.remove(os.path.join(new_root_folder, PREFILTER_MARKER))
 
     # 遍历总文件夹
     for root, dirs, files in os.walk(root_folder):
         for file in files:
-            if file.endswith('.csv'):
+            if is_table(file):
                 file_path = os.path.join(root, file)
 
                 # 构建新的文件路径
@@ -62,7 +82,7 @@ def copy_and_process_csv(root_folder, new_root_folder):
                 print(f"Copying and processing {file_path} to {new_file_path}")
 
                 # 处理CSV文件并保存到新路径
-                process_csv_file(file_path, new_file_path)
+                process_csv_file(file_path, new_file_path, keep_interval=prefiltered)
 
                 # 文件处理完成后增加计数
                 file_count += 1
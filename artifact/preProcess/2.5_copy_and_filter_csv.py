@@ -21,13 +21,25 @@
 
 4. 输出进度与统计
     - 实时打印每个文件的处理状态与最终统计结果。
+
+5. 提前过滤的输入
+    - 源目录中有 prefiltered.json 时（2.3 --prefilter，经 2.4 传递），CSV 已按上述规则过滤，
+      改为用硬链接发布到目标目录（tool.publish），不再逐个读取和重写，只删除没有数据行的文件和 CSV 数量不足的目录。
 """
 
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import shutil
-import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.publish import publish_tree
+from tool.session_features import keep_packet_rows
+from tool.table_io import is_table, file_format, read_table, write_table
+
+PREFILTER_MARKER = 'prefiltered.json'  # 与 2.3 相同
+MIN_CSV_FILES = 15
 
 
 def copy_directory(src_folder, dst_folder):
@@ -47,13 +59,26 @@ def copy_directory(src_folder, dst_folder):
         for file in files:
             src_file = os.path.join(root, file)
             dst_file = os.path.join(dst_path, file)
+            # 上次以硬链接发布的文件要先删除，否则会写到源文件上
+            if os.path.lexists(dst_file):
+                os.remove(dst_file)
             shutil.copy2(src_file, dst_file)
             print(f"Copied: {src_file} -> {dst_file}")
 
 
-def filter_csv_files(input_dir):
+def has_data_rows(filename):
+    """CSV 文件除表头外是否还有数据行，列式文件读取后判断。"""
+    if not filename.endswith('.csv'):
+        return len(read_table(filename)) > 0
+    with open(filename, 'r', encoding='utf-8') as f:
+        f.readline()
+        return bool(f.readline().strip())
+
+
+def filter_csv_files(input_dir, prefiltered=False):
     """
     过滤指定目录下的所有 CSV 文件，删除无关协议的数据包，并保存过滤后的数据。
+    prefiltered=True 时文件已经过滤，只删除没有数据行的文件，不再读取和重写。
     """
     # 统计处理的文件数量
     processed_files_count = 0
@@ -61,37 +86,32 @@ def filter_csv_files(input_dir):
     # 遍历指定目录中的所有 CSV 文件
     for root, dirs, files in os.walk(input_dir, topdown=False):
         # 获取本目录中的CSV文件
-        csv_files = [f for f in files if f.endswith('.csv')]
+        csv_files = [f for f in files if is_table(f)]
 
         # === 对CSV文件进行过滤 ===
         for name in csv_files:
             filename = os.path.join(root, name)
             print(f"Processing file: {filename}")
 
-            # 读取 CSV 文件
-            df = pd.read_csv(filename, encoding='utf-8', header=0, keep_default_na=False)
-
-            # 设置 pandas 的显示选项
-            pd.set_option('expand_frame_repr', False)  # 完整打印所有输出行内容
-            pd.set_option('display.max_columns', None)  # 显示所有列
-            pd.set_option('display.max_rows', None)  # 显示所有行
+            if prefiltered:
+                if not has_data_rows(filename):
+                    os.remove(filename)
+                    print(f"Deleted empty file: {filename}")
+                processed_files_count += 1
+                continue
 
-            # 过滤有效的数据包内容信息
-            condition1 = (df['tls.record.content_type'] == '23') | (df['tls.record.content_type'] == '23.0')    # TLS 数据包，内容类型为 23
-            condition2 = (df['tcp.len'] != 0) & (df['tcp.len'] != '0.0') & (~df['frame.protocols'].str.contains('tls'))  # 有效 TCP 数据包
-            condition3 = df['frame.protocols'].str.contains('tls') & (df['tls.record.content_type'] == '')  # TLS 握手阶段数据包
-            # 新增条件：保留 UDP 数据包
-            condition_udp = df['frame.protocols'].str.contains('udp', na=False)
+            # 读取文件，CSV 中的空值保留为空字符串
+            df = read_table(filename, encoding='utf-8', header=0, keep_default_na=False)
 
-            # 合并过滤结果
-            result = df[condition1 | condition2 | condition3 | condition_udp]
+            # 过滤有效的数据包内容信息（规则见文件开头，数值按数值比较，不受读取时推断的列类型影响）
+            result = keep_packet_rows(df)
 
             # 如果结果为空，删除 CSV 文件，否则保存结果
             if result.empty:
                 os.remove(filename)
                 print(f"Deleted empty file: {filename}")
             else:
-                result.to_csv(filename, index=False)
+                write_table(result, filename, fmt=file_format(filename))
                 print(f"Saved filtered file: {filename}")
 
             # 计数已处理文件
@@ -100,8 +120,8 @@ def filter_csv_files(input_dir):
 
         # 此处只判断“会话文件夹”（即root）中剩余CSV文件数量
         if csv_files:  # 防止刚好被删了
-            remaining_csv = [f for f in os.listdir(root) if f.endswith('.csv')]
-            if len(remaining_csv) < 15:
+            remaining_csv = [f for f in os.listdir(root) if is_table(f)]
+            if len(remaining_csv) < MIN_CSV_FILES:
                 shutil.rmtree(root)
                 print(f"Deleted session folder (too few CSV files): {root}")
             else:
@@ -116,11 +136,20 @@ def main():
     src_folder = 'artifact/outputs/preproc/6_csvAddTime'  # 原始 CSV 文件目录
     dst_folder = 'artifact/outputs/preproc/7_csvFilter'  # 复制后的 CSV 文件目录
 
-    # 复制文件目录\
-    copy_directory(src_folder, dst_folder)
+    prefiltered = os.path.exists(os.path.join(src_folder, PREFILTER_MARKER))
+    if prefiltered:
+        # 已过滤的文件不会被原地修改，用硬链接发布即可
+        linked, copied = publish_tree(src_folder, dst_folder, verbose=False)
+        print(f"Input CSV files are prefiltered, published {linked} links and {copied} copies")
+    else:
+        # 复制文件目录\
+        copy_directory(src_folder, dst_folder)
+        marker = os.path.join(dst_folder, PREFILTER_MARKER)
+        if os.path.exists(marker):
+            os.remove(marker)
 
     # 对复制后的目录进行 CSV 文件过滤
-    filter_csv_files(dst_folder)
+    filter_csv_files(dst_folder, prefiltered)
 
 
 if __name__ == "__main__":
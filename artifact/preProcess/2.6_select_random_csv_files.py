@@ -20,15 +20,19 @@
 """
 
 import os
+import sys
 import random
 import shutil
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import is_table
+
 
 def copy_random_csv_files(src_folder, dst_folder, num_files=50):   # 初始默认是50个，我现在希望能够多一些样本，这样一些数据包在聚类时候可能被保留
     total_copied_files = 0  # 初始化计数器
     for root, dirs, files in os.walk(src_folder):
         # 检查当前路径是否是会话文件夹（根据CSV文件存在与否判断）
-        csv_files = [f for f in files if f.endswith('.csv')]
+        csv_files = [f for f in files if is_table(f)]
         if csv_files:
             # 计算目标路径，以保持原始文件结构
             relative_path = os.path.relpath(root, src_folder)
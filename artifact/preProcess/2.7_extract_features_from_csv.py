@@ -17,37 +17,40 @@
 4. 遍历与处理
     遍历源文件夹中的所有 CSV 文件，对每个文件进行特征提取。
     将处理后的结果保存到目标目录。
+    默认按会话处理：把会话文件夹中的所有文件拼接成一个表，整体提取一次特征（按列的向量化运算，见 tool.session_features），
+    再按原文件的行数拆分保存；--per-file 时逐个文件处理。两种方式的结果相同。
 5. 输出进度与统计
     处理每个文件时打印保存路径。
     统计并输出总共处理的文件数量。
 """
 
 import os
+import sys
+import argparse
+
+import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import is_table, read_table
+from tool.feature_schema import save_feature_table
+from tool.session_features import packet_features
+
 
 def process_csv_file(csv_file, new_directory, root_directory):
     # 读取 CSV 文件
-    df = pd.read_csv(csv_file)
-
-    # 提取相关列
-    df_filtered = df[['frame.time_epoch', 'frame.len', 'direction', 'time_interval']].copy()
-
-    # 创建新的列来保存协议类型和有效负载
-    df_filtered['protocol_type'] = df['frame.protocols'].apply(
-        lambda x: 'dhcp' if 'dhcp' in x else ('tcp' if 'tcp' in x else ('udp' if 'udp' in x else 'unknown')))
-
-    df_filtered['payload'] = df_filtered.apply(
-        lambda row: df.loc[row.name, 'udp.payload'] if row['protocol_type'] == 'dhcp'  # 如果是dhcp，从udp.payload提取
-        else (df.loc[row.name, 'tcp.payload'] if row['protocol_type'] == 'tcp'
-              else (df.loc[row.name, 'udp.payload'] if row['protocol_type'] == 'udp' else None)), axis=1)
+    df = read_table(csv_file)
 
     # 获取会话文件夹名作为标签
     session_folder_name = os.path.basename(os.path.dirname(csv_file))
 
-    # 添加标签列
-    df_filtered['label'] = session_folder_name
+    # 提取特征列：协议类型映射为 dhcp/tcp/udp/unknown，payload 取对应协议的负载，并添加标签列
+    df_filtered = packet_features(df, session_folder_name)
 
+    save_features(df_filtered, csv_file, new_directory, root_directory)
+
+
+def save_features(df_filtered, csv_file, new_directory, root_directory):
     # 计算 CSV 文件相对路径
     relative_path = os.path.relpath(csv_file, root_directory)
 
@@ -58,30 +61,48 @@ def process_csv_file(csv_file, new_directory, root_directory):
     os.makedirs(os.path.dirname(new_csv_path), exist_ok=True)
 
     # 保存处理后的文件
-    df_filtered.to_csv(new_csv_path, index=False)
+    new_csv_path = save_feature_table(df_filtered, new_csv_path)
     print(f"Processed and saved: {new_csv_path}")
 
 
-def traverse_and_process(root_directory, new_directory):
+def process_session_folder(csv_files, new_directory, root_directory):
+    """把同一会话文件夹中的文件拼接成一个表整体提取特征，再按各文件的行数拆分保存。"""
+    frames = [read_table(csv_file) for csv_file in csv_files]
+    session_folder_name = os.path.basename(os.path.dirname(csv_files[0]))
+    features = packet_features(pd.concat(frames, ignore_index=True), session_folder_name)
+
+    bounds = np.cumsum([0] + [len(frame) for frame in frames])
+    for csv_file, start, stop in zip(csv_files, bounds[:-1], bounds[1:]):
+        save_features(features.iloc[start:stop].reset_index(drop=True), csv_file, new_directory, root_directory)
+
+
+def traverse_and_process(root_directory, new_directory, per_file=False):
     # 文件计数器
     file_count = 0
 
-    # 遍历所有文件夹，处理每个 CSV 文件
+    # 遍历所有文件夹，处理每个 CSV 文件（默认每个会话文件夹整体处理）
     for root, dirs, files in os.walk(root_directory):
-        for file in files:
-            if file.endswith(".csv"):
-                csv_file_path = os.path.join(root, file)
+        csv_files = [os.path.join(root, file) for file in files if is_table(file)]
+        if not csv_files:
+            continue
+        if per_file:
+            for csv_file_path in csv_files:
                 process_csv_file(csv_file_path, new_directory, root_directory)
-                file_count += 1  # 每处理一个文件，计数器加1
+        else:
+            process_session_folder(csv_files, new_directory, root_directory)
+        file_count += len(csv_files)
 
     # 打印总共处理的文件数量
     print(f"Total files processed: {file_count}")
 
 
 if __name__ == "__main__":
-    root_directory = "artifact/outputs/preproc/8_csvSelect"  # 原始文件夹路径
-    new_directory = "artifact/outputs/preproc/9_feature"  # 新文件夹路径
+    parser = argparse.ArgumentParser(description="从 CSV 文件中提取特征列")
+    parser.add_argument("--source", default="artifact/outputs/preproc/8_csvSelect", help="原始文件夹路径")
+    parser.add_argument("--dest", default="artifact/outputs/preproc/9_feature", help="新文件夹路径")
+    parser.add_argument("--per-file", action="store_true", help="逐个文件处理，不按会话拼接")
+    args = parser.parse_args()
     # new_directory = "/home/hyj/deviceIdentification/dataset/test/uk"
 
     # 开始处理并将文件保存到新目录下
-    traverse_and_process(root_directory, new_directory)
+    traverse_and_process(args.source, args.dest, args.per_file)
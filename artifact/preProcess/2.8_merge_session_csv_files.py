@@ -18,15 +18,22 @@
 4. 统计与输出
     统计每个会话文件夹中处理的 CSV 文件数量。
     输出合并文件的保存路径及总处理进度，包括总会话数、总 CSV 文件数、生成的合并文件数。
+    设置 DEVICEID_CATALOG 时，把每个会话合并的样本数登记到目录库（tool.catalog）。
 """
 
 import os
+import sys
 import pandas as pd
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import list_tables
+from tool.feature_schema import load_feature_table, apply_feature_schema, save_feature_table
+from tool.catalog import connect_catalog, register_session
+
 
 def merge_csv_files_in_session(session_folder, output_file):
     # 获取会话文件夹中的所有 CSV 文件
-    csv_files = [f for f in os.listdir(session_folder) if f.endswith('.csv')]
+    csv_files = list_tables(session_folder)
 
     # 用于存储所有 CSV 文件的数据
     merged_data = []
@@ -34,15 +41,17 @@ def merge_csv_files_in_session(session_folder, output_file):
     for csv_file in csv_files:
         csv_path = os.path.join(session_folder, csv_file)
         # 读取 CSV 文件
-        data = pd.read_csv(csv_path)
+        data = load_feature_table(csv_path)
         # 将数据追加到合并数据列表中
         merged_data.append(data)
 
     # 合并所有 CSV 文件的数据，只保留一个表头
     merged_df = pd.concat(merged_data, ignore_index=True)
+    # 各文件的分类列取值不同，合并后重新转换为紧凑类型
+    merged_df = apply_feature_schema(merged_df)
 
     # 保存合并后的数据到新的 CSV 文件
-    merged_df.to_csv(output_file, index=False)
+    output_file = save_feature_table(merged_df, output_file)
     print(f"Saved merged file to {output_file}")
 
     # 返回处理的 CSV 文件数量
@@ -53,13 +62,14 @@ def process_all_sessions(src_folder, dst_folder):
     total_csv_files = 0
     total_sessions = 0
     total_merged_files = 0
+    merged_sessions = []
 
     # 遍历设备文件夹
     for root, dirs, files in os.walk(src_folder):
         for sub_dir in dirs:
             session_folder = os.path.join(root, sub_dir)
             # 如果是会话文件夹，合并所有 CSV 文件
-            if any(f.endswith('.csv') for f in os.listdir(session_folder) if isinstance(f, str)):   # isinstance，用于检查一个对象是否属于指定的类或类型（包括其子类）。
+            if list_tables(session_folder):  # list_tables 列出文件夹中的表格文件（CSV 或 parquet/feather），有表格的就是会话文件夹
                 total_sessions += 1
 
                 # 获取设备文件夹路径
@@ -68,7 +78,7 @@ def process_all_sessions(src_folder, dst_folder):
                 device_name = os.path.basename(device_folder)
 
                 # 统计会话文件夹中的 CSV 文件数量
-                csv_count = len([f for f in os.listdir(session_folder) if isinstance(f, str) if f.endswith('.csv')])
+                csv_count = len(list_tables(session_folder))
 
                 # 生成输出文件名，以会话文件夹名称命名
                 session_name = os.path.basename(session_folder)
@@ -81,10 +91,19 @@ def process_all_sessions(src_folder, dst_folder):
                 merged_csv_count = merge_csv_files_in_session(session_folder, output_file)
                 total_csv_files += merged_csv_count
                 total_merged_files += 1
+                merged_sessions.append((device_name, os.path.basename(root), session_name, merged_csv_count))
 
                 # 输出当前处理信息
                 print(f"Processed session: {session_name} from {device_name}, merged { merged_csv_count} CSV files.")
 
+    # 登记每个会话合并的样本数
+    conn = connect_catalog()
+    if conn is not None:
+        with conn:
+            for device_name, day, session_name, merged_csv_count in merged_sessions:
+                register_session(conn, device_name, day, session_name, merged_samples=merged_csv_count)
+        conn.close()
+
     # 最终统计信息
     print(f"\nTotal sessions processed: {total_sessions}")
     print(f"Total CSV files processed: {total_csv_files}")
@@ -2,7 +2,7 @@
 
 """
 遍历文件夹，对每个会话csv文件中的样本进行聚类，从csv文件中提取出所需要的特征，对文件中的所有数据包进行聚类，
-并将得到的聚类结果，即数据包的聚类集群，保存成csv文件，保存到另一个目录下。每个文件中都是聚到一起的数据包的集合。
+并将得到的聚类结果，即数据包的聚类集群，保存成csv文件，保存到另一个目录下。每个会话一个文件，同一个簇的数据包在文件中连续存放。
 
 1. 读取与特征选择
     从每个 CSV 文件中提取特征列：frame.len、direction、protocol_type。
@@ -10,43 +10,53 @@
 2. 数据标准化
     使用 StandardScaler 对特征数据进行标准化处理。
 3. 聚类操作
-    使用 DBSCAN 聚类算法对数据进行聚类。
+    按 DBSCAN(eps=0.01, min_samples=5) 的规则对数据进行聚类（tool.packet_clustering）。
+    特征都是离散值，先按取值分组得到直方图，再在去重后的取值上聚类：--engine exact 时相同取值的数据包数目
+    不少于 min_samples 即为一个簇，其余为噪声；--engine dbscan 时在去重后的取值上运行带 sample_weight 的 DBSCAN；
+    默认 auto 在不同取值的距离都大于 eps 时使用 exact，否则使用 dbscan，结果与在全部数据包上运行 DBSCAN 相同。
     为每个样本分配聚类标签，并将标签添加到原始数据中。
 4. 聚类结果保存
-    根据聚类标签，将每个聚类的样本保存到单独的 CSV 文件中，噪声样本保存为 noise_samples.csv。
+    将会话的数据包按聚类标签排序（噪声 -1 在前，簇内保持原顺序）后保存为一个文件 {设备}/{会话}.csv，
+    第一列 original_index 为数据包在原始数据中的行号，最后一列 cluster 为聚类标签。
+    每个簇在文件中的起始行号和数据包数目记录在输出根目录的 clusters.csv 中（tool.cluster_manifest），
+    2.10 按清单筛选簇，不需要重新读取会话文件。设置 DEVICEID_CATALOG 时，簇同时登记到目录库（tool.catalog）。
 5. 统计与评估
-    统计噪声样本比例和聚类数量。
-    计算聚类的轮廓系数，评估聚类效果。
+    按聚类标签统计每个簇的数据包数、噪声样本比例和聚类数量。
+    --silhouette 时随机抽取最多 --silhouette-sample 个数据包计算轮廓系数，评估聚类效果
+    （轮廓系数需要计算两两距离，在全部数据包上计算的时间和内存为 O(n²)，默认不计算）。
 6. 目录结构的保留与输出
-    保留原始的设备和会话目录结构。
+    保留原始的设备目录结构。
     将聚类结果保存到指定的输出根目录。
 """
 
 import os
-import pandas as pd
+import sys
+import argparse
+import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import DBSCAN
 from sklearn.metrics import silhouette_score
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import is_table, table_stem
+from tool.feature_schema import load_feature_table, save_feature_table
+from tool.packet_clustering import CLUSTER_ENGINES, cluster_packets
+from tool.cluster_manifest import write_cluster_manifest
+from tool.catalog import connect_catalog, register_clusters
+
 
 # 定义处理单个 CSV 文件的函数
-def process_csv(csv_file, output_root_folder):
+def process_csv(csv_file, output_root_folder, eps=0.01, min_samples=5, engine='auto', silhouette_sample=None, seed=None):
     # 读取 CSV 文件
-    df = pd.read_csv(csv_file)
+    df = load_feature_table(csv_file)
 
     # 选择用于聚类的特征，有大小，方向，协议类型
     features = df[['frame.len', 'direction', 'protocol_type']]
 
-    # 将 'protocol_type' 转换为数值型，使用 .loc 避免警告
-    features.loc[:, 'protocol_type'] = features['protocol_type'].astype('category').cat.codes
-
-    # 规范化数据
-    scaler = StandardScaler()
-    scaled_features = scaler.fit_transform(features)
+    # 将 'protocol_type' 转换为数值型（按取值排序的分类编号）
+    features = features.assign(protocol_type=features['protocol_type'].cat.codes)
 
-    # 使用 DBSCAN 进行聚类
-    dbscan = DBSCAN(eps=0.01, min_samples=5)
-    clusters = dbscan.fit_predict(scaled_features)
+    # 规范化数据后聚类（在去重后的取值上进行，结果与 DBSCAN(eps, min_samples) 相同）
+    clusters = cluster_packets(features, eps=eps, min_samples=min_samples, engine=engine)
 
     # 将聚类结果添加到原数据框中
     df['cluster'] = clusters
@@ -54,86 +64,108 @@ def process_csv(csv_file, output_root_folder):
     # 获取设备文件夹名称
     device_folder = os.path.basename(os.path.dirname(csv_file))
     # 获取会话文件名（不含扩展名）
-    session_name = os.path.splitext(os.path.basename(csv_file))[0]
-
-    # 创建输出目录结构：output_root_folder/设备文件夹/会话文件夹
-    output_session_dir = os.path.join(output_root_folder, device_folder, session_name)
-    if not os.path.exists(output_session_dir):
-        os.makedirs(output_session_dir)
+    session_name = table_stem(os.path.basename(csv_file))
 
-    # 创建一个字典来存储聚类标签及其对应的样本索引
-    cluster_dict = {}
+    # 创建输出目录结构：output_root_folder/设备文件夹
+    output_device_dir = os.path.join(output_root_folder, device_folder)
+    if not os.path.exists(output_device_dir):
+        os.makedirs(output_device_dir)
 
-    # 遍历所有样本，按聚类标签将样本分组
-    for index, row in df.iterrows():
-        cluster_label = row['cluster']
-        if cluster_label not in cluster_dict:
-            cluster_dict[cluster_label] = []
-        cluster_dict[cluster_label].append(f"样本{index}")
+    # 统计每个聚类标签的样本数
+    cluster_counts = df['cluster'].value_counts().sort_index()
 
-    # 打印每个聚类标签的样本
-    for cluster_label, samples in cluster_dict.items():
+    # 打印每个聚类标签的样本数
+    for cluster_label, count in cluster_counts.items():
         if cluster_label == -1:
-            print(f"噪声样本: {samples}")
+            print(f"噪声样本: num= {count}")
         else:
-            print(f"聚类标签{cluster_label}, num= {len(samples)} : {samples}")
+            print(f"聚类标签{cluster_label}, num= {count}")
 
     # 计算噪声数据所占的比例
-    num_noise_samples = len(df[df['cluster'] == -1])
+    num_noise_samples = int(cluster_counts.get(-1, 0))
     total_samples = len(df)
     noise_ratio = num_noise_samples / total_samples
 
     # 计算簇的个数
-    num_clusters = len(set(clusters)) - (1 if -1 in clusters else 0)  # 不包括噪声簇
+    num_clusters = len(cluster_counts) - (1 if num_noise_samples else 0)  # 不包括噪声簇
 
     # 打印噪声数据比例和簇的个数
     print(f"噪声数据所占比例: {noise_ratio:.2f}")
     print(f"簇的个数: {num_clusters}")
 
-    # 计算聚类评价指标：轮廓系数
-    # 注意：轮廓系数需要每个样本都有一个簇，因此噪声样本需要排除
-    if len(set(clusters)) > 1:  # 确保有至少两个簇
+    # 计算聚类评价指标：轮廓系数（可选，在随机抽取的数据包上计算）
+    # 注意：噪声样本作为一个标签参与计算
+    if silhouette_sample and len(cluster_counts) > 1:  # 确保有至少两个簇
         try:
-            silhouette_avg = silhouette_score(scaled_features, clusters)
+            scaled_features = StandardScaler().fit_transform(features)
+            sample_size = silhouette_sample if silhouette_sample < total_samples else None
+            silhouette_avg = silhouette_score(scaled_features, clusters, sample_size=sample_size, random_state=seed)
             print(f"轮廓系数: {silhouette_avg:.2f}")
         except ValueError:
             print("无法计算轮廓系数，可能因为簇的数量不足。")
-    else:
+    elif silhouette_sample:
         print("轮廓系数无法计算，因为簇的数量不足。")
 
-    # 遍历所有聚类标签，将每个聚类的样本保存到单独的 CSV 文件中
-    for cluster_label in set(clusters):
-        cluster_samples = df[df['cluster'] == cluster_label].copy()
+    # 按聚类标签排序（稳定排序，簇内保持原顺序），所有簇保存到同一个文件中
+    order = np.argsort(clusters, kind='stable')
+    cluster_samples = df.iloc[order]
 
-        # 添加一列 'original_index' 来显示样本在原始数据中的行号
-        cluster_samples.loc[:, 'original_index'] = cluster_samples.index
+    # 添加一列 'original_index' 来显示样本在原始数据中的行号，并移到第一列
+    cluster_samples.insert(0, 'original_index', df.index[order])
 
-        # 将 'original_index' 列移到第一列
-        columns = ['original_index'] + [col for col in cluster_samples.columns if col != 'original_index']
-        cluster_samples = cluster_samples[columns]
+    file_name = save_feature_table(cluster_samples, os.path.join(output_device_dir, session_name))
+    print(f"已保存 {len(cluster_counts)} 个聚类标签的样本到文件 {file_name}")
 
-        # 保存聚类样本到新的 CSV 文件
-        file_name = f'{output_session_dir}/noise_samples.csv' if cluster_label == -1 else f'{output_session_dir}/cluster_{cluster_label}_samples.csv'
-        cluster_samples.to_csv(file_name, index=False)
-        print(f"已保存聚类标签 {cluster_label} 的样本到文件 {file_name}")
+    # 返回每个簇在文件中的位置，写入聚类清单
+    starts = np.concatenate(([0], np.cumsum(cluster_counts.to_numpy())[:-1]))
+    table = os.path.relpath(file_name, output_root_folder)
+    return [{'device': device_folder, 'session': session_name, 'table': table,
+             'cluster': int(cluster_label), 'start': int(start), 'rows': int(count)}
+            for (cluster_label, count), start in zip(cluster_counts.items(), starts)]
 
 
 # 使用 os.walk 遍历总文件夹，处理每个CSV文件
-def process_all_csvs_in_directory(root_folder, output_root_folder):
+def process_all_csvs_in_directory(root_folder, output_root_folder, eps=0.01, min_samples=5, engine='auto',
+                                  silhouette_sample=None, seed=None):
+    clusters = []
     # os.walk 会递归遍历根目录下的所有文件和子目录
     for dirpath, dirnames, filenames in os.walk(root_folder):
         for filename in filenames:
-            if filename.endswith('.csv'):
+            if is_table(filename):
                 csv_file_path = os.path.join(dirpath, filename)
                 print(f"处理文件: {csv_file_path}")
 
                 # 对每个CSV文件执行聚类操作，并将结果保存到新的输出目录
-                process_csv(csv_file_path, output_root_folder)
+                clusters += process_csv(csv_file_path, output_root_folder, eps, min_samples, engine,
+                                        silhouette_sample, seed)
                 print()
 
+    # 写入聚类清单
+    manifest_path = write_cluster_manifest(output_root_folder, clusters)
+    print(f"聚类清单已保存到 {manifest_path}，共 {len(clusters)} 个聚类标签")
+
+    # 登记到目录库
+    conn = connect_catalog()
+    if conn is not None:
+        with conn:
+            register_clusters(conn, clusters)
+        conn.close()
+
 
 # main 函数，作为脚本的入口
 def main():
+    parser = argparse.ArgumentParser(description="对会话特征表中的数据包聚类")
+    parser.add_argument("--engine", choices=CLUSTER_ENGINES, default="auto",
+                        help="聚类方式：exact 按取值分组，dbscan 在去重后的取值上运行 DBSCAN，auto 自动选择（默认）")
+    parser.add_argument("--eps", type=float, default=0.01, help="DBSCAN 的邻域半径（标准化后）")
+    parser.add_argument("--min-samples", type=int, default=5, help="成为簇所需的最少数据包数")
+    parser.add_argument("--silhouette", action="store_true", help="计算轮廓系数（诊断用，默认不计算）")
+    parser.add_argument("--silhouette-sample", type=int, default=10000,
+                        help="计算轮廓系数时最多随机抽取的数据包数")
+    parser.add_argument("--seed", type=int, default=None, help="抽取数据包的随机种子")
+    args = parser.parse_args()
+    silhouette_sample = args.silhouette_sample if args.silhouette else None
+
     # 原始的 CSV 文件根目录
     root_folder = 'artifact/outputs/preproc/10_featureMerge'
     # 输出的根目录
@@ -142,7 +174,8 @@ def main():
     # output_root_folder = "/home/hyj/deviceIdentification/dataset/test/us"
 
     # 开始处理所有CSV文件，并将结果保存到新的目录
-    process_all_csvs_in_directory(root_folder, output_root_folder)
+    process_all_csvs_in_directory(root_folder, output_root_folder, args.eps, args.min_samples, args.engine,
+                                  silhouette_sample, args.seed)
 
 
 # 判断是否作为脚本执行
@@ -6,8 +6,9 @@
 构建的字典保存到新的目录结构下，以csv文件的格式
 
 1. 设备与会话的遍历
-    使用 os.walk 遍历设备目录及其会话文件夹。
-    读取每个会话文件夹中的 CSV 文件。
+    输入目录中有聚类清单 clusters.csv（2.9、2.10 的输出，见 tool.cluster_manifest）时，按清单读取每个会话表中保留的簇。
+    否则（如按旧格式缓存的 12_featureClusterFilter）使用 os.walk 遍历设备目录及其会话文件夹，
+    读取每个会话文件夹中的 CSV 文件（每个文件为一个簇）。
 2. 关键数据包统计
     根据 frame.len（数据包大小）和 direction（方向）分组，统计其出现次数。
     找出出现次数最多的 (frame.len, direction) 组合，计算其平均每个样本的出现次数。
@@ -23,68 +24,82 @@
 """
 
 import os
+import sys
 import csv
-import pandas as pd
 from collections import defaultdict
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import is_table
+from tool.feature_schema import load_feature_table
+from tool.cluster_manifest import has_cluster_manifest, iter_cluster_tables
 
-# 统计每个设备的聚类情况
-def process_device_folders(root_dir, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
 
-    device_results = defaultdict(lambda: defaultdict(dict))  # 存储所有设备的聚类结果
+# 逐个返回 (设备文件夹名, 会话文件夹名, 簇的来源, 簇的数据包)
+def iter_clusters(root_dir, columns):
+    if has_cluster_manifest(root_dir):
+        for cluster, df in iter_cluster_tables(root_dir, columns=columns):
+            source = f"{os.path.join(root_dir, cluster['table'])} cluster {cluster['cluster']}"
+            yield cluster['device'], cluster['session'], source, df
+        return
 
-    # 使用 os.walk 遍历设备和会话文件夹
+    # 旧格式：每个簇一个文件
     for root, dirs, files in os.walk(root_dir):
         for file in files:
-            if file.endswith(".csv"):
+            if is_table(file):
+                csv_path = os.path.join(root, file)
                 session_folder = os.path.basename(root)  # 会话文件夹名
                 device_folder = os.path.basename(os.path.dirname(root))  # 设备文件夹名
+                yield device_folder, session_folder, csv_path, load_feature_table(csv_path, columns=columns)
 
-                # 从会话文件夹名提取样本数
-                try:
-                    num_samples = int(session_folder.split('___')[-1])
-                    print(f"会话: {session_folder}, 样本数: {num_samples}")
-                except ValueError:
-                    num_samples = 50  # 默认值
-                    print(f"会话: {session_folder}, 样本数解析失败，使用默认值: {num_samples}")
-
-                csv_path = os.path.join(root, file)
-                print(f"处理文件: {csv_path}")
-
-                # 读取csv文件
-                df = pd.read_csv(csv_path)
 
-                # 统计 (frame.len, direction) 的出现次数
-                size_direction_counts = df.groupby(['frame.len', 'direction']).size()
-
-                if size_direction_counts.empty:
-                    print(f"警告: {csv_path} 中没有可用的数据包。")
-                    continue
-
-                # 选择出现次数最多的数据包大小和方向
-                most_common = size_direction_counts.idxmax()
-                most_common_size = most_common[0]
-                most_common_direction = most_common[1]
-                most_common_count = size_direction_counts.max()
-
-                # 计算整除和余数
-                quotient = most_common_count // num_samples
-                remainder = most_common_count % num_samples
-
-                # 根据余数决定向上或向下取整
-                if remainder >= (num_samples / 2):
-                    avg_count_per_sample = quotient + 1  # 向上取整，如果余数在一半以上样本中的话，认为余数也算一个关键数据包
-                else:
-                    avg_count_per_sample = quotient  # 向下取整
+# 统计每个设备的聚类情况
+def process_device_folders(root_dir, output_dir):
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
-                print(f"数据包大小: {most_common_size}, 方向: {most_common_direction}, "
-                      f"出现次数: {most_common_count}, 每个样本中的平均出现数: {avg_count_per_sample}")
+    device_results = defaultdict(lambda: defaultdict(dict))  # 存储所有设备的聚类结果
 
-                # 将结果存储到字典
-                device_results[device_folder][session_folder][
-                    (most_common_size, most_common_direction)] = avg_count_per_sample
+    # 遍历设备和会话中的每个簇
+    for device_folder, session_folder, csv_path, df in iter_clusters(root_dir, ['frame.len', 'direction']):
+        # 从会话文件夹名提取样本数
+        try:
+            num_samples = int(session_folder.split('___')[-1])
+            print(f"会话: {session_folder}, 样本数: {num_samples}")
+        except ValueError:
+            num_samples = 50  # 默认值
+            print(f"会话: {session_folder}, 样本数解析失败，使用默认值: {num_samples}")
+
+        print(f"处理文件: {csv_path}")
+
+        # 统计 (frame.len, direction) 的出现次数
+        size_direction_counts = df.groupby(['frame.len', 'direction']).size()
+
+        if size_direction_counts.empty:
+            print(f"警告: {csv_path} 中没有可用的数据包。")
+            continue
+
+        # 选择出现次数最多的数据包大小和方向
+        most_common = size_direction_counts.idxmax()
+        most_common_size = most_common[0]
+        most_common_direction = most_common[1]
+        most_common_count = size_direction_counts.max()
+
+        # 计算整除和余数
+        quotient = most_common_count // num_samples
+        remainder = most_common_count % num_samples
+
+        # 根据余数决定向上或向下取整
+        if remainder >= (num_samples / 2):
+            avg_count_per_sample = quotient + 1  # 向上取整，如果余数在一半以上样本中的话，认为余数也算一个关键数据包
+        else:
+            avg_count_per_sample = quotient  # 向下取整
+
+        print(f"数据包大小: {most_common_size}, 方向: {most_common_direction}, "
+              f"出现次数: {most_common_count}, 每个样本中的平均出现数: {avg_count_per_sample}")
+
+        # 将结果存储到字典
+        device_results[device_folder][session_folder][
+            (most_common_size, most_common_direction)] = avg_count_per_sample
 
     # 保存每个设备的统计结果到新的CSV文件中
     for device_name, sessions in device_results.items():
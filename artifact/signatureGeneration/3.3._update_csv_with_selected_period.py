@@ -13,8 +13,12 @@ device_name, session_name, packet_distribution
 脚本的主要步骤如下：
 1. 读取目标 CSV 文件 `uk_merged_results.csv`，每一行包含设备名、会话名和数据包分布。
 2. 从 `session_name` 中提取会话标识符的前部分（即 `___` 前的部分）。
-3. 根据 `device_name` 和提取的会话基本部分，查找 `source_dir` 中对应设备文件夹和会话文件夹。
-4. 在找到的会话文件夹中读取 `record.txt` 文件，提取选择的周期值。
+3. 一次性加载 `source_dir` 中所有会话选择的周期，得到 {(设备名, 日期, 会话基本部分): 周期} 的映射（load_session_periods）：
+   `source_dir` 下有 1.3 输出的 period_results.csv 时直接读取其中拆分成功的会话；
+   否则遍历一次 `source_dir`，读取每个会话文件夹中的 `record.txt` 文件，提取选择的周期值。
+   设置 DEVICEID_CATALOG 时，改为从目录库（tool.catalog）查询 1.3 登记的周期。
+4. 按 `device_name` 和提取的会话基本部分在映射中精确查找周期（不再对每一行遍历设备文件夹、按子串匹配会话文件夹）。
+   CSV 中的会话来自 2.8 合并后的会话表，没有日期；同一会话在多个日期都有周期时，使用最后一个日期的周期（latest_day_periods）。
 5. 更新 `session_name`，将提取的周期值添加到会话名的后面。
 6. 将更新后的数据保存回 CSV 文件。
 
@@ -26,6 +30,12 @@ device_name, session_name, packet_distribution
 import os
 import re
 import csv
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.catalog import connect_catalog, session_periods
+
+RESULTS_NAME = 'period_results.csv'  # 与 1.3 相同
 
 
 def extract_selected_cycle(record_file):
@@ -43,10 +53,47 @@ def extract_selected_cycle(record_file):
     return None
 
 
-def update_session_name_in_csv(target_csv, source_dir):
+def _session_key(parts):
+    """设备/日期/会话 路径各部分对应的 (设备, 日期, 会话)，没有日期层级时日期为空字符串。"""
+    return parts[0], parts[1] if len(parts) > 2 else '', parts[-1]
+
+
+def load_session_periods(source_dir):
+    """
+    返回 {(设备名, 日期, 会话基本部分): 选择的周期}。会话目录位于 设备/日期/会话 下，
+    优先读取 period_results.csv（1.3 的处理结果），没有时遍历一次目录读取 record.txt。
+    """
+    periods = {}
+    results_file = os.path.join(source_dir, RESULTS_NAME)
+    if os.path.isfile(results_file):
+        with open(results_file, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row['status'] == 'split' and row['period']:
+                    periods[_session_key(row['session'].split('/'))] = row['period']
+        return periods
+
+    for root, dirs, files in os.walk(source_dir):
+        if "record.txt" in files:
+            selected_cycle = extract_selected_cycle(os.path.join(root, "record.txt"))
+            if selected_cycle:
+                periods[_session_key(os.path.relpath(root, source_dir).split(os.sep))] = selected_cycle
+    return periods
+
+
+def latest_day_periods(periods):
+    """{(设备名, 日期, 会话): 周期} 转换为 {(设备名, 会话): 周期}，同一会话有多个日期时使用最后一个日期的周期。"""
+    return {(device, session): period for (device, _, session), period in sorted(periods.items())}
+
+
+def update_session_name_in_csv(target_csv, source_dir, periods=None):
     """
     更新 CSV 文件中的会话名，添加最佳周期值。
+    periods 为 {(设备名, 日期, 会话基本部分): 周期}（如目录库中的周期），为空时由 source_dir 加载。
     """
+    if periods is None:
+        periods = load_session_periods(source_dir)
+    periods = latest_day_periods(periods)
+
     # 打开并读取CSV文件
     with open(target_csv, mode='r', encoding='utf-8') as infile:
         reader = csv.reader(infile)
@@ -62,36 +109,15 @@ def update_session_name_in_csv(target_csv, source_dir):
         session_parts = session_name.split("___")
         session_base_name = session_parts[0]  # 提取会话的基本部分
 
-        # 找到设备文件夹对应的 session 文件夹
-        source_device_path = os.path.join(source_dir, device_name)
-        if not os.path.isdir(source_device_path):
-            print(f"设备文件夹 {device_name} 在 source_dir 中未找到，跳过。")
-            continue
-
-        # 在设备文件夹下寻找对应的会话文件夹
-        session_path = None
-        for root, dirs, _ in os.walk(source_device_path):
-            for dir_name in dirs:
-                if session_base_name in dir_name:
-                    session_path = os.path.join(root, dir_name)
-                    break
-            if session_path:
-                break
-
-        # 如果找到了会话文件夹，读取record.txt，提取周期值
-        if session_path:
-            record_file = os.path.join(session_path, "record.txt")
-            if os.path.isfile(record_file):
-                selected_cycle = extract_selected_cycle(record_file)
-                if selected_cycle:
-                    # 更新会话名
-                    new_session_name = f"{session_name}_____{selected_cycle}"
-                    row[1] = new_session_name  # 更新 session_name 列
-                    print(f"已更新会话名：{session_name} -> {new_session_name}")
-            else:
-                print(f"在 {session_path} 中找不到 record.txt 文件，跳过。")
+        # 在映射中查找会话选择的周期
+        selected_cycle = periods.get((device_name, session_base_name))
+        if selected_cycle is not None:
+            # 更新会话名
+            new_session_name = f"{session_name}_____{selected_cycle}"
+            row[1] = new_session_name  # 更新 session_name 列
+            print(f"已更新会话名：{session_name} -> {new_session_name}")
         else:
-            print(f"未找到对应的会话文件夹 {session_base_name}，跳过。")
+            print(f"未找到会话 {device_name}/{session_base_name} 的周期，跳过。")
 
     # 写回更新后的 CSV 文件
     with open(target_csv, mode='w', encoding='utf-8', newline='') as outfile:
@@ -104,7 +130,12 @@ def main():
     target_csv = "artifact/outputs/signatures/14_keyPacketMerge/14_keyPacketMerge_merged_results.csv"
     source_dir = "artifact/outputs/signatures/3_selectDir"
 
-    update_session_name_in_csv(target_csv, source_dir)
+    conn = connect_catalog()
+    periods = session_periods(conn) if conn is not None else None
+    if conn is not None:
+        conn.close()
+
+    update_session_name_in_csv(target_csv, source_dir, periods)
 
 
 if __name__ == "__main__":
@@ -23,10 +23,17 @@
 """
 
 import os
+import sys
 import csv
 import random
 import ast
 
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import is_table
+from tool.feature_schema import load_feature_table, save_feature_table
+
 
 # 读取关键数据包CSV文件，返回一个字典以便快速查找
 def read_key_packet_csv(key_packet_csv_path):
@@ -46,17 +53,20 @@ def read_key_packet_csv(key_packet_csv_path):
     return key_packet_info
 
 
+# 按特征表类型读取样本，逐行返回字典
+def read_sample_rows(sample_path, columns=None):
+    return load_feature_table(sample_path, columns=columns).to_dict('records')
+
+
 # 验证样本是否包含关键数据包的分布
 def validate_sample(sample_path, key_packets):
     # print(f"正在验证样本文件: {sample_path}")
     sample_packets = {}
 
-    with open(sample_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            # 将 frame.len 和 direction 组合为 key
-            packet_key = f"{row['frame.len']}_{row['direction']}"
-            sample_packets[packet_key] = sample_packets.get(packet_key, 0) + 1  # 统计相同 key 的数量
+    for row in read_sample_rows(sample_path, columns=['frame.len', 'direction']):
+        # 将 frame.len 和 direction 组合为 key
+        packet_key = f"{row['frame.len']}_{row['direction']}"
+        sample_packets[packet_key] = sample_packets.get(packet_key, 0) + 1  # 统计相同 key 的数量
 
     # 检查样本中的数据包分布是否与关键数据包分布一致
     for key, count in key_packets.items():
@@ -75,11 +85,9 @@ def process_and_save_sample(sample_path, key_packets, output_folder, device_fold
 
     # 读取样本并排序
     packets = []
-    with open(sample_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            row['frame.time_epoch'] = float(row['frame.time_epoch'])
-            packets.append(row)
+    for row in read_sample_rows(sample_path):
+        row['frame.time_epoch'] = float(row['frame.time_epoch'])
+        packets.append(row)
     packets.sort(key=lambda x: x['frame.time_epoch'])  # 按时间戳排序
 
     # 匹配关键数据包
@@ -99,16 +107,13 @@ def process_and_save_sample(sample_path, key_packets, output_folder, device_fold
     if all(count == 0 for count in key_packets_copy.values()):
         # 确保输出文件夹存在
         output_device_folder = os.path.join(output_folder, device_folder)
-        output_session_folder = os.path.join(output_device_folder, f"{session_folder}.csv")
+        output_session_folder = os.path.join(output_device_folder, session_folder)
         os.makedirs(output_device_folder, exist_ok=True)
 
-        # 写入新的CSV文件
+        # 写入新的表格文件
         fieldnames = ['frame.time_epoch', 'frame.len', 'direction', 'time_interval', 'protocol_type', 'payload',
                       'label']
-        with open(output_session_folder, mode='w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(matched_packets)
+        output_session_folder = save_feature_table(pd.DataFrame(matched_packets, columns=fieldnames), output_session_folder)
 
         print(f"匹配的数据包已保存到 {output_session_folder}")
         print()
@@ -148,7 +153,7 @@ def process_samples(root_folder, key_packet_csv_path, output_folder):
             key_packets = key_packet_info[(device_folder, session_folder)]
 
             # 获取会话文件夹中的所有CSV文件
-            csv_files = [f for f in os.listdir(session_path) if f.endswith('.csv')]
+            csv_files = [f for f in os.listdir(session_path) if is_table(f)]
             if not csv_files:
                 print(f"会话 {session_folder} 中没有 CSV 文件")
                 continue
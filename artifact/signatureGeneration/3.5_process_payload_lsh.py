@@ -26,7 +26,10 @@
 
 import os
 import re
-import pandas as pd
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.table_io import is_table, table_stem, read_table, write_table
 
 
 class Nilsimsa:
@@ -195,7 +198,7 @@ def process_csv_file(input_csv, output_csv):
       4) 替换原有的 payload
     最后将更新后的 DataFrame 保存到 output_csv。
     """
-    df = pd.read_csv(input_csv)
+    df = read_table(input_csv)
 
     for idx, row in df.iterrows():
         payload = row.get('payload', None)  # 若无该列，则返回 None
@@ -217,7 +220,8 @@ def process_csv_file(input_csv, output_csv):
             # 如果 payload 为空或 NaN，则用空字符串或其他标识替代
             df.at[idx, 'payload'] = ''
 
-    df.to_csv(output_csv, index=False)
+    # 输出供 signatureMatching 使用，始终保存为 CSV
+    output_csv = write_table(df, output_csv, fmt='csv')
     print(f"已处理并保存: {output_csv}")
 
 
@@ -231,7 +235,7 @@ def process_all_csv(input_folder, output_folder):
 
     for root, dirs, files in os.walk(input_folder):
         for file in files:
-            if file.endswith('.csv'):
+            if is_table(file):
                 file_count += 1  # 统计处理的文件数
                 input_csv_path = os.path.join(root, file)
 
@@ -242,7 +246,7 @@ def process_all_csv(input_folder, output_folder):
                     os.makedirs(target_dir)
 
                 # 输出文件名与原文件名相同
-                output_csv_path = os.path.join(target_dir, file)
+                output_csv_path = os.path.join(target_dir, table_stem(file) + '.csv')
 
                 # 处理并输出
                 process_csv_file(input_csv_path, output_csv_path)
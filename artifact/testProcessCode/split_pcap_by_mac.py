@@ -8,30 +8,47 @@
 
 过程:
 1. 遍历输入文件夹中的所有 pcap 文件。
-2. 逐步读取每个 pcap 文件（使用流式读取方式处理大文件，避免内存溢出）。
-3. 若该 MAC 地址在 pcap 文件中出现，则提取相关数据包，并存储到 "设备名_日期.pcap" 文件。
+2. 每个 pcap 文件只读取一遍（使用流式读取方式处理大文件，避免内存溢出），用源/目的 MAC 在哈希表中查找所属设备，
+   同时拆分出所有设备的流量，而不是每个设备重新读取一遍文件。
+3. 若该 MAC 地址在 pcap 文件中出现，则提取相关数据包，经有上限的缓冲区写入 "设备名_日期.pcap" 文件。
 4. 若 MAC 地址未出现，则跳过该设备，不生成 pcap 文件。
 5. 每个设备的 pcap 文件存入对应的文件夹 ("DeviceA/", "DeviceB/" 等)。
 
 """
 
 import os
+import sys
 import glob
-from scapy.all import PcapReader, wrpcap
 
-
-def extract_device_packets(input_pcap, mac_address):
-    """使用流式读取方式提取指定MAC地址的流量，避免内存溢出"""
-    print(f"正在处理文件: {input_pcap}，筛选 MAC 地址: {mac_address}")
-    filtered_packets = []
-
-    with PcapReader(input_pcap) as pcap_reader:
-        for pkt in pcap_reader:
-            if pkt.haslayer("Ether") and (pkt.src == mac_address or pkt.dst == mac_address):
-                filtered_packets.append(pkt)
-
-    print(f"筛选完成，找到 {len(filtered_packets)} 个数据包")
-    return filtered_packets
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将 artifact/ 加入搜索路径，以便导入 tool 包
+from tool.pcap_io import PcapRecordReader, PcapWriterPool, packet_macs, mac_to_bytes
+
+
+def demux_device_packets(input_pcap, mac_output_map):
+    """
+    一遍读取 pcap 文件，按 MAC 地址把数据包分发到各设备的输出文件，直接写入原始记录字节。
+    mac_output_map: {MAC 地址字符串: 输出文件路径}
+    返回 {输出文件路径: 数据包数目}，没有流量的设备不会生成文件，也不出现在返回值中。
+    """
+    print(f"正在处理文件: {input_pcap}，筛选 {len(mac_output_map)} 个 MAC 地址")
+    outputs = {mac_to_bytes(mac): output_pcap for mac, output_pcap in mac_output_map.items()}
+
+    with PcapRecordReader(input_pcap) as pcap_reader, PcapWriterPool(pcap_reader.pcap_header) as writers:
+        linktype = pcap_reader.linktype
+        for _, _, record in pcap_reader:
+            macs = packet_macs(record, linktype)
+            if macs is None:
+                continue
+            src_output = outputs.get(macs[0])
+            dst_output = outputs.get(macs[1])
+            if src_output is not None:
+                writers.write(src_output, record)
+            # 两台设备之间的流量分别写入两台设备的文件
+            if dst_output is not None and dst_output != src_output:
+                writers.write(dst_output, record)
+
+    print(f"筛选完成，{len(writers.counts)} 个设备有流量")
+    return writers.counts
 
 
 def process_pcap_files(input_folder, output_folder, device_mac_map):
@@ -41,20 +58,24 @@ def process_pcap_files(input_folder, output_folder, device_mac_map):
     pcap_files = glob.glob(os.path.join(input_folder, "*.pcap"))
     print(f"在 {input_folder} 目录下找到 {len(pcap_files)} 个 pcap 文件")
 
+    for device_name in device_mac_map:
+        os.makedirs(os.path.join(output_folder, device_name), exist_ok=True)
+
     for pcap_file in pcap_files:
         date_str = os.path.basename(pcap_file).split(".")[0]  # 提取日期部分
         print(f"\n正在处理 {pcap_file} (日期: {date_str})")
 
-        for device_name, mac_address in device_mac_map.items():
-            device_folder = os.path.join(output_folder, device_name)
-            os.makedirs(device_folder, exist_ok=True)
-
-            packets = extract_device_packets(pcap_file, mac_address)
+        mac_output_map = {
+            mac_address: os.path.join(output_folder, device_name, f"{device_name}_{date_str}.pcap")
+            for device_name, mac_address in device_mac_map.items()
+        }
+        packet_counts = demux_device_packets(pcap_file, mac_output_map)
 
-            if packets:  # 只有当有流量时才写入
-                output_pcap = os.path.join(device_folder, f"{device_name}_{date_str}.pcap")
-                wrpcap(output_pcap, packets)
-                print(f"[{device_name}] {date_str}: 流量已保存 ({len(packets)} 包) -> {output_pcap}")
+        for device_name, mac_address in device_mac_map.items():
+            output_pcap = mac_output_map[mac_address]
+            packet_count = packet_counts.get(output_pcap, 0)
+            if packet_count:  # 只有当有流量时才写入
+                print(f"[{device_name}] {date_str}: 流量已保存 ({packet_count} 包) -> {output_pcap}")
             else:
                 print(f"[{device_name}] {date_str}: 无流量，跳过")
 
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+"""
+各阶段脚本共享的工具模块。
+脚本文件名以数字开头，无法互相导入，因此公共逻辑统一放在 tool 包中，由脚本将 artifact/ 目录加入 sys.path 后导入。
+"""
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+流水线目录库（catalog）：用一个 SQLite 数据库记录设备、日期、会话、周期段和簇，以及样本数、处理耗时和选择的周期。
+各阶段原来通过 os.walk 重新遍历目录，并从名称中解析元数据（会话名的 ___样本数、_____周期后缀，
+record.txt 中的“选择周期”，设备为上两级目录名）。设置环境变量 DEVICEID_CATALOG=<数据库路径> 后，
+各阶段把输出登记到目录库中，后续阶段直接查询，不需要再遍历目录、解析文件名：
+
+    1.3   登记会话的周期检测结果（状态、选择的周期、周期段数、耗时）和周期段；
+    2.1   登记会话的样本数；
+    2.2   从目录库生成 period_record.txt（只记录 4_suitableDir 中实际存在的会话）；
+    2.8 / 2.4-2.8  登记合并后的样本数；
+    2.9   登记簇的位置和大小；2.10 按聚类清单筛选后，把清单中的簇和筛选结果同步到目录库；
+    3.3   从目录库查询会话的周期。
+
+未设置 DEVICEID_CATALOG 时不使用目录库，各阶段的行为不变。数据库只由各阶段的主进程写入。
+
+表结构：
+    devices   (device)
+    days      (device, day)
+    sessions  (device, day, session, status, period, selection, segments, seconds, samples, merged_samples)
+    segments  (device, day, session, segment, start_time, end_time, packets)
+    clusters  (device, session, cluster, table_path, start, rows, kept)
+其中 session 为会话的基本名称（不含 ___样本数、_____周期 后缀），见 split_session_name。
+同一会话（如 DHCP、NTP）每个抓包日期都会出现，会话和周期段按 (设备, 日期, 会话) 区分，没有日期层级时 day 为空字符串。
+簇来自 2.8 合并后的会话表，其目录结构中没有日期层级，按 (设备, 会话, 簇) 区分。
+表结构变化时（SCHEMA_VERSION）删除旧表重新建立，目录库中的内容都可以由各阶段的输出重新登记。
+
+1. connect_catalog
+    打开（必要时创建）目录库，未设置时返回 None。
+2. register_session / register_segments / register_clusters / mark_kept_clusters
+    登记各阶段的输出，同一会话重复登记时更新已有记录。这些函数不提交事务，
+    调用方把一个阶段的所有登记放在一个 with conn: 中，一次提交。
+3. session_periods / query_period_records
+    查询会话的周期和周期记录。
+"""
+
+import os
+import sqlite3
+
+CATALOG_ENV = 'DEVICEID_CATALOG'
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    device TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS days (
+    device TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (device, day)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    device TEXT NOT NULL,
+    day TEXT NOT NULL,
+    session TEXT NOT NULL,
+    status TEXT,
+    period INTEGER,
+    selection TEXT,
+    segments INTEGER,
+    seconds REAL,
+    samples INTEGER,
+    merged_samples INTEGER,
+    PRIMARY KEY (device, day, session)
+);
+CREATE TABLE IF NOT EXISTS segments (
+    device TEXT NOT NULL,
+    day TEXT NOT NULL,
+    session TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    packets INTEGER,
+    PRIMARY KEY (device, day, session, segment)
+);
+CREATE TABLE IF NOT EXISTS clusters (
+    device TEXT NOT NULL,
+    session TEXT NOT NULL,
+    cluster INTEGER NOT NULL,
+    table_path TEXT,
+    start INTEGER,
+    rows INTEGER,
+    kept INTEGER,
+    PRIMARY KEY (device, session, cluster)
+);
+"""
+
+SESSION_FIELDS = ['status', 'period', 'selection', 'segments', 'seconds', 'samples', 'merged_samples']
+
+
+def split_session_name(name):
+    """把 会话___样本数_____周期 形式的名称拆分为 (会话, 样本数, 周期)，没有的部分为 None。"""
+    name, _, period = name.partition('_____')
+    session, _, samples = name.partition('___')
+    return session, int(samples) if samples.isdigit() else None, int(period) if period.isdigit() else None
+
+
+def connect_catalog(path=None):
+    """打开目录库，path 为空时使用环境变量 DEVICEID_CATALOG，未设置时返回 None。"""
+    path = path or os.environ.get(CATALOG_ENV, '').strip()
+    if not path:
+        return None
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        with conn:
+            for table in ('devices', 'days', 'sessions', 'segments', 'clusters'):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def register_session(conn, device, day, session, **fields):
+    """登记会话，day 为抓包日期（没有日期层级时为空），fields 为 SESSION_FIELDS 中的字段，只更新给出的字段。"""
+    unknown = set(fields) - set(SESSION_FIELDS)
+    if unknown:
+        raise ValueError(f"未知的会话字段: {', '.join(sorted(unknown))}")
+    day = day or ''
+    conn.execute("INSERT OR IGNORE INTO devices (device) VALUES (?)", (device,))
+    if day:
+        conn.execute("INSERT OR IGNORE INTO days (device, day) VALUES (?, ?)", (device, day))
+    conn.execute("INSERT OR IGNORE INTO sessions (device, day, session) VALUES (?, ?, ?)", (device, day, session))
+    if fields:
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        conn.execute(f"UPDATE sessions SET {assignments} WHERE device = ? AND day = ? AND session = ?",
+                     (*fields.values(), device, day, session))
+
+
+def register_segments(conn, device, day, session, segments):
+    """登记会话的周期段（替换已有记录），segments 为包含 segment，及可选 start_time / end_time / packets 的字典列表。"""
+    day = day or ''
+    conn.execute("DELETE FROM segments WHERE device = ? AND day = ? AND session = ?", (device, day, session))
+    conn.executemany(
+        "INSERT INTO segments (device, day, session, segment, start_time, end_time, packets) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(device, day, session, s['segment'], s.get('start_time'), s.get('end_time'), s.get('packets'))
+         for s in segments])
+
+
+def register_clusters(conn, clusters):
+    """登记 2.9 的全部簇（替换已有记录，与聚类清单一致），clusters 为聚类清单的行（见 tool.cluster_manifest）。"""
+    conn.execute("DELETE FROM clusters")
+    conn.executemany(
+        "INSERT INTO clusters (device, session, cluster, table_path, start, rows) VALUES (?, ?, ?, ?, ?, ?)",
+        [(c['device'], split_session_name(c['session'])[0], c['cluster'], c['table'], c['start'], c['rows'])
+         for c in clusters])
+
+
+def mark_kept_clusters(conn, clusters, kept):
+    """登记 2.10 的筛选结果：clusters 中属于 kept 的簇标记为保留，其余标记为删除。"""
+    kept = {(c['device'], c['session'], c['cluster']) for c in kept}
+    conn.executemany(
+        "UPDATE clusters SET kept = ? WHERE device = ? AND session = ? AND cluster = ?",
+        [(int((c['device'], c['session'], c['cluster']) in kept), c['device'],
+          split_session_name(c['session'])[0], c['cluster']) for c in clusters])
+
+
+def session_periods(conn):
+    """返回 {(设备, 日期, 会话): 选择的周期}，只包含有周期的会话。"""
+    rows = conn.execute("SELECT device, day, session, period FROM sessions WHERE period IS NOT NULL")
+    return {(row['device'], row['day'], row['session']): row['period'] for row in rows}
+
+
+def query_period_records(conn, min_samples=0):
+    """有选择周期、样本数不少于 min_samples 的会话，按设备、日期、会话排序。"""
+    return conn.execute("SELECT * FROM sessions WHERE selection IS NOT NULL AND samples >= ? "
+                        "ORDER BY device, day, session", (min_samples,)).fetchall()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+聚类清单（manifest）：2.9 不再为每个簇写一个 cluster_<k>_samples.csv / noise_samples.csv，
+而是每个会话只写一个按簇标签排序的表 {设备}/{会话}.csv（每个簇的数据包连续存放，最后一列为 cluster），
+并在输出根目录写一个 clusters.csv 记录每个簇在表中的位置和大小。
+2.10 只需按清单中的大小筛选簇，不再复制、重新读取每个簇文件；3.1 按清单读取保留的簇。
+
+clusters.csv 的格式：
+    device,session,table,cluster,start,rows
+    blink-security-hub,192.168.20.105_68_192.168.20.254_67_17___107,blink-security-hub/192.168.20.105_68_192.168.20.254_67_17___107.csv,0,0,107
+其中：
+- device / session：设备名和会话名（2.8 合并表的文件名，不含后缀，以 ___样本数 结尾）；
+- table：会话表相对于清单所在目录的路径；
+- cluster：簇标签，-1 为噪声；
+- start / rows：该簇在会话表中的起始行号（不含表头）和数据包数目。
+
+簇内数据包的顺序、列与原来的 cluster_<k>_samples.csv 相同，因此表中 [start, start + rows) 的行就是原来的簇文件。
+"""
+
+import csv
+import os
+
+from tool.feature_schema import load_feature_table
+
+CLUSTER_MANIFEST_NAME = 'clusters.csv'
+CLUSTER_MANIFEST_FIELDS = ['device', 'session', 'table', 'cluster', 'start', 'rows']
+
+
+def has_cluster_manifest(root_dir):
+    return os.path.isfile(os.path.join(root_dir, CLUSTER_MANIFEST_NAME))
+
+
+def write_cluster_manifest(root_dir, clusters):
+    """写入聚类清单，先写临时文件再替换，避免留下不完整的清单。clusters 为字段同 CLUSTER_MANIFEST_FIELDS 的字典列表。"""
+    os.makedirs(root_dir, exist_ok=True)
+    manifest_path = os.path.join(root_dir, CLUSTER_MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CLUSTER_MANIFEST_FIELDS)
+        writer.writeheader()
+        for cluster in clusters:
+            writer.writerow({field: cluster[field] for field in CLUSTER_MANIFEST_FIELDS})
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def read_cluster_manifest(root_dir):
+    """读取聚类清单，返回字典列表，数值字段已转换类型。"""
+    clusters = []
+    with open(os.path.join(root_dir, CLUSTER_MANIFEST_NAME), 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            clusters.append({
+                'device': row['device'],
+                'session': row['session'],
+                'table': row['table'],
+                'cluster': int(row['cluster']),
+                'start': int(row['start']),
+                'rows': int(row['rows']),
+            })
+    return clusters
+
+
+def iter_cluster_tables(root_dir, columns=None):
+    """
+    按清单逐个返回 (清单中的一行, 该簇的数据包 DataFrame)。
+    同一会话的簇连续返回，会话表只读取一次；columns 指定只读取部分列。
+    """
+    table_path = table_df = None
+    for cluster in read_cluster_manifest(root_dir):
+        path = os.path.join(root_dir, cluster['table'])
+        if path != table_path:
+            table_path, table_df = path, load_feature_table(path, columns=columns)
+        yield cluster, table_df.iloc[cluster['start']:cluster['start'] + cluster['rows']]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+数据包特征表（2.7 输出的 9_feature、2.8 合并的 10_featureMerge 以及之后的聚类结果、签名）统一的列类型。
+默认读取时 frame.len、direction 为 int64，protocol_type、label 和十六进制的 payload 为 Python 字符串对象，
+数据包多的设备合并后的会话表会占用大量内存。这里按实际取值范围使用窄类型：
+
+    frame.time_epoch  float64
+    frame.len         uint16（超过 65535 时为 int32）
+    direction         int8
+    time_interval     float64
+    protocol_type     category
+    label             category
+    payload           bytes（内存中为原始字节，约为十六进制字符串的一半；写出时转换回十六进制字符串）
+
+列中有缺失值时整数列保持原类型（float64），写出的 CSV 与原来相同。
+
+1. load_feature_table
+    读取特征表并转换为上述类型；columns 指定只读取部分列，payload=False 时不读取 payload 列。
+2. save_feature_table
+    写出特征表，payload 转换回十六进制字符串，文件内容与按默认类型写出时相同。
+3. apply_feature_schema
+    把已有的 DataFrame（如合并、拆分之后）转换为上述类型。
+"""
+
+import numpy as np
+import pandas as pd
+
+from tool.table_io import file_format, read_table, write_table, table_columns
+
+FEATURE_DTYPES = {
+    'frame.time_epoch': 'float64',
+    'frame.len': 'uint16',
+    'direction': 'int8',
+    'time_interval': 'float64',
+    'protocol_type': 'category',
+    'label': 'category',
+}
+PAYLOAD_COLUMN = 'payload'
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        try:
+            return bytes.fromhex(value)
+        except ValueError:
+            return value  # 不是十六进制的取值保持不变
+    return value
+
+
+def _to_hex(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def _integer_dtype(values, dtype):
+    if values.isna().any():
+        return None
+    if dtype == 'uint16' and len(values) and (values.min() < 0 or values.max() > np.iinfo(np.uint16).max):
+        return 'int32'
+    return dtype
+
+
+def apply_feature_schema(df):
+    """按 FEATURE_DTYPES 转换 df 中存在的列（原地修改并返回 df）。"""
+    for col, dtype in FEATURE_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype == 'float64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        else:
+            values = pd.to_numeric(df[col], errors='coerce')
+            dtype = _integer_dtype(values, dtype)
+            df[col] = values.astype(dtype) if dtype else values
+    if PAYLOAD_COLUMN in df.columns and df[PAYLOAD_COLUMN].dtype == object:
+        df[PAYLOAD_COLUMN] = df[PAYLOAD_COLUMN].map(_to_bytes)
+    return df
+
+
+def load_feature_table(path, columns=None, payload=True):
+    """读取特征表并转换为紧凑类型。payload=False 时不读取 payload 列。"""
+    if not payload:
+        columns = [col for col in (columns or table_columns(path)) if col != PAYLOAD_COLUMN]
+    csv_kwargs = {}
+    if file_format(path) == 'csv':
+        # payload 按字符串读取，避免像 '00' 这样的十六进制串被识别为数字
+        csv_kwargs['dtype'] = {PAYLOAD_COLUMN: str}
+    return apply_feature_schema(read_table(path, columns=columns, **csv_kwargs))
+
+
+def save_feature_table(df, path, fmt=None):
+    """写出特征表，返回实际写入的路径。"""
+    if PAYLOAD_COLUMN in df.columns and df[PAYLOAD_COLUMN].dtype == object:
+        df = df.assign(**{PAYLOAD_COLUMN: df[PAYLOAD_COLUMN].map(_to_hex)})
+    return write_table(df, path, fmt)
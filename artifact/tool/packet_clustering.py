@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+2.9 的数据包聚类。
+聚类特征（frame.len、direction、protocol_type 编号）都是离散值，合并后的会话表中大量数据包的取值完全相同。
+这里先按取值分组得到取值直方图（O(n) 的哈希分组），再在去重后的取值上聚类，最后把结果映射回每个数据包：
+
+    exact   相同取值为一组，数据包数目不少于 min_samples 的组为一个簇，其余为噪声（-1）；
+    dbscan  在去重后的取值上运行 DBSCAN，数据包数目作为 sample_weight，
+            与在全部数据包上运行 DBSCAN(eps, min_samples) 的划分和簇编号相同；
+    auto    标准化后任意两个不同取值的距离都大于 eps 时，DBSCAN 的邻域内只有相同取值的数据包，exact 与 dbscan 结果相同，
+            使用 exact；否则使用 dbscan。默认使用 auto，结果始终与原来的 DBSCAN 相同。
+
+去重后的取值按首次出现的顺序排列，簇按首个核心数据包出现的顺序编号，与 sklearn 在全部数据包上的编号方式一致。
+"""
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import KDTree
+from sklearn.preprocessing import StandardScaler
+
+CLUSTER_ENGINES = ('auto', 'exact', 'dbscan')
+
+
+def value_histogram(features):
+    """返回 (group, first_rows, counts)：每个数据包所属的取值编号、每个取值首次出现的行号和数据包数目。"""
+    group = features.groupby(list(features.columns), sort=False, dropna=False).ngroup().to_numpy()
+    counts = np.bincount(group)
+    first_rows = np.full(len(counts), len(group), dtype=np.int64)
+    np.minimum.at(first_rows, group, np.arange(len(group)))
+    return group, first_rows, counts
+
+
+def _distinct_values_overlap(scaled_values, eps):
+    """标准化后是否存在距离不超过 eps 的两个不同取值。"""
+    if len(scaled_values) < 2:
+        return False
+    distances, _ = KDTree(scaled_values).query(scaled_values, k=2)
+    return bool((distances[:, 1] <= eps).any())
+
+
+def cluster_packets(features, eps=0.01, min_samples=5, engine='auto'):
+    """
+    对 features（数值列，每行一个数据包）聚类，返回每个数据包的簇标签，噪声为 -1。
+    标准化使用全部数据包的均值和标准差，与 StandardScaler().fit_transform(features) 相同。
+    """
+    if engine not in CLUSTER_ENGINES:
+        raise ValueError(f"未知的聚类方式: {engine}，可选: {', '.join(CLUSTER_ENGINES)}")
+    if len(features) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    group, first_rows, counts = value_histogram(features)
+    values = features.to_numpy(dtype=np.float64)[first_rows]
+    if engine != 'exact':
+        scaled_values = StandardScaler().fit(features.to_numpy(dtype=np.float64)).transform(values)
+        if engine == 'auto' and not _distinct_values_overlap(scaled_values, eps):
+            engine = 'exact'
+
+    if engine == 'exact':
+        core = counts >= min_samples
+        value_labels = np.where(core, np.cumsum(core) - 1, -1)
+    else:
+        value_labels = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(scaled_values, sample_weight=counts)
+    return value_labels[group]
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+"""
+不依赖 tshark，直接从 pcap 记录字节中解码 2.3 所需的字段。
+输出的字段名和取值格式与 tshark -T fields -E occurrence=f 保持一致，例如：
+    frame.time_epoch  1556316921.145550000
+    frame.protocols   eth:ethertype:ip:tcp:tls
+    tcp.flags         0x0018
+    tcp.payload       17030300405e45...（不带冒号的十六进制）
+
+1. FIELDS
+    支持的字段，与 2.3 的 PREFERRED_FIELDS 相同。
+2. PacketFieldExtractor
+    按文件创建，逐条解码记录并返回与 FIELDS 对应的字符串列表；
+    同一个文件中跟踪 TCP 握手中的窗口扩大因子，tcp.window_size 与 tshark 一样按扩大后的值输出。
+
+与 tshark 的差异（下游只按子串判断 tls/tcp/udp/dhcp，只使用 tls.record.content_type 是否为 23 或为空）：
+    frame.protocols 只识别以太网/VLAN/ARP/IPv4/IPv6/TCP/UDP，以及按端口判断的 dhcp、dns、ntp、mdns、ssdp 和 tls；
+    TLS 不做重组：TCP 负载以合法的 TLS 记录头开始时输出 tls 和第一个记录的 content_type，
+    TLS 端口上不以记录头开始的负载（记录的后续分段）只输出 tls，content_type 为空；
+    _ws.expert.message 需要 tshark 的专家分析，始终为空。
+"""
+
+import struct
+
+from tool.pcap_io import DLT_EN10MB, DLT_RAW, PCAP_RECORD_HEADER_LEN, IPPROTO_TCP, IPPROTO_UDP
+
+FIELDS = [
+    "frame.time_epoch",
+    "frame.protocols",
+    "frame.len",
+    "eth.src",
+    "eth.dst",
+    "ip.src",
+    "ip.dst",
+    "ip.len",
+    "tcp.len",
+    "udp.length",
+    "ip.ttl",
+    "tcp.srcport",
+    "tcp.dstport",
+    "udp.srcport",
+    "udp.dstport",
+    "tcp.flags",
+    "tls.record.content_type",
+    "tcp.window_size",
+    "_ws.expert.message",
+    "tcp.payload",
+    "udp.payload",
+]
+_COL = {name: i for i, name in enumerate(FIELDS)}
+
+_ETH_P_IP = 0x0800
+_ETH_P_ARP = 0x0806
+_ETH_P_IPV6 = 0x86dd
+_VLAN_TYPES = (0x8100, 0x88a8)
+
+TLS_PORTS = {443, 465, 563, 636, 853, 989, 990, 992, 993, 994, 995, 5061, 8443}
+_UDP_APPS = {67: 'dhcp', 68: 'dhcp', 53: 'dns', 123: 'ntp', 5353: 'mdns', 1900: 'ssdp'}
+_TLS_CONTENT_TYPES = (20, 21, 22, 23, 24)
+
+_PCAP_MAGIC_USEC = 0xa1b2c3d4
+_PCAP_MAGIC_NSEC = 0xa1b23c4d
+_U16 = struct.Struct('!H')
+_TCP_HEAD = struct.Struct('!HHIIBBH')
+_UDP_HEAD = struct.Struct('!HHH')
+
+
+def _mac(b):
+    return ':'.join(f'{x:02x}' for x in b)
+
+
+def _ipv4(b):
+    return f'{b[0]}.{b[1]}.{b[2]}.{b[3]}'
+
+
+def _tcp_window_shift(options):
+    """从 TCP 选项中取出窗口扩大因子，没有该选项时返回 None。"""
+    i = 0
+    while i < len(options):
+        kind = options[i]
+        if kind == 0:
+            break
+        if kind == 1:
+            i += 1
+            continue
+        if i + 1 >= len(options) or options[i + 1] < 2:
+            break
+        if kind == 3 and options[i + 1] == 3 and i + 2 < len(options):
+            return min(options[i + 2], 14)
+        i += options[i + 1]
+    return None
+
+
+class PacketFieldExtractor:
+    """
+    header 为 PcapRecordReader.pcap_header，用于确定记录头的字节序和时间精度；linktype 为链路层类型。
+    extract(record) 返回与 FIELDS 对应的字符串列表。
+    """
+
+    def __init__(self, header, linktype=DLT_EN10MB):
+        for endian in ('<', '>'):
+            magic = struct.unpack(endian + 'I', header[:4])[0]
+            if magic in (_PCAP_MAGIC_USEC, _PCAP_MAGIC_NSEC):
+                break
+        self._rec_header = struct.Struct(endian + 'IIII')
+        self._frac_digits = 9 if magic == _PCAP_MAGIC_NSEC else 6
+        self.linktype = linktype
+        self._syn_shift = {}  # (源 IP, 源端口, 目的 IP, 目的端口) -> SYN 中的窗口扩大因子
+
+    def extract(self, record):
+        row = [''] * len(FIELDS)
+        sec, frac, caplen, wirelen = self._rec_header.unpack_from(record, 0)
+        row[0] = f'{sec}.{frac:0{self._frac_digits}d}' + '0' * (9 - self._frac_digits)
+        row[2] = str(wirelen)
+        data = record[PCAP_RECORD_HEADER_LEN:]
+        protocols = []
+
+        if self.linktype == DLT_EN10MB:
+            if len(data) < 14:
+                row[1] = 'eth'
+                return row
+            row[4] = _mac(data[0:6])
+            row[3] = _mac(data[6:12])
+            protocols.append('eth')
+            ethertype = _U16.unpack_from(data, 12)[0]
+            l3 = 14
+            protocols.append('ethertype')
+            while ethertype in _VLAN_TYPES and len(data) >= l3 + 4:
+                protocols += ['vlan', 'ethertype']
+                ethertype = _U16.unpack_from(data, l3 + 2)[0]
+                l3 += 4
+        elif self.linktype == DLT_RAW:
+            l3 = 0
+            protocols.append('raw')
+            ethertype = _ETH_P_IP if data and data[0] >> 4 == 4 else _ETH_P_IPV6
+        else:
+            row[1] = 'unknown'
+            return row
+
+        if ethertype == _ETH_P_ARP:
+            protocols.append('arp')
+        elif ethertype == _ETH_P_IP and len(data) >= l3 + 20:
+            self._ipv4(data, l3, row, protocols)
+        elif ethertype == _ETH_P_IPV6 and len(data) >= l3 + 40:
+            self._ipv6(data, l3, row, protocols)
+        row[1] = ':'.join(protocols)
+        return row
+
+    def _ipv4(self, data, l3, row, protocols):
+        protocols.append('ip')
+        ihl = (data[l3] & 0x0f) * 4
+        total_len = _U16.unpack_from(data, l3 + 2)[0]
+        row[_COL['ip.src']] = _ipv4(data[l3 + 12:l3 + 16])
+        row[_COL['ip.dst']] = _ipv4(data[l3 + 16:l3 + 20])
+        row[_COL['ip.len']] = str(total_len)
+        row[_COL['ip.ttl']] = str(data[l3 + 8])
+        if _U16.unpack_from(data, l3 + 6)[0] & 0x1fff:
+            protocols.append('data')  # 非首个分片
+            return
+        # total_len 小于首部长度时（如 TSO 抓包中为 0）以捕获的字节为准
+        declared_end = l3 + total_len if total_len >= ihl else len(data)
+        self._transport(data, data[l3 + 9], l3 + ihl, min(len(data), declared_end), declared_end,
+                        data[l3 + 12:l3 + 16], data[l3 + 16:l3 + 20], row, protocols)
+
+    def _ipv6(self, data, l3, row, protocols):
+        protocols.append('ipv6')
+        payload_len = _U16.unpack_from(data, l3 + 4)[0]
+        declared_end = l3 + 40 + payload_len
+        self._transport(data, data[l3 + 6], l3 + 40, min(len(data), declared_end), declared_end,
+                        data[l3 + 8:l3 + 24], data[l3 + 24:l3 + 40], row, protocols)
+
+    def _transport(self, data, proto, l4, end, declared_end, src, dst, row, protocols):
+        # end 为捕获到的字节的结尾，只用于截取首部和负载；declared_end 为 IP 首部中声明的结尾，
+        # tcp.len 按声明的长度计算，与 tshark 相同（snaplen 截断的数据包也不例外）
+        if proto == IPPROTO_TCP and end >= l4 + 20:
+            protocols.append('tcp')
+            sport, dport, _, _, offset_byte, flags, window = _TCP_HEAD.unpack_from(data, l4)
+            header_len = (offset_byte >> 4) * 4
+            payload = data[l4 + header_len:end] if l4 + header_len <= end else b''
+            row[_COL['tcp.srcport']] = str(sport)
+            row[_COL['tcp.dstport']] = str(dport)
+            row[_COL['tcp.len']] = str(max(0, declared_end - l4 - header_len))
+            row[_COL['tcp.flags']] = f'0x{((offset_byte & 0x01) << 8) | flags:04x}'
+            row[_COL['tcp.window_size']] = str(self._scaled_window(data, l4, header_len, end, flags, window,
+                                                                   (src, sport, dst, dport)))
+            if payload:
+                row[_COL['tcp.payload']] = payload.hex()
+                self._tls(payload, sport, dport, row, protocols)
+        elif proto == IPPROTO_UDP and end >= l4 + 8:
+            protocols.append('udp')
+            sport, dport, length = _UDP_HEAD.unpack_from(data, l4)
+            row[_COL['udp.srcport']] = str(sport)
+            row[_COL['udp.dstport']] = str(dport)
+            row[_COL['udp.length']] = str(length)
+            payload_end = min(end, l4 + length) if length >= 8 else end
+            payload = data[l4 + 8:payload_end]
+            app = _UDP_APPS.get(sport) or _UDP_APPS.get(dport)
+            if app:
+                protocols.append(app)
+            elif payload:
+                protocols.append('data')
+            if payload:
+                row[_COL['udp.payload']] = payload.hex()
+
+    def _scaled_window(self, data, l4, header_len, end, flags, window, endpoints):
+        """与 tshark 一样，握手双方都带了窗口扩大选项时，非 SYN 包的窗口按扩大因子放大。"""
+        src, sport, dst, dport = endpoints
+        if flags & 0x02:  # SYN
+            shift = _tcp_window_shift(data[l4 + 20:min(end, l4 + header_len)])
+            self._syn_shift[endpoints] = shift
+            return window
+        own = self._syn_shift.get(endpoints)
+        peer = self._syn_shift.get((dst, dport, src, sport))
+        if own is not None and peer is not None:
+            return window << own
+        return window
+
+    def _tls(self, payload, sport, dport, row, protocols):
+        if len(payload) >= 5 and payload[0] in _TLS_CONTENT_TYPES and payload[1] == 3 and payload[2] <= 4:
+            protocols.append('tls')
+            row[_COL['tls.record.content_type']] = str(payload[0])
+        elif sport in TLS_PORTS or dport in TLS_PORTS:
+            protocols.append('tls')
+
+
+def extract_rows(pcap_reader, records=None):
+    """按 FIELDS 的顺序逐行返回 pcap_reader 中（或 records 给出的）记录的字段。"""
+    extractor = PacketFieldExtractor(pcap_reader.pcap_header, pcap_reader.linktype)
+    for _, _, record in (pcap_reader if records is None else records):
+        yield extractor.extract(record)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+按字节范围把一个大的经典 pcap 文件切成若干块，供多个进程并行解析。
+经典 pcap 的记录之间没有同步标记，块的起点需要在切分位置之后找到真正的记录边界：
+从切分位置起逐字节尝试，把某个位置当作记录头，检查其字段是否合理，并沿记录长度连续跳过若干条记录都合理时，才认为找到了边界。
+
+记录头合理的条件：
+    时间戳小数部分小于 1e6（纳秒精度为 1e9）；
+    0 < caplen <= snaplen，caplen <= 原始长度 <= _MAX_PACKET_LEN；
+    秒数与文件第一条记录相差在 _MAX_SPAN_SECONDS 以内。
+
+1. chunk_ranges
+    返回 [(start, stop)]，start 为记录边界，块内的记录偏移满足 start <= offset < stop。
+    pcapng 或文件较小时只返回一个块。
+2. find_record_boundary
+    从指定位置开始查找第一个记录边界。
+"""
+
+import os
+import struct
+
+from tool.pcap_io import PcapRecordReader, PCAP_RECORD_HEADER_LEN
+
+MIN_CHUNK_SIZE = 64 * 1024 * 1024  # 每块至少 64MB，小文件不值得切分
+_CHAIN = 16  # 连续合理的记录数
+_SCAN_LIMIT = 4 * 1024 * 1024  # 从切分位置开始最多尝试的字节数
+_MAX_PACKET_LEN = 0x40000
+_MAX_SPAN_SECONDS = 400 * 86400
+
+
+class _HeaderCheck:
+    """记录头合理性检查所需的文件参数。"""
+
+    def __init__(self, pcap_reader, first_sec):
+        self.rec_header = struct.Struct(pcap_reader.endian + 'IIII')
+        self.frac_limit = 1000000000 if pcap_reader.nano else 1000000
+        self.snaplen = pcap_reader.snaplen or _MAX_PACKET_LEN
+        self.sec_low = first_sec - 86400
+        self.sec_high = first_sec + _MAX_SPAN_SECONDS
+
+    def record_end(self, buf, pos):
+        """pos 处的记录头合理时返回记录结束位置，否则返回 -1。"""
+        sec, frac, caplen, wirelen = self.rec_header.unpack_from(buf, pos)
+        if frac >= self.frac_limit or caplen == 0 or caplen > self.snaplen:
+            return -1
+        if caplen > wirelen or wirelen > _MAX_PACKET_LEN:
+            return -1
+        if sec < self.sec_low or sec > self.sec_high:
+            return -1
+        return pos + PCAP_RECORD_HEADER_LEN + caplen
+
+
+def find_record_boundary(f, start, file_size, check):
+    """
+    从文件偏移 start 开始查找第一个记录边界，找不到时返回 None。
+    候选位置之后连续 _CHAIN 条记录都合理，或者合理的记录恰好连到文件末尾，才算作边界。
+    """
+    f.seek(start)
+    buf = f.read(_SCAN_LIMIT + _CHAIN * (PCAP_RECORD_HEADER_LEN + _MAX_PACKET_LEN))
+    at_eof = start + len(buf) >= file_size
+    for candidate in range(min(_SCAN_LIMIT, len(buf))):
+        pos = candidate
+        hops = 0
+        while hops < _CHAIN and pos + PCAP_RECORD_HEADER_LEN <= len(buf):
+            end = check.record_end(buf, pos)
+            if end < 0:
+                break
+            pos = end
+            hops += 1
+        else:
+            if hops == _CHAIN or (at_eof and pos == len(buf)):
+                return start + candidate
+    return None
+
+
+def chunk_ranges(path, n_chunks, min_chunk_size=MIN_CHUNK_SIZE):
+    """把 pcap 文件切成最多 n_chunks 块，返回 [(start, stop)]，stop 为下一块的起点或文件大小。"""
+    file_size = os.path.getsize(path)
+    with PcapRecordReader(path) as pcap_reader:
+        data_offset = pcap_reader.data_offset
+        if pcap_reader.format != 'pcap':
+            return [(data_offset, file_size)]
+        n_chunks = max(1, min(n_chunks, (file_size - data_offset) // max(1, min_chunk_size)))
+        if n_chunks == 1:
+            return [(data_offset, file_size)]
+        first = next(iter(pcap_reader), None)
+        if first is None:
+            return [(data_offset, file_size)]
+        check = _HeaderCheck(pcap_reader, int(first[0]))
+
+    starts = [data_offset]
+    step = (file_size - data_offset) // n_chunks
+    with open(path, 'rb') as f:
+        for i in range(1, n_chunks):
+            boundary = find_record_boundary(f, data_offset + i * step, file_size, check)
+            # 找不到边界时并入前一块
+            if boundary is not None and boundary > starts[-1]:
+                starts.append(boundary)
+    return list(zip(starts, starts[1:] + [file_size]))
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+pcap 文件的时间/偏移索引（sidecar 文件）。
+1.1 需要文件的首末时间和每个会话的首末时间，1.3 先读一遍时间戳做周期检测、再读一遍按周期拆分，
+这些都只需要记录头里的时间戳和记录位置。这里对每个 pcap 只扫描一遍，把结果保存在 pcap 旁边
+（指定 index_dir 时保存在该目录中，如 1.1 把原始输入数据集的索引放在 outputs 下，不写入输入目录），
+之后各阶段用 mmap 加载，不再解析数据包。
+
+索引文件：
+    <pcap>.idx.npy    每条记录一行，INDEX_DTYPE = (ts 时间戳, ts_ns 整数纳秒时间戳, offset 记录偏移, length 记录长度, flow 会话编号)
+    <pcap>.flows.npy  每个会话一行，FLOW_DTYPE = (ip_a, port_a, ip_b, port_b, proto)，行号即会话编号
+    <pcap>.idx.json   索引格式版本，以及建立索引时 pcap 文件的大小和修改时间，三者都与当前相同时索引才有效
+                      （copy2、rsync -a 会保留修改时间，只比较修改时间无法发现被替换的文件）
+其中：
+- ts 为浮点秒，在纳秒精度下有约 1e-7 秒的舍入误差；需要精确比较时间时使用由记录头整数计算的 ts_ns；
+- offset 为 PcapRecordReader 返回的偏移，经典 pcap 中 file[offset:offset + length] 就是该条记录的原始字节，
+  周期段等连续的多条记录可以按字节范围整段复制；pcapng 中为块的偏移，length 为转换成经典格式后的记录长度；
+- flow 为 tool.flow_key 双向流的编号，不属于 IPv4 TCP/UDP 会话的数据包为 -1。
+
+1. build_index / load_index
+    建立并保存索引；load_index 在索引不存在或与 pcap 的大小、修改时间不一致时重新建立。
+    workers 大于 1 时按 tool.pcap_chunks 切分的字节范围在多个进程中并行扫描，
+    各块的会话按首次出现的顺序合并编号，结果与单进程扫描相同。
+    每块最后一条记录必须恰好连到下一块的起点，否则（切分位置落在负载中的假边界上）改为单进程扫描。
+2. 查询
+    index_duration 文件时长，index_flow_keys 会话编号对应的双向流键。
+3. remove_index / move_index
+    删除或移动 pcap 时同步处理索引文件，索引保存在 index_dir 中时需传入相同的 index_dir。
+"""
+
+import os
+import json
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from tool.pcap_io import PcapRecordReader
+from tool.flow_key import packet_flow_key, unpack_flow_key
+from tool.pcap_chunks import chunk_ranges
+
+INDEX_SUFFIX = '.idx.npy'
+FLOWS_SUFFIX = '.flows.npy'
+META_SUFFIX = '.idx.json'
+INDEX_VERSION = 2  # 索引格式变化时加 1，旧的索引文件会被重新建立
+INDEX_DTYPE = np.dtype([('ts', '<f8'), ('ts_ns', '<i8'), ('offset', '<i8'), ('length', '<i4'), ('flow', '<i4')])
+FLOW_DTYPE = np.dtype([('ip_a', '<u4'), ('port_a', '<u2'), ('ip_b', '<u4'), ('port_b', '<u2'), ('proto', 'u1')])
+
+
+def index_paths(pcap_path, index_dir=None):
+    """返回 (索引, 会话, 元数据) 文件的路径，index_dir 为空时放在 pcap 旁边。"""
+    base = os.path.join(index_dir, os.path.basename(pcap_path)) if index_dir else pcap_path
+    return base + INDEX_SUFFIX, base + FLOWS_SUFFIX, base + META_SUFFIX
+
+
+def _pcap_signature(pcap_path):
+    stat = os.stat(pcap_path)
+    return {'version': INDEX_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def index_is_fresh(pcap_path, index_dir=None):
+    """索引文件都存在，且记录的格式版本、pcap 大小和修改时间与当前相同。"""
+    index_path, flows_path, meta_path = index_paths(pcap_path, index_dir)
+    if not (os.path.exists(index_path) and os.path.exists(flows_path) and os.path.exists(meta_path)):
+        return False
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f) == _pcap_signature(pcap_path)
+    except ValueError:
+        return False
+
+
+def _save_array(path, arr):
+    # 先写临时文件再替换，多个进程同时建立同一个索引时也不会读到不完整的文件
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, arr)
+    os.replace(tmp_path, path)
+
+
+def _scan_chunk(pcap_path, start=None, stop=None):
+    """
+    扫描文件偏移在 [start, stop) 内的记录，返回 (ts, ts_ns, offset, length, flow, keys, end)。
+    flow 为块内的会话编号，keys[i] 为块内编号 i 的双向流键，end 为块内最后一条记录的结束偏移（没有记录时为 start）。
+    """
+    ts_col, ts_ns_col, offset_col, length_col, flow_col = array('d'), array('q'), array('q'), array('i'), array('i')
+    flow_ids = {}
+    end = start
+    with PcapRecordReader(pcap_path) as pcap_reader:
+        linktype = pcap_reader.linktype
+        for packet_time, offset, record in pcap_reader.records(start, None if stop is None else stop - 1):
+            key = packet_flow_key(record, linktype)
+            if key is None:
+                flow_id = -1
+            else:
+                flow_id = flow_ids.get(key)
+                if flow_id is None:
+                    flow_id = flow_ids[key] = len(flow_ids)
+            ts_col.append(packet_time)
+            ts_ns_col.append(pcap_reader.record_time_ns(record))
+            offset_col.append(offset)
+            length_col.append(len(record))
+            flow_col.append(flow_id)
+            end = offset + len(record)  # 记录包含 16 字节的记录头
+    return ts_col, ts_ns_col, offset_col, length_col, flow_col, list(flow_ids), end
+
+
+def build_index(pcap_path, save=True, workers=1, index_dir=None):
+    """扫描 pcap 文件建立索引，返回 (index, flows)；save=True 时保存为 sidecar 文件（index_dir 不为空时保存在该目录中）。"""
+    signature = _pcap_signature(pcap_path)  # 扫描前记录，扫描期间文件被改动时索引不会被当作有效
+    ranges = chunk_ranges(pcap_path, workers) if workers > 1 else [(None, None)]
+    if len(ranges) == 1:
+        parts = [_scan_chunk(pcap_path)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            parts = list(executor.map(_scan_chunk, [pcap_path] * len(ranges),
+                                      [start for start, _ in ranges], [stop for _, stop in ranges]))
+        # 每块最后一条记录必须恰好结束在下一块的起点。数据包负载中含有 pcap 记录时，
+        # 切分位置可能落在负载内的假边界上，此时各块无法衔接，改为单进程扫描整个文件
+        if any(part[-1] != next_start for part, (next_start, _) in zip(parts, ranges[1:])):
+            print(f"Chunk boundaries of {pcap_path} do not line up, rescanning in a single pass")
+            parts = [_scan_chunk(pcap_path)]
+
+    index = np.empty(sum(len(part[0]) for part in parts), dtype=INDEX_DTYPE)
+    flow_ids = {}
+    row = 0
+    for ts_col, ts_ns_col, offset_col, length_col, flow_col, keys, _ in parts:
+        rows = slice(row, row + len(ts_col))
+        index['ts'][rows] = np.frombuffer(ts_col, dtype=np.float64)
+        index['ts_ns'][rows] = np.frombuffer(ts_ns_col, dtype=np.int64)
+        index['offset'][rows] = np.frombuffer(offset_col, dtype=np.int64)
+        index['length'][rows] = np.frombuffer(length_col, dtype=np.int32)
+        # 块内编号映射到全局编号，末尾的 -1 对应块内编号 -1
+        mapping = np.array([flow_ids.setdefault(key, len(flow_ids)) for key in keys] + [-1], dtype=np.int32)
+        index['flow'][rows] = mapping[np.frombuffer(flow_col, dtype=np.int32)]
+        row = rows.stop
+
+    flows = np.empty(len(flow_ids), dtype=FLOW_DTYPE)
+    for key, flow_id in flow_ids.items():
+        ip_a, port_a, ip_b, port_b, proto = unpack_flow_key(key)
+        flows[flow_id] = (ip_a, port_a, ip_b, port_b, proto)
+
+    if save:
+        index_path, flows_path, meta_path = index_paths(pcap_path, index_dir)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        _save_array(index_path, index)
+        _save_array(flows_path, flows)
+        # 元数据最后写入，只有数组都已写好时索引才会被认为有效
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(signature, f)
+        os.replace(tmp_path, meta_path)
+    return index, flows
+
+
+def load_index(pcap_path, mmap=True, workers=1, index_dir=None):
+    """
+    加载 pcap 的索引，索引不存在或已过期时先（用 workers 个进程）重新建立。mmap=True 时以只读内存映射方式加载。
+    index_dir 不为空时索引文件保存在该目录中，而不是 pcap 旁边。
+    """
+    if not index_is_fresh(pcap_path, index_dir):
+        build_index(pcap_path, workers=workers, index_dir=index_dir)
+    index_path, flows_path, _ = index_paths(pcap_path, index_dir)
+    mmap_mode = 'r' if mmap else None
+    return np.load(index_path, mmap_mode=mmap_mode), np.load(flows_path, mmap_mode=mmap_mode)
+
+
+def index_duration(index):
+    """文件时长：最后一条记录与第一条记录的时间差（按文件顺序，与逐包读取时的计算一致）。"""
+    if len(index) == 0:
+        return 0.0
+    return float(index['ts'][-1] - index['ts'][0])
+
+
+def index_flow_keys(flows):
+    """会话编号对应的双向流键（与 tool.flow_key.flow_key 相同的整数）。"""
+    return [(int(ip_a) << 72) | (int(ip_b) << 40) | (int(port_a) << 24) | (int(port_b) << 8) | int(proto)
+            for ip_a, port_a, ip_b, port_b, proto in flows.tolist()]
+
+
+def remove_index(pcap_path, index_dir=None):
+    for path in index_paths(pcap_path, index_dir):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def move_index(src_pcap_path, dst_pcap_path, index_dir=None):
+    """pcap 文件改名后同步移动索引，改名不改变大小和修改时间，索引仍然有效。"""
+    for src, dst in zip(index_paths(src_pcap_path, index_dir), index_paths(dst_pcap_path, index_dir)):
+        if os.path.exists(src):
+            os.replace(src, dst)
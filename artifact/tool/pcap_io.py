@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+
+"""
+轻量级 pcap 读写层，用于替代 scapy 的逐包解析。
+各阶段只需要时间戳、MAC、IP、端口和协议号，scapy 为每个数据包构建完整的对象并多次调用 haslayer，速度只有每秒一两万包。
+这里只读取记录头，并按固定偏移从原始字节中解码 Ethernet/IPv4/TCP/UDP 头部，写出时直接写入原始记录字节。
+
+1. 读取
+    PcapRecordReader 支持经典 pcap（微秒/纳秒精度，大小端）和 pcapng（EPB/PB 块）。
+    逐条返回 (时间戳, 记录在文件中的偏移, 记录字节)，记录字节统一为经典 pcap 格式：16 字节记录头 + 数据包内容。
+    经典 pcap 的记录字节即文件中的原始字节；pcapng 的记录会转换为经典格式。
+    需要精确时间时用 record_time_ns 从记录头取整数纳秒时间戳。
+2. 解码
+    packet_macs / packet_five_tuple 只在需要时按偏移解码头部字段，IP 以整数返回。
+3. 写出
+    PcapRecordWriter 写入 pcap 文件头后直接追加记录字节，不做任何重新编码。
+    PcapWriterPool 用于同时写出大量文件，按文件缓存记录并限制总缓存大小。
+    输出路径可能是后续阶段发布的硬链接（见 tool.publish），两者都不会原地改写已有文件：
+    覆盖写时先删除原路径，追加写时若文件还有其他硬链接，先复制一份替换原路径。
+"""
+
+import os
+import shutil
+import socket
+import struct
+
+# 链路层类型
+DLT_EN10MB = 1  # Ethernet
+DLT_RAW = 101  # 原始 IP
+DLT_LINUX_SLL = 113  # Linux cooked capture
+
+PCAP_RECORD_HEADER_LEN = 16
+
+_PCAP_MAGIC_USEC = 0xa1b2c3d4
+_PCAP_MAGIC_NSEC = 0xa1b23c4d
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_PCAPNG_IDB = 1
+_PCAPNG_PB = 2
+_PCAPNG_EPB = 6
+
+_READ_CHUNK = 4 * 1024 * 1024
+
+# 以太网类型
+_ETH_P_IP = 0x0800
+_ETH_P_8021Q = 0x8100
+_ETH_P_8021AD = 0x88a8
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+_U16 = struct.Struct('!H')
+_IPV4_ADDRS = struct.Struct('!II')
+_PORTS = struct.Struct('!HH')
+
+
+class PcapRecordReader:
+    """
+    逐条读取 pcap/pcapng 文件中的数据包记录，不解析数据包内容。
+    迭代返回 (ts, offset, record)：
+        ts：浮点时间戳（秒）；
+        offset：该记录（pcapng 为块）在文件中的起始偏移；
+        record：经典 pcap 格式的记录字节，数据包内容从 record[16:] 开始。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, 'rb')
+        magic = self._f.read(4)
+        if len(magic) < 4:
+            self._f.close()
+            raise ValueError(f"{path} 不是有效的 pcap 文件")
+        if struct.unpack('<I', magic)[0] == _PCAPNG_SHB:
+            self.format = 'pcapng'
+            self._open_pcapng()
+        else:
+            self.format = 'pcap'
+            self._open_pcap(magic)
+
+    # ---------------- 经典 pcap ----------------
+
+    def _open_pcap(self, magic):
+        for endian in ('<', '>'):
+            value = struct.unpack(endian + 'I', magic)[0]
+            if value in (_PCAP_MAGIC_USEC, _PCAP_MAGIC_NSEC):
+                break
+        else:
+            self._f.close()
+            raise ValueError(f"{self.path} 不是有效的 pcap 文件")
+        rest = self._f.read(20)
+        if len(rest) < 20:
+            self._f.close()
+            raise ValueError(f"{self.path} 的 pcap 文件头不完整")
+        self.endian = endian
+        self.nano = value == _PCAP_MAGIC_NSEC
+        self._time_header = struct.Struct(endian + 'II')
+        _, _, _, _, self.snaplen, self.linktype = struct.unpack(endian + 'HHiIII', rest)
+        self.linktype &= 0xffff
+        # 经典 pcap 的记录原样写出，因此输出文件必须沿用原始文件头（字节序、精度）
+        self.pcap_header = magic + rest
+        self.data_offset = 24
+
+    def _iter_pcap(self, start, stop):
+        rec_header = struct.Struct(self.endian + 'IIII')
+        scale = 1e-9 if self.nano else 1e-6
+        f = self._f
+        f.seek(start)
+        buf = b''
+        pos = 0
+        base = start  # buf[0] 在文件中的偏移
+        while stop is None or base + pos <= stop:
+            if len(buf) - pos < PCAP_RECORD_HEADER_LEN:
+                chunk = f.read(_READ_CHUNK)
+                if not chunk:
+                    return
+                base += pos
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            sec, frac, caplen, _ = rec_header.unpack_from(buf, pos)
+            end = pos + PCAP_RECORD_HEADER_LEN + caplen
+            if end > len(buf):
+                chunk = f.read(max(_READ_CHUNK, end - len(buf)))
+                if not chunk:
+                    return  # 文件末尾的记录被截断，丢弃
+                base += pos
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield sec + frac * scale, base + pos, buf[pos:end]
+            pos = end
+
+    # ---------------- pcapng ----------------
+
+    def _open_pcapng(self):
+        head = self._f.read(8)
+        if len(head) < 8:
+            self._f.close()
+            raise ValueError(f"{self.path} 的 pcapng 文件头不完整")
+        if struct.unpack('<I', head[4:8])[0] == _PCAPNG_BYTE_ORDER_MAGIC:
+            self.endian = '<'
+        elif struct.unpack('>I', head[4:8])[0] == _PCAPNG_BYTE_ORDER_MAGIC:
+            self.endian = '>'
+        else:
+            self._f.close()
+            raise ValueError(f"{self.path} 的 pcapng 字节序标识无效")
+        self._interfaces = []  # [(linktype, 每秒的时间戳单位数)]
+        self._snaplen = 0
+        self.data_offset = 0
+
+        # 读取首个数据包块之前的所有接口描述块，确定链路层类型和时间精度
+        f = self._f
+        f.seek(0)
+        while True:
+            offset = f.tell()
+            block_head = f.read(8)
+            if len(block_head) < 8:
+                break
+            block_type, block_len = struct.unpack(self.endian + 'II', block_head)
+            if block_type in (_PCAPNG_EPB, _PCAPNG_PB) or block_len < 12:
+                f.seek(offset)
+                break
+            body = f.read(block_len - 8)
+            if block_type == _PCAPNG_IDB:
+                self._interfaces.append(self._parse_idb(body))
+        self.data_offset = f.tell()
+
+        if self._interfaces:
+            self.linktype, _ = self._interfaces[0]
+        else:
+            self.linktype = DLT_EN10MB
+        self.snaplen = self._snaplen or 65535
+        self.nano = any(units > 1000000 for _, units in self._interfaces)
+        magic = _PCAP_MAGIC_NSEC if self.nano else _PCAP_MAGIC_USEC
+        self.pcap_header = struct.pack('<IHHiIII', magic, 2, 4, 0, 0, self.snaplen, self.linktype)
+        self._out_header = struct.Struct('<IIII')
+        self._time_header = struct.Struct('<II')
+
+    def _parse_idb(self, body):
+        linktype, _, snaplen = struct.unpack_from(self.endian + 'HHI', body, 0)
+        self._snaplen = max(self._snaplen, snaplen)
+        units = 1000000
+        pos = 8
+        # 选项区：解析 if_tsresol（代码 9），最后 4 字节为块长度
+        while pos + 4 <= len(body) - 4:
+            code, length = struct.unpack_from(self.endian + 'HH', body, pos)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                resol = body[pos + 4]
+                units = 2 ** (resol & 0x7f) if resol & 0x80 else 10 ** resol
+            pos += 4 + ((length + 3) & ~3)
+        return linktype, units
+
+    def _iter_pcapng(self, start, stop):
+        endian = self.endian
+        block_head = struct.Struct(endian + 'II')
+        epb_head = struct.Struct(endian + 'IIIII')
+        pb_head = struct.Struct(endian + 'HHIIII')
+        out_header = self._out_header
+        out_units = 1000000000 if self.nano else 1000000
+        f = self._f
+        f.seek(start)
+        buf = b''
+        pos = 0
+        base = start
+        while stop is None or base + pos <= stop:
+            if len(buf) - pos < 8:
+                chunk = f.read(_READ_CHUNK)
+                if not chunk:
+                    return
+                base += pos
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            block_type, block_len = block_head.unpack_from(buf, pos)
+            if block_len < 12:
+                return  # 块长度非法，停止读取
+            end = pos + block_len
+            if end > len(buf):
+                chunk = f.read(max(_READ_CHUNK, end - len(buf)))
+                if not chunk:
+                    return
+                base += pos
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+
+            if block_type == _PCAPNG_EPB:
+                if_id, ts_high, ts_low, caplen, wirelen = epb_head.unpack_from(buf, pos + 8)
+                data_start = pos + 28
+            elif block_type == _PCAPNG_PB:
+                if_id, _, ts_high, ts_low, caplen, wirelen = pb_head.unpack_from(buf, pos + 8)
+                data_start = pos + 28
+            else:
+                if block_type == _PCAPNG_IDB:
+                    self._interfaces.append(self._parse_idb(buf[pos + 8:end]))
+                pos = end
+                continue
+
+            units = self._interfaces[if_id][1] if if_id < len(self._interfaces) else 1000000
+            ts_raw = (ts_high << 32) | ts_low
+            sec, frac = divmod(ts_raw, units)
+            if units != out_units:
+                frac = frac * out_units // units
+            record = out_header.pack(sec, frac, caplen, wirelen) + buf[data_start:data_start + caplen]
+            yield sec + frac / out_units, base + pos, record
+            pos = end
+
+    # ---------------- 公共接口 ----------------
+
+    def records(self, start=None, stop=None):
+        """
+        从文件偏移 start 开始读取记录，读到偏移超过 stop 的记录为止（均包含端点）。
+        start 必须是之前读取时返回的某条记录的偏移；默认从第一条记录读到文件末尾。
+        """
+        if start is None:
+            start = self.data_offset
+        if self.format == 'pcapng':
+            return self._iter_pcapng(start, stop)
+        return self._iter_pcap(start, stop)
+
+    def __iter__(self):
+        return self.records()
+
+    def record_time_ns(self, record):
+        """记录头中的时间戳换算为整数纳秒，不经过浮点运算（浮点时间戳在纳秒精度下有舍入误差）。"""
+        sec, frac = self._time_header.unpack_from(record, 0)
+        return sec * 1000000000 + (frac if self.nano else frac * 1000)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _detach_output(path, keep):
+    """
+    让 path 不再与其他目录中的文件共用同一个 inode，避免写入时改动已经发布的硬链接。
+    keep=False（覆盖写）时直接删除原文件；keep=True（追加写）且文件有其他硬链接时，复制一份再替换原路径。
+    """
+    if not os.path.lexists(path):
+        return
+    if not keep:
+        os.remove(path)
+    elif os.stat(path).st_nlink > 1:
+        tmp_path = path + '.tmp'
+        shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, path)
+
+
+class PcapRecordWriter:
+    """
+    将 PcapRecordReader 返回的记录字节直接写入经典 pcap 文件。
+    header 使用读取端的 reader.pcap_header，保证记录头的字节序和时间精度与文件头一致。
+    append=True 时若文件已存在则直接在末尾追加记录，与 scapy PcapWriter(append=True) 的行为一致。
+    """
+
+    def __init__(self, path, header, append=False, buffer_size=1024 * 1024):
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        _detach_output(path, keep=append)
+        self.path = path
+        self._f = open(path, 'ab' if append else 'wb', buffering=buffer_size)
+        if not exists:
+            self._f.write(header)
+
+    def write(self, record):
+        self._f.write(record)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PcapWriterPool:
+    """
+    同时向大量 pcap 文件写入记录时使用的缓冲写出器。
+    每个输出文件的记录先缓存在内存中，单个文件缓存超过 buffer_size 或全部缓存超过 total_buffer_size 时批量追加到文件，
+    写完立即关闭，因此内存占用有上限，打开的文件句柄数也与输出文件数无关。
+    只有真正写入过记录的路径才会生成文件。
+    """
+
+    def __init__(self, header, buffer_size=1024 * 1024, total_buffer_size=64 * 1024 * 1024):
+        self.header = header
+        self.buffer_size = buffer_size
+        self.total_buffer_size = total_buffer_size
+        self.counts = {}  # 每个输出文件写入的记录数
+        self._buffers = {}
+        self._sizes = {}
+        self._created = set()
+        self._total = 0
+
+    def write(self, path, record):
+        records = self._buffers.get(path)
+        if records is None:
+            records = self._buffers[path] = []
+            self._sizes[path] = 0
+            self.counts[path] = 0
+        records.append(record)
+        self.counts[path] += 1
+        self._sizes[path] += len(record)
+        self._total += len(record)
+        if self._sizes[path] >= self.buffer_size:
+            self._flush(path)
+        elif self._total >= self.total_buffer_size:
+            self.flush()
+
+    def _flush(self, path):
+        records = self._buffers[path]
+        if not records:
+            return
+        created = path in self._created
+        if not created:
+            _detach_output(path, keep=False)
+        with open(path, 'ab' if created else 'wb') as f:
+            if not created:
+                f.write(self.header)
+                self._created.add(path)
+            f.write(b''.join(records))
+        self._total -= self._sizes[path]
+        self._sizes[path] = 0
+        records.clear()
+
+    def flush(self):
+        for path in self._buffers:
+            self._flush(path)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def ipv4_offset(record, linktype):
+    """返回 IPv4 头在记录中的偏移，非 IPv4 数据包返回 -1。"""
+    if linktype == DLT_EN10MB:
+        pos = PCAP_RECORD_HEADER_LEN + 12
+        if len(record) < pos + 2:
+            return -1
+        ethertype = _U16.unpack_from(record, pos)[0]
+        # 跳过 VLAN 标签
+        while ethertype in (_ETH_P_8021Q, _ETH_P_8021AD) and len(record) >= pos + 6:
+            pos += 4
+            ethertype = _U16.unpack_from(record, pos)[0]
+        return pos + 2 if ethertype == _ETH_P_IP else -1
+    if linktype == DLT_RAW:
+        return PCAP_RECORD_HEADER_LEN
+    if linktype == DLT_LINUX_SLL:
+        pos = PCAP_RECORD_HEADER_LEN + 14
+        if len(record) < pos + 2 or _U16.unpack_from(record, pos)[0] != _ETH_P_IP:
+            return -1
+        return pos + 2
+    return -1
+
+
+def packet_macs(record, linktype=DLT_EN10MB):
+    """返回以太网数据包的 (src_mac, dst_mac)，均为 6 字节 bytes；非以太网数据包返回 None。"""
+    if linktype != DLT_EN10MB or len(record) < PCAP_RECORD_HEADER_LEN + 14:
+        return None
+    return record[22:28], record[16:22]
+
+
+def packet_five_tuple(record, linktype=DLT_EN10MB):
+    """
+    解码 IPv4 TCP/UDP 数据包的五元组，返回 (src_ip, dst_ip, proto, sport, dport)，IP 为 32 位整数。
+    其他数据包（非 IPv4、非 TCP/UDP、非首个分片、头部被截断）返回 None，与 scapy 的 haslayer 判断一致。
+    """
+    l3 = ipv4_offset(record, linktype)
+    if l3 < 0 or len(record) < l3 + 20:
+        return None
+    ver_ihl = record[l3]
+    if ver_ihl >> 4 != 4:
+        return None
+    proto = record[l3 + 9]
+    if proto != IPPROTO_TCP and proto != IPPROTO_UDP:
+        return None
+    if _U16.unpack_from(record, l3 + 6)[0] & 0x1fff:
+        return None  # 非首个分片不包含传输层头部
+    l4 = l3 + (ver_ihl & 0x0f) * 4
+    if len(record) < l4 + 4:
+        return None
+    src_ip, dst_ip = _IPV4_ADDRS.unpack_from(record, l3 + 12)
+    sport, dport = _PORTS.unpack_from(record, l4)
+    return src_ip, dst_ip, proto, sport, dport
+
+
+def ip_to_str(ip):
+    """32 位整数 IP 转为点分十进制字符串。"""
+    return socket.inet_ntoa(ip.to_bytes(4, 'big'))
+
+
+def mac_to_bytes(mac):
+    """'aa:bb:cc:dd:ee:ff' 形式的 MAC 地址转为 6 字节 bytes，大小写不敏感。"""
+    return bytes.fromhex(mac.strip().replace(':', '').replace('-', ''))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""
+选择类阶段（1.2 选出一天、2.1 筛掉样本不足的会话）的输出发布。
+这些阶段只是从上一阶段的目录中挑出一部分，不需要真的复制几 GB 的 pcap：优先在目标位置创建硬链接，
+跨文件系统或不支持硬链接时再退回复制。
+硬链接与源文件共用同一个 inode，因此任何阶段都不能原地改写可能被发布过的文件：
+重新运行上游阶段时，写出 pcap（tool.pcap_io）和表格（tool.table_io）都先删除原路径或写临时文件再替换，
+已经发布的文件保持不变。
+
+1. link_or_copy
+    发布单个文件，目标已存在时先删除。
+2. publish_tree
+    按目录结构发布整个目录树，可以通过 skip_dirs 跳过已经被筛掉的目录，先筛选、再发布。
+"""
+
+import os
+import shutil
+
+
+def link_or_copy(src, dst):
+    """在 dst 创建 src 的硬链接，失败时复制。返回 'link' 或 'copy'。"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return 'link'
+    except OSError:
+        shutil.copy2(src, dst)
+        return 'copy'
+
+
+def publish_tree(src_folder, dst_folder, skip_dirs=(), verbose=True):
+    """
+    将 src_folder 下的文件按原目录结构发布到 dst_folder，skip_dirs 中的目录（及其子目录）不发布。
+    返回 (硬链接的文件数, 复制的文件数)。
+    """
+    skip_dirs = {os.path.normpath(d) for d in skip_dirs}
+    linked = copied = 0
+    for root, dirs, files in os.walk(src_folder):
+        if os.path.normpath(root) in skip_dirs:
+            dirs[:] = []
+            continue
+        dst_path = os.path.join(dst_folder, os.path.relpath(root, src_folder))
+        os.makedirs(dst_path, exist_ok=True)
+        for file in files:
+            src_file = os.path.join(root, file)
+            dst_file = os.path.join(dst_path, file)
+            if link_or_copy(src_file, dst_file) == 'link':
+                linked += 1
+            else:
+                copied += 1
+            if verbose:
+                print(f"Published: {src_file} -> {dst_file}")
+    return linked, copied
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+周期段清单（manifest）：按周期拆分会话时不再生成成千上万个 output_<ts>.pcap 小文件，
+而是把会话文件整体保存为会话目录下的 session.pcap，并写一个 segments.csv 记录每个周期段的位置。
+后续阶段（2.1 统计样本数、2.3 提取特征）通过清单读取周期段，不需要把小文件落盘。
+
+segments.csv 的格式：
+    segment,start_time,end_time,first_offset,end_offset,packets
+    output_1556229621,1556229621.5,1556229651.5,24,1130,6
+其中：
+- segment：周期段名称，与拆分成文件时的文件名（不含 .pcap）相同；
+- start_time / end_time：周期窗口的起止时间；
+- first_offset / end_offset：周期段的记录在 session.pcap 中的字节范围 [first_offset, end_offset)；
+- packets：周期段中的数据包数目。
+
+session.pcap 为经典 pcap 格式，周期段的记录在文件中连续存放，
+因此文件头加上对应的字节范围就是一个完整的 pcap 文件。
+"""
+
+import csv
+import os
+
+MANIFEST_NAME = 'segments.csv'
+SESSION_PCAP_NAME = 'session.pcap'
+MANIFEST_FIELDS = ['segment', 'start_time', 'end_time', 'first_offset', 'end_offset', 'packets']
+PCAP_HEADER_LEN = 24
+
+
+def has_manifest(session_dir):
+    return os.path.isfile(os.path.join(session_dir, MANIFEST_NAME))
+
+
+def write_manifest(session_dir, segments):
+    """写入周期段清单，先写临时文件再替换，避免留下不完整的清单。segments 为字段同 MANIFEST_FIELDS 的字典列表。"""
+    manifest_path = os.path.join(session_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        for segment in segments:
+            writer.writerow({
+                'segment': segment['segment'],
+                'start_time': repr(float(segment['start_time'])),
+                'end_time': repr(float(segment['end_time'])),
+                'first_offset': segment['first_offset'],
+                'end_offset': segment['end_offset'],
+                'packets': segment['packets'],
+            })
+    os.replace(tmp_path, manifest_path)
+
+
+def read_manifest(session_dir):
+    """读取周期段清单，返回字典列表，数值字段已转换类型。"""
+    segments = []
+    with open(os.path.join(session_dir, MANIFEST_NAME), 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            segments.append({
+                'segment': row['segment'],
+                'start_time': float(row['start_time']),
+                'end_time': float(row['end_time']),
+                'first_offset': int(row['first_offset']),
+                'end_offset': int(row['end_offset']),
+                'packets': int(row['packets']),
+            })
+    return segments
+
+
+def count_segments(session_dir):
+    """周期段数目，即该会话的样本数。"""
+    with open(os.path.join(session_dir, MANIFEST_NAME), 'r', newline='') as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+
+def read_segment_bytes(session_pcap, segment):
+    """返回一个周期段的 pcap 字节：session.pcap 的文件头加上该周期段的记录，可直接作为 pcap 文件使用。segment 为清单中的一行。"""
+    with open(session_pcap, 'rb') as f:
+        header = f.read(PCAP_HEADER_LEN)
+        f.seek(segment['first_offset'])
+        return header + f.read(segment['end_offset'] - segment['first_offset'])
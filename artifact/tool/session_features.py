@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+2.4 ~ 2.8 对单个会话的处理逻辑，供合并执行的 2.4-2.8 脚本在内存中逐会话完成，不再写出中间目录。
+各函数与分步脚本一一对应：
+1. add_time_interval（2.4）
+    frame.time_epoch 转为浮点数，time_interval 为与上一行的时间差，第一行为 0。
+2. keep_packet_rows（2.5）
+    按 2.5 的规则返回保留的行（与 2.3 --prefilter 的 keep_packet_row 相同），数值按数值比较，
+    因此无论列是字符串（'23'、'23.0'）还是 pandas 推断或列式文件中的数值类型，结果都一样。
+3. select_samples（2.6）
+    样本数不超过 num_files 时全选，否则随机选取 num_files 个。
+4. packet_features（2.7）
+    提取特征列，协议类型映射为 dhcp/tcp/udp/unknown，payload 取对应的 tcp.payload 或 udp.payload，会话文件夹名作为 label，
+    列类型见 tool.feature_schema。
+5. merged_table_name（2.8）
+    合并后的文件名：{会话文件夹名}___{样本数}.csv。
+
+读取时所有列都按字符串读取（read_sample_csv），只把特征需要的列转换为数值，
+因此 payload 等十六进制字符串不会像分步执行时那样被 pandas 误识别为数字。
+"""
+
+import random
+
+import numpy as np
+import pandas as pd
+
+from tool.feature_schema import apply_feature_schema
+
+FEATURE_COLUMNS = ['frame.time_epoch', 'frame.len', 'direction', 'time_interval', 'protocol_type', 'payload', 'label']
+
+
+def read_sample_csv(csv_path):
+    """按字符串读取 2.3 输出的 CSV，空值保留为空字符串。"""
+    return pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+
+
+def _column(df, name):
+    return df[name] if name in df.columns else pd.Series('', index=df.index)
+
+
+def add_time_interval(df):
+    """2.4：添加 time_interval 列（第一行以及时间缺失的行为 0）。"""
+    df['frame.time_epoch'] = pd.to_numeric(df['frame.time_epoch'], errors='coerce')
+    df['time_interval'] = df['frame.time_epoch'].diff().fillna(0)
+    return df
+
+
+def keep_packet_rows(df):
+    """
+    2.5：返回满足任一条件的行：
+        a. TLS 应用数据包（tls.record.content_type == 23）
+        b. 有效 TCP 数据包（tcp.len ≠ 0 且不包含 tls 协议，tcp.len 为空时也成立）
+        c. TLS 握手数据包（frame.protocols 包含 tls 且 tls.record.content_type 为空）
+        d. UDP 数据包（frame.protocols 包含 udp）
+    """
+    content_type = _column(df, 'tls.record.content_type')
+    tcp_len = pd.to_numeric(_column(df, 'tcp.len'), errors='coerce')
+    protocols = _column(df, 'frame.protocols').astype(str)
+    has_tls = protocols.str.contains('tls', regex=False)
+    content_type_empty = content_type.isna() | (content_type.astype(str) == '')
+    condition1 = pd.to_numeric(content_type, errors='coerce') == 23
+    condition2 = (tcp_len != 0) & ~has_tls  # 为空（NaN）时也成立
+    condition3 = has_tls & content_type_empty
+    condition_udp = protocols.str.contains('udp', regex=False)
+    return df[condition1 | condition2 | condition3 | condition_udp]
+
+
+def select_samples(names, num_files=50, rng=random):
+    """2.6：样本数不超过 num_files 时全选，否则随机选取 num_files 个。"""
+    return list(names) if len(names) <= num_files else rng.sample(list(names), num_files)
+
+
+def packet_features(df, label):
+    """2.7：提取特征列，返回列为 FEATURE_COLUMNS、按特征表类型转换后的新表。"""
+    protocols = df['frame.protocols'].astype(str)
+    protocol_type = np.select(
+        [protocols.str.contains('dhcp', regex=False),
+         protocols.str.contains('tcp', regex=False),
+         protocols.str.contains('udp', regex=False)],
+        ['dhcp', 'tcp', 'udp'], default='unknown')
+    # dhcp 和 udp 取 udp.payload，tcp 取 tcp.payload，其余为空
+    payload = np.select([protocol_type == 'tcp', protocol_type == 'unknown'],
+                        [_column(df, 'tcp.payload').to_numpy(object), None],
+                        default=_column(df, 'udp.payload').to_numpy(object))
+    features = pd.DataFrame({
+        'frame.time_epoch': pd.to_numeric(df['frame.time_epoch'], errors='coerce'),
+        'frame.len': pd.to_numeric(df['frame.len'], errors='coerce'),
+        'direction': pd.to_numeric(df['direction'], errors='coerce'),
+        'time_interval': pd.to_numeric(df['time_interval'], errors='coerce'),
+        'protocol_type': protocol_type,
+        'payload': payload,
+    }, index=df.index)
+    features['label'] = label
+    return apply_feature_schema(features.reset_index(drop=True))
+
+
+def merged_table_name(session_name, sample_count):
+    """2.8：合并后的文件名。"""
+    return f"{session_name}___{sample_count}.csv"
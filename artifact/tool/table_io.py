@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+中间表格文件的读写。
+preProcess 和 signatureGeneration 各阶段之间传递的数据包表格（6_csvAddTime ~ 12_featureClusterFilter、9_feature、
+15_keyPacketSignature）默认仍为 CSV；设置环境变量 DEVICEID_TABLE_FORMAT=parquet（或 feather）后改为带类型、
+压缩的列式格式，数值列不需要在每个阶段重新从文本解析。列式格式需要安装可选依赖 pyarrow。
+
+读取时按文件后缀判断格式，因此同一目录中新旧格式可以混用；写入时按当前设置的格式替换文件后缀。
+边界上的文件保持 CSV：2.3 的输出（5_csv）、统计结果（13_keyPacketStatistics、14_keyPacketMerge）
+以及供 signatureMatching 使用的 16_keyPacketSignatureWithLSH。
+
+1. table_format
+    当前的中间表格格式：csv（默认）、parquet 或 feather。
+2. file_format / is_table / table_stem / table_name / list_tables
+    按后缀识别表格文件及其格式、去掉或加上后缀、列出目录中的表格文件。
+3. read_table / write_table / table_columns
+    按后缀读取；按格式写入并返回实际写入的路径。csv_kwargs 只在读取 CSV 时传给 pandas.read_csv。
+    写入时先写临时文件再替换，不会原地改写已有文件（已有文件可能是 2.5、2.10 发布到下一阶段目录的硬链接）。
+    table_columns 只读取表头（列式文件读取 schema）。
+"""
+
+import os
+
+import pandas as pd
+
+TABLE_FORMAT_ENV = 'DEVICEID_TABLE_FORMAT'
+TABLE_SUFFIXES = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+COMPRESSION = 'zstd'
+
+
+def table_format():
+    """当前的中间表格格式，列式格式需要 pyarrow。"""
+    fmt = os.environ.get(TABLE_FORMAT_ENV, 'csv').strip().lower() or 'csv'
+    if fmt not in TABLE_SUFFIXES:
+        raise ValueError(f"{TABLE_FORMAT_ENV}={fmt} 无效，可选: {', '.join(TABLE_SUFFIXES)}")
+    if fmt != 'csv':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError(f"{TABLE_FORMAT_ENV}={fmt} 需要安装 pyarrow（pip install pyarrow）")
+    return fmt
+
+
+def file_format(path):
+    """文件后缀对应的格式，不是表格文件时返回 None。"""
+    ext = os.path.splitext(path)[1].lower()
+    for fmt, suffix in TABLE_SUFFIXES.items():
+        if ext == suffix:
+            return fmt
+    return None
+
+
+def is_table(path):
+    return file_format(path) is not None
+
+
+def table_stem(path):
+    """去掉表格后缀后的路径或文件名。"""
+    return os.path.splitext(path)[0] if is_table(path) else path
+
+
+def table_name(stem, fmt=None):
+    """加上格式对应的后缀，fmt 为空时使用当前设置的格式。"""
+    return stem + TABLE_SUFFIXES[fmt or table_format()]
+
+
+def list_tables(folder):
+    return [f for f in os.listdir(folder) if is_table(f)]
+
+
+def read_table(path, columns=None, **csv_kwargs):
+    """按后缀读取表格。columns 不为空时只读取这些列。"""
+    fmt = file_format(path)
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if fmt == 'feather':
+        return pd.read_feather(path, columns=columns)
+    if columns is not None:
+        csv_kwargs['usecols'] = columns
+    return pd.read_csv(path, **csv_kwargs)
+
+
+def table_columns(path):
+    """表格的列名，不读取数据。"""
+    fmt = file_format(path)
+    if fmt == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(path).names
+    if fmt == 'feather':
+        import pyarrow.feather
+        return pyarrow.feather.read_table(path, memory_map=True).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _arrow_safe(df):
+    # read_csv 得到的 object 列可能混有数字和字符串（如 payload），列式格式要求每列类型一致，统一转为字符串
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_table(df, path, fmt=None):
+    """
+    把 df 写为表格文件，path 的后缀（若有）替换为 fmt（为空时使用当前设置的格式）对应的后缀。
+    返回实际写入的路径。
+    """
+    fmt = fmt or table_format()
+    path = table_name(table_stem(path), fmt)
+    tmp_path = path + '.tmp'
+    if fmt == 'csv':
+        df.to_csv(tmp_path, index=False)
+    elif fmt == 'parquet':
+        _arrow_safe(df).to_parquet(tmp_path, index=False, compression=COMPRESSION)
+    else:
+        _arrow_safe(df).reset_index(drop=True).to_feather(tmp_path, compression=COMPRESSION)
+    os.replace(tmp_path, path)
+    return path